@@ -0,0 +1,182 @@
+"""
+Сравнение горячих чтений: прежний путь через ORM (select(...) на каждый
+вызов, selectinload, модели ORM -> Pydantic) и быстрый путь
+src.db.queries (заранее скомпилированный SQL через asyncpg).
+
+Запуск из каталога backend на базе с данными; пул соединений должен
+вмещать --concurrency (DB_POOL_SIZE + DB_MAX_OVERFLOW), иначе запросы
+упрутся в ожидание соединения:
+    DB_POOL_SIZE=20 python benchmark_reads.py --requests 2000 --concurrency 20
+    DB_POOL_SIZE=20 python benchmark_reads.py --requests 2000 \
+        --concurrency 20 --count none
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import selectinload
+
+from src.api.v1.schemas import (FileDetail, MessageReadShort, StatusRead,
+                                TickeDetail, TicketRead, UserRead)
+from src.db.count import COUNT_EXACT, COUNT_NONE
+from src.db.models import File, Ticket
+from src.db.sqlalchemy import async_engine, async_session_factory
+from src.service.file import FileService
+from src.service.ticket import TicketService
+
+
+async def orm_ticket_list(session, page_size, counted):
+    async with session.begin():
+        columns = [Ticket]
+        if counted:
+            columns.append(func.count().over().label('total'))
+        rows = (await session.execute(
+            select(
+                *columns
+            ).options(
+                selectinload(Ticket.status),
+                selectinload(Ticket.user)
+            ).order_by(
+                desc(Ticket.created_at)
+            ).limit(
+                page_size
+            )
+        )).all()
+        return [TicketRead(
+            id=x.id,
+            user_id=UserRead(
+                id=x.user.id,
+                username=x.user.username
+            ) if x.user_id is not None else None,
+            status=StatusRead(id=x.status.id, name=x.status.name),
+            created_at=x.created_at,
+            updated_at=x.updated_at,
+            message_count=x.message_count,
+            last_message_id=x.last_message_id,
+            last_message_at=x.last_message_at,
+            last_customer_message_at=x.last_customer_message_at
+        ) for x in (row[0] for row in rows)]
+
+
+async def orm_ticket_detail(session, ticket_id):
+    async with session.begin():
+        x = await session.get(
+            Ticket,
+            ticket_id,
+            options=(
+                selectinload(Ticket.messages),
+                selectinload(Ticket.status),
+                selectinload(Ticket.user),
+            )
+        )
+        return TickeDetail(
+            id=x.id,
+            telegram_user_id=x.telegram_user_id,
+            status=StatusRead(id=x.status.id, name=x.status.name),
+            created_at=x.created_at,
+            updated_at=x.updated_at,
+            message_count=x.message_count,
+            last_message_id=x.last_message_id,
+            last_message_at=x.last_message_at,
+            last_customer_message_at=x.last_customer_message_at,
+            user_id=UserRead(
+                id=x.user.id,
+                username=x.user.username
+            ) if x.user_id is not None else None,
+            messages=[MessageReadShort(
+                id=m.id,
+                user_id=m.user_id,
+                content=m.content,
+                created_at=m.created_at
+            ) for m in x.messages]
+        )
+
+
+async def orm_file_list(session, page_size, counted):
+    async with session.begin():
+        columns = [File]
+        if counted:
+            columns.append(func.count().over().label('total'))
+        rows = (await session.execute(
+            select(
+                *columns
+            ).options(
+                selectinload(File.user)
+            ).order_by(
+                desc(File.created_at)
+            ).limit(
+                page_size
+            )
+        )).all()
+        return [FileDetail(
+            id=x.id,
+            name=x.name,
+            created_by=UserRead(
+                id=x.user.id,
+                username=x.user.username
+            ) if x.user else None,
+            created_at=x.created_at,
+            status=x.status
+        ) for x in (row[0] for row in rows)]
+
+
+async def run(name, call, requests, concurrency, report=True):
+    counter = iter(range(requests))
+
+    async def worker():
+        async with async_session_factory() as session:
+            for _ in counter:
+                await call(session)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if report:
+        print(f'{name:<24} {requests / elapsed:10.1f} запросов/с')
+
+
+async def main(args):
+    # лог SQL замедлил бы только ORM-путь, быстрый путь его не пишет
+    async_engine.sync_engine.echo = False
+    async with async_session_factory() as session:
+        async with session.begin():
+            ticket_id = (await session.execute(
+                select(func.max(Ticket.id))
+            )).scalar()
+    if ticket_id is None:
+        raise SystemExit('В базе нет тикетов')
+    size = args.page_size
+    counted = args.count == COUNT_EXACT
+    scenarios = [
+        ('orm: список тикетов', lambda s: orm_ticket_list(
+            s, size, counted
+        )),
+        ('fast: список тикетов', lambda s: TicketService(s).get_pagination(
+            '-created_at', None, None, size, 1, args.count
+        )),
+        ('orm: карточка тикета', lambda s: orm_ticket_detail(s, ticket_id)),
+        ('fast: карточка тикета', lambda s: TicketService(s).get_by_id(
+            ticket_id
+        )),
+        ('orm: список файлов', lambda s: orm_file_list(s, size, counted)),
+        ('fast: список файлов', lambda s: FileService(s).get_file_pagination(
+            '-created_at', size, None, 1, args.count
+        )),
+    ]
+    for name, call in scenarios:
+        # прогрев: кэш компиляции SQLAlchemy и prepared statements asyncpg
+        await run(name, call, args.concurrency, args.concurrency, False)
+        await run(name, call, args.requests, args.concurrency)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=20)
+    # count(*) OVER () одинаково дорог на обоих путях и заслоняет разницу
+    parser.add_argument(
+        '--count', choices=(COUNT_EXACT, COUNT_NONE), default=COUNT_EXACT
+    )
+    asyncio.run(main(parser.parse_args()))
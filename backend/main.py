@@ -1,23 +1,68 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from src.api.v1 import auth, file, message, scheduler, ticket
+from src.api.middleware import OverloadProtection, SingleFlight
+from src.api.v1 import (auth, file, inbox, message, metrics, scheduler,
+                        ticket)
 from src.core.config import settings
+from src.db.replica import track_writes
+from src.db.sqlalchemy import async_session_factory
+from src.service.archive import archive_periodically
+from src.service.assignment import assignment_engine
+from src.service.message_writer import message_writer
+from src.service.open_tickets import open_ticket_index
+from src.service.ticket import reconcile_stats_periodically
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with async_session_factory() as session:
+        await assignment_engine.sync(session)
+    async with async_session_factory() as session:
+        await open_ticket_index.load(session)
+    # фоновые задачи приложения
+    tasks = [
+        asyncio.create_task(
+            reconcile_stats_periodically(settings.STATS_RECONCILE_INTERVAL)
+        ),
+        asyncio.create_task(message_writer.run()),
+        asyncio.create_task(archive_periodically(settings.ARCHIVE_INTERVAL)),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+
 
 # Создаем FastAPI приложение
 app = FastAPI(
     title=settings.PROJECT_NAME,
     docs_url="/api/openapi",
     openapi_url="/api/openapi.json",
-    default_response_class=ORJSONResponse
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# лимиты одновременных запросов по классам маршрутов, сверх них - 503;
+# стоит внутри SingleFlight, чтобы ожидающие чужой ответ не занимали места
+app.add_middleware(OverloadProtection)
+# одинаковые одновременные GET-запросы выполняются один раз
+app.add_middleware(SingleFlight)
+# после записи клиент какое-то время читает из основной БД, а не из реплики
+app.middleware('http')(track_writes)
+
 # Включаем маршруты для различных модулей
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(ticket.router, prefix="/api/v1/ticket", tags=["ticket"])
 app.include_router(message.router, prefix="/api/v1/message", tags=["message"])
 app.include_router(scheduler.router, prefix="/api/v1/scheduler", tags=["scheduler"])
 app.include_router(file.router, prefix="/api/v1/file", tags=["file"])
+app.include_router(inbox.router, prefix="/api/v1/inbox", tags=["inbox"])
+app.include_router(
+    metrics.router, prefix="/api/v1/metrics", tags=["metrics"]
+)
 
 # Запускаем сервер приложения, если файл выполняется как скрипт
 if __name__ == "__main__":
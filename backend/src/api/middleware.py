@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.config import settings
+from src.db.replica import read_after_write
+from src.service.user import user_id_from_token
+
+# GET-маршруты без побочных эффектов, ответ которых не зависит от того,
+# какой именно сотрудник спрашивает
+COALESCED_ROUTES = (
+    re.compile(r'^/api/v1/ticket/$'),
+    re.compile(r'^/api/v1/ticket/(stats|search|changes)$'),
+    re.compile(r'^/api/v1/ticket/\d+$'),
+    re.compile(r'^/api/v1/file/$'),
+)
+
+
+class SingleFlightStats:
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self.in_flight = 0
+
+    def as_dict(self) -> dict:
+        total = self.executed + self.coalesced
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': self.in_flight,
+            'coalescing_ratio': self.coalesced / total if total else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    ASGI middleware: одинаковые одновременные GET-запросы выполняются
+    один раз. Первый запрос выполняет обработчик и запоминает ответ
+    целиком, остальные с тем же ключом (путь, отсортированная строка
+    запроса) ждут его и получают те же байты. Если первый запрос упал,
+    ожидающие выполняются сами. Запросы клиента, недавно писавшего в БД,
+    не объединяются.
+    """
+    stats = SingleFlightStats()
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.flights: dict[tuple, asyncio.Future] = {}
+
+    @staticmethod
+    def key(scope: Scope) -> Optional[tuple]:
+        path = scope['path']
+        if not any(route.match(path) for route in COALESCED_ROUTES):
+            return None
+        headers = dict(scope['headers'])
+        authorization = headers.get(b'authorization', b'').decode()
+        token = authorization[7:]
+        try:
+            user_id = user_id_from_token(token)
+        except HTTPException:
+            # без действительного токена ответ получает только сам запрос
+            return None
+        # auth_check возьмет проверенный токен отсюда, см. request_user_id
+        scope.setdefault('state', {})['verified_token'] = (token, user_id)
+        if read_after_write.recent(token):
+            # клиент только что писал и должен увидеть свою запись, а
+            # чужой ответ мог начаться до нее
+            return None
+        query = urlencode(sorted(parse_qsl(
+            scope['query_string'].decode(), keep_blank_values=True
+        )))
+        return path, query
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+        key = self.key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.stats.coalesced += 1
+            try:
+                messages = await asyncio.shield(flight)
+            except Exception:
+                await self.app(scope, receive, send)
+                return
+            for message in messages:
+                await send(message)
+            return
+        flight = asyncio.get_running_loop().create_future()
+        self.flights[key] = flight
+        self.stats.executed += 1
+        self.stats.in_flight += 1
+        messages: list[Message] = []
+
+        async def record(message: Message) -> None:
+            messages.append(message)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record)
+        except BaseException as e:
+            flight.set_exception(
+                e if isinstance(e, Exception) else RuntimeError('отменен')
+            )
+            # ожидающих может не быть, исключение считаем обработанным
+            flight.exception()
+            raise
+        else:
+            flight.set_result(messages)
+        finally:
+            self.stats.in_flight -= 1
+            del self.flights[key]
+
+
+# долгие ответы: SSE держат соединение клиента, выгрузки - соединение БД
+SSE_ROUTES = re.compile(r'^/api/v1/(ticket/\d+/events|inbox/stream)$')
+EXPORT_ROUTES = re.compile(r'^/api/v1/(ticket|scheduler)/export$')
+# вызовы бота: бот их не повторяет, поэтому они не отбрасываются
+INTERNAL_ROUTES = re.compile(r'^/api/v1/(message/notify|ticket/assign)$')
+
+# классы маршрутов, которые берут соединения основной БД
+DB_ROUTE_CLASSES = ('read', 'write', 'message', 'auth', 'export')
+
+
+def route_class(scope: Scope) -> str:
+    """Класс маршрута, у каждого класса свой бюджет одновременных запросов."""
+    if scope['type'] == 'websocket':
+        return 'websocket'
+    path = scope['path']
+    if path.startswith('/api/v1/metrics/'):
+        return 'health'
+    if INTERNAL_ROUTES.match(path):
+        return 'internal'
+    if path.startswith('/api/v1/auth/'):
+        return 'auth'
+    if SSE_ROUTES.match(path):
+        return 'sse'
+    if EXPORT_ROUTES.match(path):
+        return 'export'
+    if path.startswith('/api/v1/message/'):
+        return 'message'
+    if scope['method'] in ('GET', 'HEAD', 'OPTIONS'):
+        return 'read'
+    return 'write'
+
+
+def db_budget() -> int:
+    """Сколько соединений БД могут занять запросы и фоновые задачи."""
+    return settings.DB_BACKGROUND_CONNECTIONS + sum(
+        settings.OVERLOAD_LIMITS.get(name, 0) for name in DB_ROUTE_CLASSES
+    )
+
+
+class ConcurrencyLimit:
+    """
+    Не больше limit запросов одновременно и не больше queue_size в
+    очереди. Место в очереди ждут не дольше timeout, очередь FIFO.
+    """
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            self.rejected += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        acquired = False
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            acquired = True
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+        finally:
+            if not acquired and waiter.done():
+                # место передали одновременно с дедлайном или отменой
+                self.release()
+            waiter.cancel()
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+        return acquired
+
+    def release(self) -> None:
+        # место переходит первому живому ожидающему, active не меняется
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def as_dict(self) -> dict:
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'waiting': len(self.waiters),
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+
+class OverloadProtection:
+    """
+    ASGI middleware: ограничивает число одновременных запросов по классам
+    маршрутов. Сверх лимита запрос ждет в ограниченной очереди, а если
+    очередь полна или дедлайн вышел - сразу получает 503 с Retry-After
+    (веб-сокет закрывается с кодом 1013). Отдельные бюджеты не дают
+    потоку списков занять все соединения с БД. Классы без лимита
+    (health, internal) не ограничиваются.
+    """
+    limits: dict[str, ConcurrencyLimit] = {}
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        OverloadProtection.limits = {
+            name: ConcurrencyLimit(
+                limit,
+                settings.OVERLOAD_QUEUE_SIZE.get(name, 0),
+                settings.OVERLOAD_QUEUE_TIMEOUT
+            )
+            for name, limit in settings.OVERLOAD_LIMITS.items()
+        }
+        pool = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        if db_budget() > pool:
+            logging.warning(
+                'Лимиты запросов к БД и фоновые задачи (%s) больше пула '
+                'соединений (%s): запросы будут ждать в пуле без дедлайна',
+                db_budget(), pool
+            )
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {name: x.as_dict() for name, x in cls.limits.items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+        limit = self.limits.get(route_class(scope))
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        if not await limit.acquire():
+            await self.reject(scope, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    @staticmethod
+    async def reject(scope: Scope, send: Send) -> None:
+        if scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1013})
+            return
+        response = JSONResponse(
+            status_code=503,
+            content={'detail': 'Сервер перегружен, повторите запрос позже'},
+            headers={'Retry-After': str(settings.OVERLOAD_RETRY_AFTER)}
+        )
+        await response(scope, None, send)
@@ -1,7 +1,8 @@
 import logging
 from typing import Annotated, List
 
-from fastapi import APIRouter, Depends, File, Query, Request, UploadFile
+from fastapi import (APIRouter, BackgroundTasks, Depends, File, Query,
+                     Request, UploadFile)
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer  # для тестов
@@ -27,10 +28,17 @@ async def upload(
     files: Annotated[
         list[UploadFile], File(description='Загрузка нескольких файлов')
     ],
+    background_tasks: BackgroundTasks,
     file_service: FileService = Depends(get_file_service)
 ) -> ShemaUploadFile:
     auth_user_id = int(request.headers.get('auth_user_id'))
-    files = await file_service.upload(request, files, auth_user_id, ticket_id)
+    files, attachments, telegram_user_id = await file_service.upload(
+        request, files, auth_user_id, ticket_id
+    )
+    # в Telegram файлы уходят уже после ответа клиенту
+    background_tasks.add_task(
+        file_service.forward_to_telegram, attachments, telegram_user_id
+    )
     return files
 
 
@@ -65,7 +73,10 @@ async def get_files(
         filter_ticket=filter_ticket,
         page_size=page_parameters['page_size'],
         page_number=page_parameters['page_number'],
+        count_mode=page_parameters['count_mode'],
     )
-    headers = {"total_files": str(total_files)}
+    headers = {}
+    if total_files is not None:
+        headers["total_files"] = str(total_files)
     content = jsonable_encoder(files)
     return JSONResponse(content=content, headers=headers)
@@ -0,0 +1,80 @@
+from fastapi import (APIRouter, HTTPException, Query, Request, WebSocket,
+                     WebSocketDisconnect)
+from fastapi.responses import StreamingResponse
+from src.core import json
+from src.core.inbox import Inbox, InboxSubscription
+from src.service.user import request_token, user_id_from_token
+
+router = APIRouter()
+
+# как часто слать keep-alive, если событий нет
+KEEPALIVE_SECONDS = 15
+
+
+@router.get(
+        '/stream',
+        description=(
+            'SSE-лента событий по тикетам: создание, назначение, смена '
+            'статуса, новые сообщения'
+        )
+    )
+async def stream(
+    request: Request,
+    token: str = Query(
+        None, description='Токен доступа, если нельзя передать заголовок'
+    ),
+    filter_status: int = Query(None, alias='filter[status]'),
+    filter_user: int = Query(None, alias='filter[user]'),
+) -> StreamingResponse:
+    user_id_from_token(request_token(request, token))
+    subscription = InboxSubscription(filter_status, filter_user)
+    Inbox.subscribe(subscription)
+
+    async def events():
+        try:
+            while not subscription.overflowed:
+                event = await subscription.get(KEEPALIVE_SECONDS)
+                if await request.is_disconnected():
+                    break
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: {event["event"]}\ndata: {json.dumps(event)}\n\n'
+        finally:
+            Inbox.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@router.websocket('/ws')
+async def websocket_inbox(
+    websocket: WebSocket,
+    token: str = Query(None),
+    filter_status: int = Query(None, alias='filter[status]'),
+    filter_user: int = Query(None, alias='filter[user]'),
+):
+    try:
+        user_id_from_token(token)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    await websocket.accept()
+    subscription = InboxSubscription(filter_status, filter_user)
+    Inbox.subscribe(subscription)
+    try:
+        while not subscription.overflowed:
+            event = await subscription.get(KEEPALIVE_SECONDS)
+            # keep-alive заодно обнаруживает отключившихся клиентов
+            await websocket.send_text(
+                json.dumps(event or {'event': 'keep-alive'})
+            )
+        # клиент не успевает разбирать события - пусть переподключится
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        Inbox.unsubscribe(subscription)
@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
 from src.api.v1.schemas import MessageCreate, MessageRead
 from src.core.connections import TempConnection
+from src.core.events import EventBus
 from src.service.message import MessageService, get_message_service
-from src.service.user import auth_check
+from src.service.user import auth_check, internal_check
 
 router = APIRouter()
 
@@ -24,11 +25,28 @@ async def send(
 
 
 @router.post('/notify', description='Межсервисное взаимодействие =)')
+@internal_check
 async def notify(
+    request: Request,
     message_data: dict
 ) -> JSONResponse:
     if message_data['ticket_id'] in TempConnection.connections:
         await TempConnection.connections[
             message_data['ticket_id']
         ].send_text(message_data['content'])
+    ticket_data = {
+        'ticket_id': message_data['ticket_id'],
+        'status_id': message_data.get('status_id'),
+        'user_id': message_data.get('user_id'),
+    }
+    if message_data.get('ticket_created'):
+        await EventBus.publish({'type': 'ticket_created', **ticket_data})
+    await EventBus.publish({
+        'type': 'message_created',
+        'message_id': message_data.get('msg_id'),
+        'author_id': None,
+        'content': message_data.get('content'),
+        'created_at': message_data.get('created_at'),
+        **ticket_data
+    })
     return JSONResponse(content={"status": "Notification received"})
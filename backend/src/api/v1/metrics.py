@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+
+from src.api.middleware import OverloadProtection, SingleFlight
+
+router = APIRouter()
+
+
+@router.get(
+        '/',
+        description=(
+            'Счетчики слоя объединения одинаковых GET-запросов и лимитов '
+            'одновременных запросов'
+        )
+    )
+async def metrics() -> dict:
+    return {
+        'single_flight': SingleFlight.stats.as_dict(),
+        'overload': OverloadProtection.stats(),
+    }
+
+
+@router.get('/health', description='Проверка, что сервис отвечает')
+async def health() -> dict:
+    return {'status': 'ok'}
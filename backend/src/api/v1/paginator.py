@@ -1,8 +1,26 @@
+from typing import Literal
+
 from fastapi import Query
 
+from src.core.config import settings
+
 
 async def pagination(
-    page_size: int | None = Query(50, alias="page[size]"),
-    page_number: int | None = Query(1, alias="page[number]"),
+    page_size: int | None = Query(
+        50, alias="page[size]", ge=1, le=settings.MAX_PAGE_SIZE,
+        description='Для выгрузки больших объемов есть потоковый /export'
+    ),
+    page_number: int | None = Query(1, alias="page[number]", ge=1),
+    count: Literal['exact', 'estimate', 'none'] = Query(
+        'exact',
+        description=(
+            'Как считать общее количество: точно, оценкой планировщика '
+            'или не считать'
+        )
+    ),
 ):
-    return {"page_size": page_size, "page_number": page_number}
+    return {
+        "page_size": page_size,
+        "page_number": page_number,
+        "count_mode": count,
+    }
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
-from src.api.v1.schemas import SchedulerCreate, SchedulerDelete, SchedulerRead
-from src.service.scheduler import SchedulerService, get_scheduler_service
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.api.v1.schemas import (SchedulerBulkResult, SchedulerCreate,
+                                SchedulerDelete, SchedulerRead)
+from src.service.scheduler import (SchedulerService, get_scheduler_service,
+                                   parse_rules)
 from src.service.user import auth_check
 
 router = APIRouter()
@@ -35,3 +39,65 @@ async def delete(
 ) -> JSONResponse:
     await scheduler_service.delete(scheduler_data)
     return JSONResponse(status_code=200, content='Правило успешно удалено.')
+
+
+def body_format(request: Request) -> str:
+    content_type = request.headers.get('content-type', '')
+    return 'ndjson' if 'json' in content_type else 'csv'
+
+
+@router.post(
+        '/bulk',
+        description=(
+            'Массовое создание правил из CSV (text/csv) или NDJSON '
+            '(application/x-ndjson): telegram_user_id и необязательный user_id'
+        )
+    )
+@auth_check
+async def bulk_create(
+    request: Request,
+    on_conflict: Literal['skip', 'update'] = Query(
+        'skip',
+        description='Пропускать существующие правила или переназначать их'
+    ),
+    scheduler_service: SchedulerService = Depends(get_scheduler_service),
+) -> SchedulerBulkResult:
+    auth_user_id = int(request.headers.get('auth_user_id'))
+    rows, errors = parse_rules(await request.body(), body_format(request))
+    return await scheduler_service.bulk_create(
+        rows, errors, auth_user_id, on_conflict
+    )
+
+
+@router.delete(
+        '/bulk',
+        description='Массовое удаление правил из CSV или NDJSON'
+    )
+@auth_check
+async def bulk_delete(
+    request: Request,
+    scheduler_service: SchedulerService = Depends(get_scheduler_service),
+) -> SchedulerBulkResult:
+    rows, errors = parse_rules(await request.body(), body_format(request))
+    return await scheduler_service.bulk_delete(rows, errors)
+
+
+@router.get(
+        '/export',
+        description='Потоковая выгрузка всех правил'
+    )
+@auth_check
+async def export(
+    request: Request,
+    file_format: Literal['csv', 'ndjson'] = Query('csv', alias='format'),
+    scheduler_service: SchedulerService = Depends(get_scheduler_service),
+) -> StreamingResponse:
+    media_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        scheduler_service.export(file_format),
+        media_type=media_type,
+        headers={
+            'Content-Disposition':
+                f'attachment; filename="scheduler.{file_format}"'
+        }
+    )
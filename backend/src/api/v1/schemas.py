@@ -69,6 +69,10 @@ class TicketRead(BaseModel):
     status: StatusRead
     created_at: datetime.datetime
     updated_at: datetime.datetime
+    message_count: int
+    last_message_id: Optional[int]
+    last_message_at: Optional[datetime.datetime]
+    last_customer_message_at: Optional[datetime.datetime]
 
 
 class TickeDetail(TicketRead):
@@ -81,6 +85,59 @@ class TicketUpdate(BaseModel):
     status_id: Optional[int] = None
 
 
+class TicketBulkFilter(BaseModel):
+    status_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+class TicketBulkUpdate(TicketUpdate):
+    ids: Optional[List[int]] = None
+    filter: Optional[TicketBulkFilter] = None
+
+
+class TicketShort(BaseModel):
+    id: int
+    user_id: Optional[int]
+    status_id: int
+    updated_at: datetime.datetime
+
+
+class TicketChange(TicketShort):
+    message_count: int
+    last_message_id: Optional[int]
+    last_message_at: Optional[datetime.datetime]
+
+
+class TicketSearchResult(BaseModel):
+    ticket_id: int
+    message_id: int
+    rank: float
+    snippet: str
+
+
+class StatusCount(BaseModel):
+    status_id: int
+    count: int
+
+
+class UserCount(BaseModel):
+    user_id: Optional[int]
+    count: int
+
+
+class TicketStatsRead(BaseModel):
+    by_status: List[StatusCount]
+    by_user: List[UserCount]
+
+
+class TicketAssign(BaseModel):
+    user_id: Optional[int] = None
+
+
+class OperatorAvailability(BaseModel):
+    available: bool
+
+
 class SchedulerCreate(BaseModel):
     telegram_user_id: int
 
@@ -94,6 +151,19 @@ class SchedulerDelete(SchedulerCreate):
     pass
 
 
+class SchedulerBulkRow(BaseModel):
+    line: int
+    telegram_user_id: Optional[int]
+    status: str
+    detail: Optional[str] = None
+
+
+class SchedulerBulkResult(BaseModel):
+    total: int
+    succeeded: int
+    rows: List[SchedulerBulkRow]
+
+
 class ReadFile(BaseModel):
     id: int
     name: str
@@ -102,6 +172,7 @@ class ReadFile(BaseModel):
 class FileDetail(ReadFile):
     created_at: datetime.datetime
     created_by: Optional[UserRead]
+    status: str
 
 
 class UploadFile(BaseModel):
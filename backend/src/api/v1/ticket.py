@@ -1,16 +1,27 @@
-import jwt
-from fastapi import (APIRouter, Depends, HTTPException, Query, Request,
-                     WebSocket, WebSocketDisconnect)
+import asyncio
+import logging
+from functools import partial
+from typing import List
+
+from fastapi import (APIRouter, Depends, Header, HTTPException, Query,
+                     Request, WebSocket, WebSocketDisconnect)
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
-from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-from src.api.v1.schemas import (MessageCreate, TickeDetail, TicketRead,
-                                TicketUpdate)
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.api.v1.schemas import (OperatorAvailability, TickeDetail,
+                                TicketAssign, TicketBulkUpdate, TicketRead,
+                                TicketShort, TicketStatsRead, TicketUpdate)
+from src.core import json
+from src.core.compress import gzip_stream
 from src.core.config import settings
 from src.core.connections import TempConnection
-from src.service.message import MessageService, get_message_service
+from src.core.ticket_stream import (TicketStream, event_id,
+                                    parse_event_id)
+from src.db.replica import read_after_write
+from src.service.assignment import assignment_engine
+from src.service.message_writer import message_writer
 from src.service.ticket import TicketService, get_ticket_service
-from src.service.user import auth_check
+from src.service.user import (auth_check, internal_check, request_token,
+                              user_id_from_token)
 
 from .paginator import pagination
 
@@ -48,12 +59,146 @@ async def get_list(
         filter_user=filter_user,
         page_size=page_parameters['page_size'],
         page_number=page_parameters['page_number'],
+        count_mode=page_parameters['count_mode'],
     )
-    headers = {"total_tickets": str(total_projects)}
+    headers = {}
+    if total_projects is not None:
+        headers["total_tickets"] = str(total_projects)
     content = jsonable_encoder(tickets)
     return JSONResponse(content=content, headers=headers)
 
 
+@router.post(
+        '/assign',
+        description=(
+            'Межсервисное взаимодействие: исполнитель для нового тикета'
+        )
+    )
+@internal_check
+async def assign(
+    request: Request,
+    ticket_data: TicketAssign
+) -> TicketAssign:
+    user_id = assignment_engine.assign(ticket_data.user_id)
+    return TicketAssign(user_id=user_id)
+
+
+@router.put(
+        '/availability',
+        description='Принимать или не принимать новые тикеты автоматически'
+    )
+@auth_check
+async def availability(
+    request: Request,
+    availability_data: OperatorAvailability,
+) -> OperatorAvailability:
+    auth_user_id = int(request.headers.get('auth_user_id'))
+    assignment_engine.set_available(
+        auth_user_id, availability_data.available
+    )
+    return availability_data
+
+
+@router.get(
+        '/stats',
+        description='Количество тикетов по статусам и исполнителям'
+    )
+@auth_check
+async def stats(
+    request: Request,
+    filter_status: int = Query(
+        None,
+        alias='filter[status]',
+        description='status_id, по которому считать тикеты исполнителей'
+    ),
+    ticket_service: TicketService = Depends(get_ticket_service)
+) -> TicketStatsRead:
+    return await ticket_service.get_stats(filter_status)
+
+
+@router.get(
+        '/search',
+        description='Полнотекстовый поиск тикетов по сообщениям'
+    )
+@auth_check
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, description='Поисковый запрос'),
+    cursor: str = Query(
+        None,
+        description='Курсор следующей страницы из заголовка next_cursor'
+    ),
+    page_size: int = Query(20, alias='page[size]', ge=1, le=100),
+    ticket_service: TicketService = Depends(get_ticket_service)
+) -> JSONResponse:
+    results, next_cursor = await ticket_service.search(
+        q=q,
+        page_size=page_size,
+        cursor=cursor,
+    )
+    headers = {"next_cursor": next_cursor} if next_cursor else {}
+    content = jsonable_encoder(results)
+    return JSONResponse(content=content, headers=headers)
+
+
+@router.get(
+        '/changes',
+        description=(
+            'Тикеты, изменившиеся после курсора: статус, исполнитель или '
+            'новые сообщения. Курсор следующего запроса - в заголовке '
+            'next_cursor'
+        )
+    )
+@auth_check
+async def changes(
+    request: Request,
+    since: str = Query(
+        None, description='Курсор из заголовка next_cursor прошлого ответа'
+    ),
+    page_size: int = Query(100, alias='page[size]', ge=1, le=1000),
+    ticket_service: TicketService = Depends(get_ticket_service)
+) -> JSONResponse:
+    results, next_cursor, has_more = await ticket_service.get_changes(
+        since=since,
+        page_size=page_size,
+    )
+    headers = {
+        'next_cursor': next_cursor,
+        'has_more': 'true' if has_more else 'false'
+    }
+    content = jsonable_encoder(results)
+    return JSONResponse(content=content, headers=headers)
+
+
+@router.get(
+        '/export',
+        description=(
+            'Потоковая выгрузка тикетов с сообщениями и файлами в NDJSON, '
+            'по строке на тикет'
+        )
+    )
+@auth_check
+async def export(
+    request: Request,
+    filter_status: int = Query(None, alias='filter[status]'),
+    filter_user: int = Query(None, alias='filter[user]'),
+    gzip: bool = Query(False, description='Сжать выгрузку в gzip'),
+    ticket_service: TicketService = Depends(get_ticket_service)
+) -> StreamingResponse:
+    content = ticket_service.export(filter_status, filter_user)
+    filename = 'tickets.ndjson'
+    media_type = 'application/x-ndjson'
+    if gzip:
+        content = gzip_stream(content)
+        filename += '.gz'
+        media_type = 'application/gzip'
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get(
         '/{ticket_id}',
         description='Вывод детальной информации по тикету'
@@ -68,6 +213,115 @@ async def detail(
     return ticket
 
 
+@router.get(
+        '/{ticket_id}/events',
+        description=(
+            'SSE-поток событий тикета. При переподключении Last-Event-ID '
+            'досылает только пропущенные события'
+        )
+    )
+async def events(
+    request: Request,
+    ticket_id: int,
+    token: str = Query(
+        None, description='Токен доступа, если нельзя передать заголовок'
+    ),
+    last_event_id: str = Header(None),
+    ticket_service: TicketService = Depends(get_ticket_service)
+) -> StreamingResponse:
+    user_id_from_token(request_token(request, token))
+    # подписываемся до чтения истории, чтобы ничего не потерять между ними
+    queue = TicketStream.subscribe(ticket_id)
+    try:
+        parsed = parse_event_id(last_event_id)
+        backlog = None
+        if parsed:
+            epoch, seq, message_id = parsed
+            backlog = TicketStream.replay(ticket_id, epoch, seq)
+        else:
+            seq = TicketStream.seq
+            message_id = await ticket_service.get_last_message_id(ticket_id)
+        if backlog is None and parsed:
+            # буфер не покрывает пропуск - досылаем сообщения из БД
+            seq = TicketStream.seq
+            missed = await ticket_service.get_messages_after(
+                ticket_id, message_id
+            )
+        else:
+            missed = []
+    except BaseException:
+        TicketStream.unsubscribe(ticket_id, queue)
+        raise
+
+    def frame(name: str, data: dict, current_seq: int, msg_id: int) -> str:
+        return (
+            f'id: {event_id(current_seq, msg_id)}\n'
+            f'event: {name}\n'
+            f'data: {json.dumps(data)}\n\n'
+        )
+
+    # свежий поток фильтрует очередь только по seq: сообщение, закоммиченное
+    # между подпиской и чтением последнего id, попадет в message_id, но его
+    # событие еще в очереди и должно уйти клиенту. Пропускаются только
+    # сообщения, уже отданные из БД
+    sent_from_db = {msg.id for msg in missed}
+
+    async def stream():
+        nonlocal message_id
+        try:
+            yield frame('ready', {'ticket_id': ticket_id}, seq, message_id)
+            for msg in missed:
+                message_id = max(message_id, msg.id)
+                yield frame(
+                    'message', msg.model_dump(mode='json'), seq, message_id
+                )
+            for event in backlog or []:
+                message_id = max(message_id, event.message_id or 0)
+                yield frame(event.name, event.data, event.seq, message_id)
+            # отставший клиент отписан при переполнении очереди: поток
+            # закрывается, EventSource переподключится с Last-Event-ID
+            while TicketStream.subscribed(ticket_id, queue):
+                try:
+                    event = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+                if event.seq <= seq or (
+                    backlog and event.seq <= backlog[-1].seq
+                ):
+                    continue  # уже отдано из буфера
+                if event.message_id in sent_from_db:
+                    continue  # уже отдано из БД
+                message_id = max(message_id, event.message_id or 0)
+                yield frame(event.name, event.data, event.seq, message_id)
+        finally:
+            TicketStream.unsubscribe(ticket_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@router.patch(
+        '/bulk',
+        description=(
+            'Массовое обновление тикетов по списку id и/или фильтру'
+        )
+    )
+@auth_check
+async def bulk_update(
+    request: Request,
+    ticket_data: TicketBulkUpdate,
+    ticket_service: TicketService = Depends(get_ticket_service)
+) -> List[TicketShort]:
+    tickets = await ticket_service.bulk_update(ticket_data)
+    return tickets
+
+
 @router.patch(
         '/{ticket_id}',
         description='Обновление тикета по его id'
@@ -84,19 +338,67 @@ async def update(
     return ticket
 
 
+async def acknowledge(websocket: WebSocket, pending: asyncio.Queue) -> None:
+    """Подтверждает кадры соединения по порядку после их коммита."""
+    while True:
+        frame, future = await pending.get()
+        try:
+            message_id = await future
+        except HTTPException as e:
+            await websocket.send_text(json.dumps({
+                'type': 'error', 'frame': frame, 'detail': e.detail
+            }))
+            continue
+        await websocket.send_text(json.dumps({
+            'type': 'ack', 'frame': frame, 'message_id': message_id
+        }))
+
+
+# задачи закрытия сокетов, у которых упали подтверждения
+closing_sockets: set[asyncio.Task] = set()
+
+
+async def close_websocket(websocket: WebSocket) -> None:
+    try:
+        await websocket.close(code=1011)
+    except RuntimeError:
+        pass  # соединение уже закрыто
+
+
+def acknowledge_done(websocket: WebSocket, task: asyncio.Task) -> None:
+    """
+    Подтверждения остановились с ошибкой: без них клиент ждал бы ack
+    вечно, поэтому соединение закрывается и клиент переподключится.
+    """
+    if task.cancelled() or task.exception() is None:
+        return
+    logging.error(
+        'Ошибка подтверждения сообщений сокета', exc_info=task.exception()
+    )
+    close = asyncio.create_task(close_websocket(websocket))
+    closing_sockets.add(close)
+    close.add_done_callback(closing_sockets.discard)
+
+
 @router.websocket(
         "/ws/{ticket_id}"
     )
 async def websocket_endpoint(
     websocket: WebSocket,
-    ticket_id: int,
-    message_service: MessageService = Depends(get_message_service)
+    ticket_id: int
 ):
     await websocket.accept()
     # Сохраняем соединение
     await websocket.send_text("Создано соединение")
     TempConnection.connections[ticket_id] = websocket
     user_id = None
+    # кадры ждут коммита в очереди соединения, цикл приема не блокируется
+    pending: asyncio.Queue = asyncio.Queue(
+        maxsize=settings.WS_INGEST_QUEUE_SIZE
+    )
+    acks = asyncio.create_task(acknowledge(websocket, pending))
+    acks.add_done_callback(partial(acknowledge_done, websocket))
+    frame = 0
     try:
         while True:
             data = await websocket.receive_text()
@@ -105,43 +407,23 @@ async def websocket_endpoint(
             # фронт будет передавать в сокет токен, а мы уже обработаем это.
             if data.startswith('Authorization: '):
                 access_token = data.split(": ")[1]
-                if not access_token:
-                    raise HTTPException(
-                        status_code=401,
-                        detail='Требуется аутентификация'
-                    )
-                try:
-                    data = jwt.decode(
-                        access_token,
-                        settings.SECRET,
-                        algorithms='HS256'
-                    )
-                except ExpiredSignatureError:
-                    raise HTTPException(
-                        status_code=403,
-                        detail='токен истек'
-                    )
-                except InvalidTokenError as e:
-                    raise HTTPException(
-                        status_code=401,
-                        detail=f'токен недействителен, {str(e)}'
-                    )
-                except Exception as e:
-                    # Генерируем общее исключение для других ошибок
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f'ошибка при проверке токена: {str(e)}'
-                    )
-                user_id = int(data['user_id'])
+                user_id = user_id_from_token(access_token)
                 data = None
                 await websocket.send_text("Авторизация пройдена")
             if user_id and data is not None:
-                await message_service.create(
-                    MessageCreate(
-                        ticket_id=ticket_id,
-                        content=data,
-                    ),
-                    user_id
-                )
+                frame += 1
+                if pending.full():
+                    await websocket.send_text(json.dumps({
+                        'type': 'error',
+                        'frame': frame,
+                        'detail': 'Слишком много неподтвержденных сообщений'
+                    }))
+                    continue
+                pending.put_nowait((
+                    frame, message_writer.submit(ticket_id, user_id, data)
+                ))
+                read_after_write.mark(access_token)
     except WebSocketDisconnect:
         del TempConnection.connections[ticket_id]
+    finally:
+        acks.cancel()
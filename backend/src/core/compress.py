@@ -0,0 +1,12 @@
+import zlib
+from typing import AsyncIterator
+
+
+async def gzip_stream(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Сжимает поток текста в gzip на лету, не накапливая его в памяти."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,5 +1,6 @@
 import os
 from logging import config as logging_config
+from typing import Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -20,9 +21,73 @@ class Settings(BaseSettings):
 
     # Бот
     BOT_API_KEY: str = os.getenv('BOT_TOKEN')
+    # общий секрет межсервисных вызовов бота (заголовок X-Internal-Secret)
+    INTERNAL_API_SECRET: str = os.getenv('INTERNAL_API_SECRET', '')
+    # адрес Bot API: можно указать собственный сервер telegram-bot-api
+    TELEGRAM_API_URL: str = 'https://api.telegram.org'
+    # сервер запущен с --local: файлы передаются путями file://, поэтому
+    # FILE_PATH должен быть доступен серверу по тому же пути
+    TELEGRAM_LOCAL_MODE: bool = False
 
     # тут мы храним временные файлы
     FILE_PATH: str = '/fox_test/file_storage'
+    # сколько файлов одного запроса пишется на диск одновременно
+    FILE_WRITE_CONCURRENCY: int = 4
+    # сколько отправок в Telegram одного запроса идет одновременно
+    TELEGRAM_UPLOAD_CONCURRENCY: int = 2
+
+    # групповая запись сообщений из веб-сокетов: окно накопления в
+    # миллисекундах, размер пачки и очередь одного соединения
+    MESSAGE_BATCH_WINDOW_MS: int = 5
+    MESSAGE_BATCH_SIZE: int = 200
+    WS_INGEST_QUEUE_SIZE: int = 100
+
+    # защита от перегрузки: сколько запросов каждого класса маршрутов
+    # выполняется одновременно и сколько ждет в очереди. Классы read,
+    # write, message, auth и export берут соединения основной БД: их сумма
+    # вместе с DB_BACKGROUND_CONNECTIONS не больше пула DB_POOL_SIZE +
+    # DB_MAX_OVERFLOW. sse и websocket ограничивают число клиентских
+    # соединений, а не соединений с БД. health и internal (вызовы бота
+    # /message/notify и /ticket/assign) не ограничиваются вовсе
+    OVERLOAD_LIMITS: dict[str, int] = {
+        'read': 3,
+        'write': 2,
+        'message': 2,
+        'auth': 1,
+        'export': 2,
+        'sse': 500,
+        'websocket': 1000,
+    }
+    OVERLOAD_QUEUE_SIZE: dict[str, int] = {
+        'read': 50,
+        'write': 30,
+        'message': 100,
+        'auth': 20,
+        'export': 5,
+    }
+    # сколько секунд запрос ждет в очереди, прежде чем получить 503
+    OVERLOAD_QUEUE_TIMEOUT: float = 2
+    OVERLOAD_RETRY_AFTER: int = 1
+
+    # верхняя граница page[size] для списков
+    MAX_PAGE_SIZE: int = 500
+
+    # сколько открытых тикетов держать в памяти для очереди операторов.
+    # Индекс обновляется событиями своего процесса, поэтому работает только
+    # с одним воркером uvicorn; при WEB_CONCURRENCY > 1 он не загружается
+    OPEN_TICKET_INDEX_SIZE: int = 100000
+    # число воркеров uvicorn (переменная окружения uvicorn --workers)
+    WEB_CONCURRENCY: int = 1
+
+    # архив переписки: сообщения закрытых тикетов старше срока хранения
+    # сжимаются в message_archive; секции message создаются наперед
+    MESSAGE_RETENTION_DAYS: int = 180
+    MESSAGE_PARTITIONS_AHEAD: int = 3
+    ARCHIVE_INTERVAL: int = 3600
+    ARCHIVE_BATCH_SIZE: int = 100
+
+    # как часто сверять ticket_stats с ticket, в секундах
+    STATS_RECONCILE_INTERVAL: int = 3600
 
     # настройки ДБ
     DB_USER: str = os.getenv('POSTGRES_USER')
@@ -30,6 +95,25 @@ class Settings(BaseSettings):
     DB_HOST: str = os.getenv('POSTGRES_HOST')
     DB_PORT: str = os.getenv('POSTGRES_PORT')
     DB_NAME: str = os.getenv('POSTGRES_DB')
+    # реплика для чтения списков и карточек, тот же пользователь и база
+    DB_READ_HOST: Optional[str] = os.getenv('POSTGRES_READ_HOST')
+    DB_READ_PORT: Optional[str] = os.getenv('POSTGRES_READ_PORT')
+    # сколько секунд после записи клиент читает из основной БД
+    READ_STICKY_SECONDS: float = 5
+    # пул соединений SQLAlchemy на процесс (основная БД и реплика)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # соединения фоновых задач вне лимитов запросов: message_writer (в
+    # том числе сообщения веб-сокетов), сверка ticket_stats, архивация,
+    # дочитывание индекса открытых тикетов и сохранение telegram_file_id
+    # после ответа
+    DB_BACKGROUND_CONNECTIONS: int = 5
+
+    def telegram_url(self, method: str) -> str:
+        return (
+            f'{self.TELEGRAM_API_URL.rstrip("/")}/bot{self.BOT_API_KEY}'
+            f'/{method}'
+        )
 
     class Config:
         env_file = '.env'
@@ -1,2 +1,21 @@
+from src.core import json
+from src.core.events import EventBus
+
+
 class TempConnection:
     connections = {}
+
+
+async def notify_ticket_connections(event: dict) -> None:
+    # открытым сокетам тикетов сообщаем, что тикет нужно перечитать
+    if event['type'] != 'tickets_updated':
+        return
+    for ticket_id in event['ticket_ids']:
+        conn = TempConnection.connections.get(ticket_id)
+        if conn:
+            await conn.send_text(json.dumps(
+                {'type': 'ticket_updated', 'ticket_id': ticket_id}
+            ))
+
+
+EventBus.subscribe(notify_ticket_connections)
@@ -0,0 +1,34 @@
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    Внутрипроцессная шина событий по тикетам.
+    Сервисы публикуют сюда события после коммита, а подписчики (сокеты,
+    кэши, счетчики) на них реагируют.
+    """
+    subscribers: list[Callable[[dict], Awaitable[None]]] = []
+
+    @classmethod
+    def subscribe(cls, callback: Callable[[dict], Awaitable[None]]) -> None:
+        if callback not in cls.subscribers:
+            cls.subscribers.append(callback)
+
+    @classmethod
+    def unsubscribe(cls, callback: Callable[[dict], Awaitable[None]]) -> None:
+        if callback in cls.subscribers:
+            cls.subscribers.remove(callback)
+
+    @classmethod
+    async def publish(cls, event: dict) -> None:
+        for callback in list(cls.subscribers):
+            try:
+                await callback(event)
+            except Exception:
+                # упавший подписчик не должен ломать запись в БД
+                logger.exception(
+                    'Ошибка обработчика события %s', event.get('type')
+                )
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Optional
+
+from src.core.events import EventBus
+
+logger = logging.getLogger(__name__)
+
+
+class InboxSubscription:
+    """
+    Подписка оператора на ленту тикетов с фильтром по статусу и
+    исполнителю. Медленный клиент, не разбирающий очередь, отключается.
+    """
+    def __init__(
+        self,
+        filter_status: Optional[int] = None,
+        filter_user: Optional[int] = None,
+        queue_size: int = 1000
+    ):
+        self.filter_status = filter_status
+        self.filter_user = filter_user
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        # тикет, ушедший из выборки, тоже интересен подписчику
+        if self.filter_status and self.filter_status not in (
+            event['status_id'], event.get('old_status_id')
+        ):
+            return False
+        if self.filter_user and self.filter_user not in (
+            event['user_id'], event.get('old_user_id')
+        ):
+            return False
+        return True
+
+    def push(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Inbox:
+    subscriptions: set[InboxSubscription] = set()
+
+    @classmethod
+    def subscribe(cls, subscription: InboxSubscription) -> None:
+        cls.subscriptions.add(subscription)
+
+    @classmethod
+    def unsubscribe(cls, subscription: InboxSubscription) -> None:
+        cls.subscriptions.discard(subscription)
+
+    @classmethod
+    def publish(cls, event: dict) -> None:
+        for subscription in list(cls.subscriptions):
+            if subscription.matches(event):
+                subscription.push(event)
+
+
+def inbox_events(event: dict) -> list[dict]:
+    """Переводит событие шины в компактные события ленты операторов."""
+    if event['type'] == 'tickets_updated':
+        result = []
+        for change in event.get('changes', []):
+            compact = {
+                'ticket_id': change['id'],
+                'status_id': change['status_id'],
+                'user_id': change['user_id'],
+                'old_status_id': change['old_status_id'],
+                'old_user_id': change['old_user_id'],
+            }
+            if change['user_id'] != change['old_user_id']:
+                result.append({'event': 'ticket_assigned', **compact})
+            if change['status_id'] != change['old_status_id']:
+                result.append({'event': 'ticket_status_changed', **compact})
+        return result
+    if event['type'] in ('ticket_created', 'message_created'):
+        return [{
+            'event': event['type'],
+            'ticket_id': event['ticket_id'],
+            'status_id': event['status_id'],
+            'user_id': event['user_id'],
+            **(
+                {'message_id': event['message_id']}
+                if event['type'] == 'message_created' else {}
+            ),
+        }]
+    return []
+
+
+async def publish_to_inbox(event: dict) -> None:
+    for inbox_event in inbox_events(event):
+        Inbox.publish(inbox_event)
+
+
+EventBus.subscribe(publish_to_inbox)
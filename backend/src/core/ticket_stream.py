@@ -0,0 +1,147 @@
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+from src.core.events import EventBus
+
+# сколько последних событий помнить на тикет и для скольких тикетов
+BUFFER_SIZE = 256
+MAX_TICKETS = 10000
+# сколько событий может ждать отправки одному подписчику
+QUEUE_SIZE = 1000
+# эпоха меняется при рестарте процесса: старые id событий не сравнимы
+EPOCH = uuid.uuid4().hex[:8]
+
+
+class TicketStreamEvent:
+    __slots__ = ('seq', 'message_id', 'name', 'data')
+
+    def __init__(
+        self, seq: int, message_id: Optional[int], name: str, data: dict
+    ):
+        self.seq = seq
+        self.message_id = message_id
+        self.name = name
+        self.data = data
+
+
+def event_id(seq: int, message_id: int) -> str:
+    """
+    id события для SSE: эпоха, номер события и последний отданный клиенту
+    message_id, по которому пропущенное можно догрузить из БД.
+    """
+    return f'{EPOCH}.{seq}.{message_id}'
+
+
+def parse_event_id(value: Optional[str]) -> Optional[tuple[str, int, int]]:
+    """Разбирает Last-Event-ID в (epoch, seq, message_id)."""
+    try:
+        epoch, seq, message_id = value.split('.')
+        return epoch, int(seq), int(message_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+class TicketStream:
+    """
+    События переписки по тикетам с монотонными в пределах процесса id и
+    кольцевым буфером последних BUFFER_SIZE событий на тикет для досылки
+    после переподключения. floors хранит seq, до которого включительно
+    события тикета могли быть потеряны (вытеснены из буфера). Подписчик,
+    чья очередь переполнилась, отписывается и догоняет по Last-Event-ID.
+    """
+    seq: int = 0
+    buffers: OrderedDict[int, deque] = OrderedDict()
+    floors: dict[int, int] = {}
+    subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    @classmethod
+    def buffer(cls, ticket_id: int) -> deque:
+        buffer = cls.buffers.get(ticket_id)
+        if buffer is None:
+            buffer = cls.buffers[ticket_id] = deque(maxlen=BUFFER_SIZE)
+            cls.floors[ticket_id] = cls.seq
+            while len(cls.buffers) > MAX_TICKETS:
+                old_ticket_id, _ = cls.buffers.popitem(last=False)
+                cls.floors.pop(old_ticket_id, None)
+        else:
+            cls.buffers.move_to_end(ticket_id)
+        return buffer
+
+    @classmethod
+    def publish(
+        cls, ticket_id: int, name: str, data: dict,
+        message_id: Optional[int] = None
+    ) -> None:
+        buffer = cls.buffer(ticket_id)
+        cls.seq += 1
+        if len(buffer) == buffer.maxlen:
+            cls.floors[ticket_id] = buffer[0].seq
+        event = TicketStreamEvent(cls.seq, message_id, name, data)
+        buffer.append(event)
+        for queue in list(cls.subscribers.get(ticket_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                cls.unsubscribe(ticket_id, queue)
+
+    @classmethod
+    def subscribe(cls, ticket_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        cls.subscribers.setdefault(ticket_id, set()).add(queue)
+        return queue
+
+    @classmethod
+    def subscribed(cls, ticket_id: int, queue: asyncio.Queue) -> bool:
+        return queue in cls.subscribers.get(ticket_id, ())
+
+    @classmethod
+    def unsubscribe(cls, ticket_id: int, queue: asyncio.Queue) -> None:
+        queues = cls.subscribers.get(ticket_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del cls.subscribers[ticket_id]
+
+    @classmethod
+    def replay(
+        cls, ticket_id: int, epoch: str, seq: int
+    ) -> Optional[list[TicketStreamEvent]]:
+        """
+        События тикета после seq из буфера. None - буфер не покрывает
+        пропуск (другая эпоха или события вытеснены), нужно идти в БД.
+        """
+        if epoch != EPOCH or ticket_id not in cls.buffers:
+            return None
+        if seq < cls.floors[ticket_id]:
+            return None
+        return [event for event in cls.buffers[ticket_id] if event.seq > seq]
+
+
+async def publish_to_ticket_stream(event: dict) -> None:
+    if event['type'] == 'message_created':
+        TicketStream.publish(
+            event['ticket_id'],
+            'message',
+            {
+                'id': event['message_id'],
+                'user_id': event.get('author_id'),
+                'content': event.get('content'),
+                'created_at': event.get('created_at'),
+            },
+            message_id=event['message_id']
+        )
+    elif event['type'] == 'tickets_updated':
+        for change in event.get('changes', []):
+            TicketStream.publish(
+                change['id'],
+                'ticket_updated',
+                {
+                    'status_id': change['status_id'],
+                    'user_id': change['user_id']
+                }
+            )
+
+
+EventBus.subscribe(publish_to_ticket_stream)
@@ -0,0 +1,34 @@
+"""file status
+
+Revision ID: 1b9d4c7e3f52
+Revises: e8b3f6a1c2d4
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b9d4c7e3f52'
+down_revision: Union[str, None] = 'e8b3f6a1c2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'file',
+        sa.Column(
+            'status',
+            sa.String(length=16),
+            server_default='ready',
+            nullable=False
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('file', 'status')
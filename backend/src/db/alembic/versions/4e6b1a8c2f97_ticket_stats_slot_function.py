@@ -0,0 +1,82 @@
+"""ticket stats slot function
+
+Revision ID: 4e6b1a8c2f97
+Revises: d3a8c5f0e6b2
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e6b1a8c2f97'
+down_revision: Union[str, None] = 'd3a8c5f0e6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # строку счетчика выбирает одна функция: ее вызывают и триггер, и
+    # сверка в приложении. Число слотов меняется только новой миграцией,
+    # которая заодно пересобирает ticket_stats
+    op.execute(
+        """
+        CREATE FUNCTION ticket_stats_slot(ticket_id integer)
+        RETURNS smallint AS $$
+            SELECT (ticket_id % 8)::smallint
+        $$ LANGUAGE sql IMMUTABLE
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION ticket_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE ticket_stats SET count = count - 1
+                WHERE status_id = OLD.status_id
+                    AND user_id = coalesce(OLD.user_id, 0)
+                    AND slot = ticket_stats_slot(OLD.id);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO ticket_stats (status_id, user_id, slot, count)
+                VALUES (
+                    NEW.status_id,
+                    coalesce(NEW.user_id, 0),
+                    ticket_stats_slot(NEW.id),
+                    1
+                )
+                ON CONFLICT (status_id, user_id, slot)
+                DO UPDATE SET count = ticket_stats.count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION ticket_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE ticket_stats SET count = count - 1
+                WHERE status_id = OLD.status_id
+                    AND user_id = coalesce(OLD.user_id, 0)
+                    AND slot = OLD.id % 8;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO ticket_stats (status_id, user_id, slot, count)
+                VALUES (NEW.status_id, coalesce(NEW.user_id, 0), NEW.id % 8, 1)
+                ON CONFLICT (status_id, user_id, slot)
+                DO UPDATE SET count = ticket_stats.count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute('DROP FUNCTION ticket_stats_slot(integer)')
@@ -0,0 +1,62 @@
+"""ticket change xid
+
+Revision ID: 5d2a7c9e1b43
+Revises: 1b9d4c7e3f52
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a7c9e1b43'
+down_revision: Union[str, None] = '1b9d4c7e3f52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'ticket',
+        sa.Column(
+            'change_xid',
+            sa.BigInteger(),
+            server_default=sa.text('txid_current()'),
+            nullable=False
+        )
+    )
+    # любое изменение строки, в том числе сводки при новом сообщении,
+    # помечается id транзакции - и из бэкенда, и из бота
+    op.execute(
+        """
+        CREATE FUNCTION ticket_change_xid() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_xid := txid_current();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ticket_change_xid
+        BEFORE UPDATE ON ticket
+        FOR EACH ROW EXECUTE FUNCTION ticket_change_xid()
+        """
+    )
+    op.create_index(
+        'ix_ticket_change_xid_id',
+        'ticket',
+        ['change_xid', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ticket_change_xid_id', table_name='ticket')
+    op.execute('DROP TRIGGER ticket_change_xid ON ticket')
+    op.execute('DROP FUNCTION ticket_change_xid()')
+    op.drop_column('ticket', 'change_xid')
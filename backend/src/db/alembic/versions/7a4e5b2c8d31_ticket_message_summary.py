@@ -0,0 +1,86 @@
+"""ticket message summary
+
+Revision ID: 7a4e5b2c8d31
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4e5b2c8d31'
+down_revision: Union[str, None] = '3f1c2a9d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'ticket',
+        sa.Column(
+            'message_count',
+            sa.Integer(),
+            server_default=sa.text('0'),
+            nullable=False
+        )
+    )
+    op.add_column(
+        'ticket', sa.Column('last_message_id', sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        'ticket',
+        sa.Column(
+            'last_message_at', sa.TIMESTAMP(timezone=True), nullable=True
+        )
+    )
+    op.add_column(
+        'ticket',
+        sa.Column(
+            'last_customer_message_at',
+            sa.TIMESTAMP(timezone=True),
+            nullable=True
+        )
+    )
+    # заполняем сводку по уже накопленным сообщениям
+    op.execute(
+        """
+        UPDATE ticket
+        SET message_count = summary.message_count,
+            last_message_id = summary.last_message_id,
+            last_message_at = summary.last_message_at,
+            last_customer_message_at = summary.last_customer_message_at
+        FROM (
+            SELECT
+                ticket_id,
+                count(*) AS message_count,
+                max(id) AS last_message_id,
+                max(created_at) AS last_message_at,
+                max(created_at) FILTER (
+                    WHERE user_id IS NULL
+                ) AS last_customer_message_at
+            FROM message
+            GROUP BY ticket_id
+        ) AS summary
+        WHERE ticket.id = summary.ticket_id
+        """
+    )
+    op.create_index(
+        'ix_ticket_status_last_customer_message_at',
+        'ticket',
+        ['status_id', 'last_customer_message_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_ticket_status_last_customer_message_at', table_name='ticket'
+    )
+    op.drop_column('ticket', 'last_customer_message_at')
+    op.drop_column('ticket', 'last_message_at')
+    op.drop_column('ticket', 'last_message_id')
+    op.drop_column('ticket', 'message_count')
@@ -0,0 +1,217 @@
+"""message partitions and archive
+
+Revision ID: 9c4f1e7a2b85
+Revises: 5d2a7c9e1b43
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f1e7a2b85'
+down_revision: Union[str, None] = '5d2a7c9e1b43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('ALTER TABLE message RENAME TO message_unpartitioned')
+    op.execute(
+        'ALTER INDEX message_pkey RENAME TO message_unpartitioned_pkey'
+    )
+    op.execute(
+        'ALTER INDEX ix_message_search_vector '
+        'RENAME TO ix_message_unpartitioned_search_vector'
+    )
+    op.execute('CREATE SEQUENCE message_partitioned_id_seq')
+    # ключ секционирования обязан входить в первичный ключ
+    op.execute(
+        """
+        CREATE TABLE message (
+            id integer NOT NULL
+                DEFAULT nextval('message_partitioned_id_seq'),
+            ticket_id integer NOT NULL REFERENCES ticket (id),
+            user_id integer REFERENCES "user" (id),
+            content varchar(1024) NOT NULL,
+            created_at timestamp with time zone NOT NULL
+                DEFAULT TIMEZONE('utc', now()),
+            search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('russian', coalesce(content, ''))
+            ) STORED,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(
+        'ALTER SEQUENCE message_partitioned_id_seq OWNED BY message.id'
+    )
+    op.execute('CREATE TABLE message_default PARTITION OF message DEFAULT')
+    # помесячные секции: функцию периодически вызывает бэкенд, чтобы
+    # секции на ближайшие месяцы существовали заранее
+    op.execute(
+        """
+        CREATE FUNCTION message_ensure_partitions(
+            since timestamp with time zone, months_ahead integer
+        ) RETURNS void AS $$
+        DECLARE
+            month_start timestamp;
+            last_month timestamp := date_trunc(
+                'month', now() AT TIME ZONE 'utc'
+            ) + make_interval(months => months_ahead);
+            partition_name text;
+        BEGIN
+            month_start := date_trunc('month', since AT TIME ZONE 'utc');
+            WHILE month_start <= last_month LOOP
+                partition_name := 'message_'
+                    || to_char(month_start, 'YYYY_MM');
+                IF to_regclass(partition_name) IS NULL THEN
+                    BEGIN
+                        EXECUTE format(
+                            'CREATE TABLE %I PARTITION OF message '
+                            'FOR VALUES FROM (%L) TO (%L)',
+                            partition_name,
+                            month_start AT TIME ZONE 'utc',
+                            (month_start + interval '1 month')
+                                AT TIME ZONE 'utc'
+                        );
+                    EXCEPTION WHEN others THEN
+                        -- например, строки этого месяца уже в default
+                        RAISE WARNING 'секция % не создана: %',
+                            partition_name, SQLERRM;
+                    END;
+                END IF;
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        SELECT message_ensure_partitions(
+            coalesce(min(created_at), now()), 3
+        )
+        FROM message_unpartitioned
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO message (id, ticket_id, user_id, content, created_at)
+        SELECT id, ticket_id, user_id, content, created_at
+        FROM message_unpartitioned
+        """
+    )
+    op.execute(
+        """
+        SELECT setval(
+            'message_partitioned_id_seq',
+            coalesce(max(id), 0) + 1,
+            false
+        )
+        FROM message
+        """
+    )
+    op.execute('DROP TABLE message_unpartitioned')
+    op.create_index(
+        'ix_message_search_vector',
+        'message',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_message_ticket_id_id',
+        'message',
+        ['ticket_id', 'id'],
+        unique=False
+    )
+    # сообщения закрытых тикетов старше срока хранения: одна строка на
+    # тикет со сжатым JSON-массивом сообщений
+    op.create_table(
+        'message_archive',
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column(
+            'first_message_at', sa.TIMESTAMP(timezone=True), nullable=True
+        ),
+        sa.Column(
+            'last_message_at', sa.TIMESTAMP(timezone=True), nullable=True
+        ),
+        sa.Column(
+            'archived_at',
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("TIMEZONE('utc', now())"),
+            nullable=False
+        ),
+        sa.Column('messages', postgresql.BYTEA(), nullable=False),
+        sa.ForeignKeyConstraint(['ticket_id'], ['ticket.id']),
+        sa.PrimaryKeyConstraint('ticket_id')
+    )
+    # данные уже сжаты приложением, повторно их не сжимаем
+    op.execute(
+        'ALTER TABLE message_archive '
+        'ALTER COLUMN messages SET STORAGE EXTERNAL'
+    )
+
+
+def downgrade() -> None:
+    # архив сжат приложением и средствами SQL не распаковывается:
+    # перед откатом его нужно вернуть в message из приложения
+    op.execute('ALTER TABLE message RENAME TO message_partitioned')
+    op.execute(
+        'ALTER INDEX message_pkey RENAME TO message_partitioned_pkey'
+    )
+    op.execute(
+        'ALTER INDEX ix_message_search_vector '
+        'RENAME TO ix_message_partitioned_search_vector'
+    )
+    op.execute(
+        """
+        CREATE TABLE message (
+            id serial PRIMARY KEY,
+            ticket_id integer NOT NULL REFERENCES ticket (id),
+            user_id integer REFERENCES "user" (id),
+            content varchar(1024) NOT NULL,
+            created_at timestamp with time zone NOT NULL
+                DEFAULT TIMEZONE('utc', now()),
+            search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('russian', coalesce(content, ''))
+            ) STORED
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO message (id, ticket_id, user_id, content, created_at)
+        SELECT id, ticket_id, user_id, content, created_at
+        FROM message_partitioned
+        """
+    )
+    op.execute(
+        """
+        SELECT setval(
+            pg_get_serial_sequence('message', 'id'),
+            coalesce(max(id), 0) + 1,
+            false
+        )
+        FROM message
+        """
+    )
+    op.execute('DROP TABLE message_partitioned')
+    op.execute(
+        'DROP FUNCTION message_ensure_partitions(timestamp with time zone, '
+        'integer)'
+    )
+    op.create_index(
+        'ix_message_search_vector',
+        'message',
+        ['search_vector'],
+        unique=False,
+        postgresql_using='gin'
+    )
+    op.drop_table('message_archive')
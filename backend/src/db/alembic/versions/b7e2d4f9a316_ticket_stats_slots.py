@@ -0,0 +1,101 @@
+"""ticket stats slots
+
+Revision ID: b7e2d4f9a316
+Revises: 9c4f1e7a2b85
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4f9a316'
+down_revision: Union[str, None] = '9c4f1e7a2b85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # все новые тикеты без исполнителя попадали в одну строку
+    # (status_id=1, user_id=0): каждая пара разбита на 8 строк по id % 8
+    op.add_column(
+        'ticket_stats',
+        sa.Column(
+            'slot', sa.SmallInteger(), server_default=sa.text('0'),
+            nullable=False
+        )
+    )
+    op.drop_constraint('ticket_stats_pkey', 'ticket_stats', type_='primary')
+    op.create_primary_key(
+        'ticket_stats_pkey', 'ticket_stats', ['status_id', 'user_id', 'slot']
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION ticket_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE ticket_stats SET count = count - 1
+                WHERE status_id = OLD.status_id
+                    AND user_id = coalesce(OLD.user_id, 0)
+                    AND slot = OLD.id % 8;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO ticket_stats (status_id, user_id, slot, count)
+                VALUES (NEW.status_id, coalesce(NEW.user_id, 0), NEW.id % 8, 1)
+                ON CONFLICT (status_id, user_id, slot)
+                DO UPDATE SET count = ticket_stats.count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute('LOCK TABLE ticket IN SHARE MODE')
+    op.execute('DELETE FROM ticket_stats')
+    op.execute(
+        """
+        INSERT INTO ticket_stats (status_id, user_id, slot, count)
+        SELECT status_id, coalesce(user_id, 0), id % 8, count(*)
+        FROM ticket GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION ticket_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE ticket_stats SET count = count - 1
+                WHERE status_id = OLD.status_id
+                    AND user_id = coalesce(OLD.user_id, 0);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO ticket_stats (status_id, user_id, count)
+                VALUES (NEW.status_id, coalesce(NEW.user_id, 0), 1)
+                ON CONFLICT (status_id, user_id)
+                DO UPDATE SET count = ticket_stats.count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute('LOCK TABLE ticket IN SHARE MODE')
+    op.execute('DELETE FROM ticket_stats')
+    op.drop_constraint('ticket_stats_pkey', 'ticket_stats', type_='primary')
+    op.drop_column('ticket_stats', 'slot')
+    op.create_primary_key(
+        'ticket_stats_pkey', 'ticket_stats', ['status_id', 'user_id']
+    )
+    op.execute(
+        """
+        INSERT INTO ticket_stats (status_id, user_id, count)
+        SELECT status_id, coalesce(user_id, 0), count(*)
+        FROM ticket GROUP BY 1, 2
+        """
+    )
@@ -0,0 +1,85 @@
+"""ticket stats
+
+Revision ID: c52d8e1f4a67
+Revises: 7a4e5b2c8d31
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52d8e1f4a67'
+down_revision: Union[str, None] = '7a4e5b2c8d31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ticket_stats',
+        sa.Column('status_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'count', sa.Integer(), server_default=sa.text('0'), nullable=False
+        ),
+        sa.PrimaryKeyConstraint('status_id', 'user_id')
+    )
+    # счетчики ведет сама БД, поэтому их не обходят ни бот, ни массовые
+    # UPDATE из бэкенда
+    op.execute(
+        """
+        CREATE FUNCTION ticket_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE ticket_stats SET count = count - 1
+                WHERE status_id = OLD.status_id
+                    AND user_id = coalesce(OLD.user_id, 0);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO ticket_stats (status_id, user_id, count)
+                VALUES (NEW.status_id, coalesce(NEW.user_id, 0), 1)
+                ON CONFLICT (status_id, user_id)
+                DO UPDATE SET count = ticket_stats.count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ticket_stats_insert_delete
+        AFTER INSERT OR DELETE ON ticket
+        FOR EACH ROW EXECUTE FUNCTION ticket_stats_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ticket_stats_update
+        AFTER UPDATE OF status_id, user_id ON ticket
+        FOR EACH ROW
+        WHEN (
+            OLD.status_id IS DISTINCT FROM NEW.status_id
+            OR OLD.user_id IS DISTINCT FROM NEW.user_id
+        )
+        EXECUTE FUNCTION ticket_stats_apply()
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO ticket_stats (status_id, user_id, count)
+        SELECT status_id, coalesce(user_id, 0), count(*)
+        FROM ticket GROUP BY 1, 2
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER ticket_stats_update ON ticket')
+    op.execute('DROP TRIGGER ticket_stats_insert_delete ON ticket')
+    op.execute('DROP FUNCTION ticket_stats_apply()')
+    op.drop_table('ticket_stats')
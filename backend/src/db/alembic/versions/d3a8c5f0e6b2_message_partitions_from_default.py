@@ -0,0 +1,143 @@
+"""message partitions from default
+
+Revision ID: d3a8c5f0e6b2
+Revises: b7e2d4f9a316
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a8c5f0e6b2'
+down_revision: Union[str, None] = 'b7e2d4f9a316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # меняется тип результата, поэтому CREATE OR REPLACE не подходит
+    op.execute(
+        'DROP FUNCTION message_ensure_partitions(timestamp with time zone, '
+        'integer)'
+    )
+    # если строки месяца уже попали в message_default, секцию нельзя
+    # создать через PARTITION OF: строки переносятся из default в новую
+    # таблицу, и она подключается как секция. Неудачи возвращаются
+    # вызывающему, а не только пишутся в лог сервера
+    op.execute(
+        """
+        CREATE FUNCTION message_ensure_partitions(
+            since timestamp with time zone, months_ahead integer
+        ) RETURNS TABLE (partition_name text, error text) AS $$
+        DECLARE
+            month_start timestamp;
+            last_month timestamp := date_trunc(
+                'month', now() AT TIME ZONE 'utc'
+            ) + make_interval(months => months_ahead);
+            month_from timestamp with time zone;
+            month_to timestamp with time zone;
+        BEGIN
+            month_start := date_trunc('month', since AT TIME ZONE 'utc');
+            WHILE month_start <= last_month LOOP
+                partition_name := 'message_'
+                    || to_char(month_start, 'YYYY_MM');
+                month_from := month_start AT TIME ZONE 'utc';
+                month_to := (month_start + interval '1 month')
+                    AT TIME ZONE 'utc';
+                IF to_regclass(partition_name) IS NULL THEN
+                    BEGIN
+                        -- новые строки месяца ждут, пока секция
+                        -- подключится, иначе ATTACH найдет их в default
+                        LOCK TABLE message_default
+                            IN ACCESS EXCLUSIVE MODE;
+                        IF EXISTS (
+                            SELECT 1 FROM message_default
+                            WHERE created_at >= month_from
+                                AND created_at < month_to
+                        ) THEN
+                            EXECUTE format(
+                                'CREATE TABLE %I (LIKE message '
+                                'INCLUDING DEFAULTS INCLUDING GENERATED)',
+                                partition_name
+                            );
+                            EXECUTE format(
+                                'WITH moved AS ('
+                                'DELETE FROM message_default '
+                                'WHERE created_at >= %L AND created_at < %L '
+                                'RETURNING id, ticket_id, user_id, content, '
+                                'created_at) '
+                                'INSERT INTO %I (id, ticket_id, user_id, '
+                                'content, created_at) '
+                                'SELECT * FROM moved',
+                                month_from, month_to, partition_name
+                            );
+                            EXECUTE format(
+                                'ALTER TABLE message ATTACH PARTITION %I '
+                                'FOR VALUES FROM (%L) TO (%L)',
+                                partition_name, month_from, month_to
+                            );
+                        ELSE
+                            EXECUTE format(
+                                'CREATE TABLE %I PARTITION OF message '
+                                'FOR VALUES FROM (%L) TO (%L)',
+                                partition_name, month_from, month_to
+                            );
+                        END IF;
+                    EXCEPTION WHEN others THEN
+                        error := SQLERRM;
+                        RETURN NEXT;
+                    END;
+                END IF;
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        'DROP FUNCTION message_ensure_partitions(timestamp with time zone, '
+        'integer)'
+    )
+    op.execute(
+        """
+        CREATE FUNCTION message_ensure_partitions(
+            since timestamp with time zone, months_ahead integer
+        ) RETURNS void AS $$
+        DECLARE
+            month_start timestamp;
+            last_month timestamp := date_trunc(
+                'month', now() AT TIME ZONE 'utc'
+            ) + make_interval(months => months_ahead);
+            partition_name text;
+        BEGIN
+            month_start := date_trunc('month', since AT TIME ZONE 'utc');
+            WHILE month_start <= last_month LOOP
+                partition_name := 'message_'
+                    || to_char(month_start, 'YYYY_MM');
+                IF to_regclass(partition_name) IS NULL THEN
+                    BEGIN
+                        EXECUTE format(
+                            'CREATE TABLE %I PARTITION OF message '
+                            'FOR VALUES FROM (%L) TO (%L)',
+                            partition_name,
+                            month_start AT TIME ZONE 'utc',
+                            (month_start + interval '1 month')
+                                AT TIME ZONE 'utc'
+                        );
+                    EXCEPTION WHEN others THEN
+                        RAISE WARNING 'секция % не создана: %',
+                            partition_name, SQLERRM;
+                    END;
+                END IF;
+                month_start := month_start + interval '1 month';
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
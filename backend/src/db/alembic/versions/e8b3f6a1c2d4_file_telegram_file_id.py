@@ -0,0 +1,37 @@
+"""file telegram file id
+
+Revision ID: e8b3f6a1c2d4
+Revises: c52d8e1f4a67
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f6a1c2d4'
+down_revision: Union[str, None] = 'c52d8e1f4a67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'file', sa.Column('checksum', sa.String(length=64), nullable=True)
+    )
+    op.add_column(
+        'file',
+        sa.Column('telegram_file_id', sa.String(length=256), nullable=True)
+    )
+    op.create_index(
+        op.f('ix_file_checksum'), 'file', ['checksum'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_file_checksum'), table_name='file')
+    op.drop_column('file', 'telegram_file_id')
+    op.drop_column('file', 'checksum')
@@ -0,0 +1,74 @@
+from typing import Optional
+
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from src.core import json
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+
+
+def with_total(query: Select) -> Select:
+    """Добавляет к выборке страницы общее число строк через count(*) OVER()."""
+    return query.add_columns(func.count().over().label('total'))
+
+
+async def exact_count(session: AsyncSession, model, *conditions) -> int:
+    query = select(func.count('*')).select_from(model).where(*conditions)
+    return (await session.execute(query)).scalar()
+
+
+async def estimate_count(session: AsyncSession, model, *conditions) -> int:
+    """
+    Оценка числа строк без чтения таблицы: без фильтров берется
+    pg_class.reltuples, с фильтрами - оценка планировщика из EXPLAIN.
+    """
+    if not conditions:
+        reltuples = (await session.execute(
+            text(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = to_regclass(:table_name)'
+            ),
+            {'table_name': f'"{model.__tablename__}"'}
+        )).scalar()
+        # -1 означает, что таблицу еще не анализировали
+        return max(reltuples or 0, 0)
+    query = select(literal_column('1')).select_from(model).where(*conditions)
+    compiled = query.compile(
+        dialect=session.bind.dialect,
+        compile_kwargs={'literal_binds': True}
+    )
+    plan = (await session.execute(
+        text(f'EXPLAIN (FORMAT JSON) {compiled}')
+    )).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+async def count_page(
+    session: AsyncSession,
+    count_mode: str,
+    rows: list,
+    offset: int,
+    model,
+    *conditions
+) -> Optional[int]:
+    """
+    Общее число строк для страницы, выбранной через with_total
+    (строки - записи asyncpg из src.db.queries).
+    Для exact берется из самой страницы, отдельный count(*) нужен, только
+    если страница оказалась за концом выборки.
+    """
+    if count_mode == COUNT_NONE:
+        return None
+    if count_mode == COUNT_ESTIMATE:
+        return await estimate_count(session, model, *conditions)
+    if rows:
+        return rows[0]['total']
+    if not offset:
+        return 0
+    return await exact_count(session, model, *conditions)
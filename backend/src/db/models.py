@@ -1,7 +1,9 @@
 import datetime
 from typing import Annotated, Optional
 
-from sqlalchemy import TIMESTAMP, ForeignKey, Integer, String, text
+from sqlalchemy import (TIMESTAMP, BigInteger, Computed, ForeignKey, Index,
+                        Integer, LargeBinary, SmallInteger, String, text)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 created_at = Annotated[datetime.datetime, mapped_column(
@@ -20,6 +22,18 @@ timestamp = Annotated[datetime.date, mapped_column(
 )]
 
 
+# конфигурация полнотекстового поиска по сообщениям
+SEARCH_CONFIG = 'russian'
+
+# статусы открытых тикетов: новый и в работе
+OPEN_STATUS_IDS = (1, 2)
+
+# статусы файла
+FILE_PENDING = 'pending'
+FILE_READY = 'ready'
+FILE_FAILED = 'failed'
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -70,6 +84,21 @@ class Ticket(Base):
     status_id: Mapped[int] = mapped_column(ForeignKey('status.id'))
     created_at: Mapped[created_at]
     updated_at: Mapped[updated_at]
+    # денормализованная сводка по сообщениям, обновляется при записи
+    # сообщения в той же транзакции
+    message_count: Mapped[int] = mapped_column(server_default=text('0'))
+    last_message_id: Mapped[Optional[int]]
+    last_message_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        TIMESTAMP(timezone=True)
+    )
+    last_customer_message_at: Mapped[Optional[datetime.datetime]] = (
+        mapped_column(TIMESTAMP(timezone=True))
+    )
+    # id транзакции последнего изменения строки, ставится триггером;
+    # по нему клиенты забирают только изменившиеся тикеты
+    change_xid: Mapped[int] = mapped_column(
+        BigInteger, server_default=text('txid_current()')
+    )
 
     user: Mapped['User'] = relationship(
         back_populates='tickets', uselist=False
@@ -85,6 +114,16 @@ class Ticket(Base):
         back_populates='ticket', uselist=True
     )
 
+    __table_args__ = (
+        # очередь "дольше всех ждут ответа" по статусу
+        Index(
+            'ix_ticket_status_last_customer_message_at',
+            'status_id',
+            'last_customer_message_at'
+        ),
+        Index('ix_ticket_change_xid_id', 'change_xid', 'id'),
+    )
+
 
 class Message(Base):
     __tablename__ = "message"
@@ -95,16 +134,55 @@ class Message(Base):
     # в телеграмме ограничение на пост с медиа и файлами 1024 символа
     content: Mapped[str] = mapped_column(String(1024))
     created_at: Mapped[created_at]
+    # поддерживается самой БД, из приложения не пишется
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{SEARCH_CONFIG}', coalesce(content, ''))",
+            persisted=True
+        ),
+        deferred=True
+    )
 
     ticket: Mapped['Ticket'] = relationship(
         back_populates='messages', uselist=False, cascade='all, delete'
     )
 
+    # таблица секционирована по месяцам created_at (миграция 9c4f1e7a2b85),
+    # в БД первичный ключ (id, created_at); сообщения закрытых тикетов
+    # старше срока хранения переносятся в MessageArchive
+    __table_args__ = (
+        Index(
+            'ix_message_search_vector',
+            'search_vector',
+            postgresql_using='gin'
+        ),
+        Index('ix_message_ticket_id_id', 'ticket_id', 'id'),
+    )
+
     user: Mapped['User'] = relationship(
         back_populates='messages', uselist=False
     )
 
 
+class MessageArchive(Base):
+    __tablename__ = 'message_archive'
+
+    ticket_id: Mapped[int] = mapped_column(
+        ForeignKey('ticket.id'), primary_key=True
+    )
+    message_count: Mapped[int]
+    first_message_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        TIMESTAMP(timezone=True)
+    )
+    last_message_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        TIMESTAMP(timezone=True)
+    )
+    archived_at: Mapped[created_at]
+    # zlib-сжатый JSON-массив сообщений, см. service/archive.py
+    messages: Mapped[bytes] = mapped_column(LargeBinary)
+
+
 class File(Base):
     __tablename__ = 'file'
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -112,6 +190,14 @@ class File(Base):
     ticket_id: Mapped[int] = mapped_column(ForeignKey('ticket.id'))
     created_by: Mapped[Optional[int]] = mapped_column(ForeignKey('user.id'))
     created_at: Mapped[created_at]
+    # sha256 содержимого и file_id этого содержимого в Telegram, чтобы
+    # повторно отправлять файл без загрузки байтов
+    checksum: Mapped[Optional[str]] = mapped_column(String(64), index=True)
+    telegram_file_id: Mapped[Optional[str]] = mapped_column(String(256))
+    # документы из Telegram бот скачивает в фоне: pending -> ready/failed
+    status: Mapped[str] = mapped_column(
+        String(16), server_default=FILE_READY
+    )
 
     user: Mapped['User'] = relationship(
         back_populates='files', uselist=False
@@ -131,3 +217,21 @@ class Scheduler(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user.id'))
     telegram_user_id: Mapped[int] = mapped_column(Integer, unique=True)
+
+
+class TicketStats(Base):
+    """
+    Счетчики тикетов по статусу и исполнителю. Поддерживаются триггером
+    на ticket, user_id=0 означает тикеты без исполнителя. Каждая пара
+    разбита на несколько строк по ticket.id (SQL-функция ticket_stats_slot),
+    чтобы поток новых тикетов не упирался в блокировку одной строки;
+    читатели суммируют.
+    """
+    __tablename__ = 'ticket_stats'
+
+    status_id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    slot: Mapped[int] = mapped_column(
+        SmallInteger, primary_key=True, server_default=text('0')
+    )
+    count: Mapped[int] = mapped_column(server_default=text('0'))
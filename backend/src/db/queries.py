@@ -0,0 +1,169 @@
+from functools import lru_cache
+
+from sqlalchemy import Integer, any_, bindparam, desc, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from src.db.count import with_total
+from src.db.models import (File, Message, MessageArchive, Status, Ticket,
+                           User)
+
+DIALECT = asyncpg_dialect(paramstyle='numeric_dollar')
+
+
+class FastQuery:
+    """
+    Запрос, один раз скомпилированный в SQL с параметрами $1, $2, ...
+    Выполняется напрямую через asyncpg, минуя ORM, и возвращает записи
+    asyncpg. Подготовленный statement asyncpg кэширует на соединении.
+    """
+    def __init__(self, statement: Select):
+        compiled = statement.compile(dialect=DIALECT)
+        self.sql = compiled.string
+        self.columns = list(statement.selected_columns.keys())
+        self.names = compiled.positiontup or []
+        self.defaults = compiled.params
+
+    def args(self, params: dict) -> list:
+        return [params.get(name, self.defaults[name]) for name in self.names]
+
+    async def fetch(self, session: AsyncSession, **params) -> list:
+        connection = await driver_connection(session)
+        return await connection.fetch(self.sql, *self.args(params))
+
+    async def fetchrow(self, session: AsyncSession, **params):
+        connection = await driver_connection(session)
+        return await connection.fetchrow(self.sql, *self.args(params))
+
+
+async def driver_connection(session: AsyncSession):
+    """Соединение asyncpg текущей транзакции сессии."""
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    return raw_connection.driver_connection
+
+
+def ticket_rows(ticket=Ticket.__table__) -> Select:
+    """Строки тикетов с именами статуса и исполнителя из ticket."""
+    return select(
+            ticket.c.id,
+            ticket.c.telegram_user_id,
+            ticket.c.user_id,
+            User.username,
+            ticket.c.status_id,
+            Status.name.label('status_name'),
+            ticket.c.created_at,
+            ticket.c.updated_at,
+            ticket.c.message_count,
+            ticket.c.last_message_id,
+            ticket.c.last_message_at,
+            ticket.c.last_customer_message_at
+        ).join(
+            Status, Status.id == ticket.c.status_id
+        ).outerjoin(
+            User, User.id == ticket.c.user_id
+        )
+
+
+def order(table, sort: str, default: str, columns=None):
+    """
+    Сортировка по полю table из sort (`-` - по убыванию), неизвестное
+    поле заменяется на default. columns - колонки, по которым сортировать,
+    если не колонки самой table (например, подзапроса из нее).
+    """
+    name = sort.lstrip('-')
+    if name not in table.c:
+        name = default
+    column = (table.c if columns is None else columns)[name]
+    return desc(column) if sort.startswith('-') else column
+
+
+@lru_cache(maxsize=64)
+def ticket_page(
+    sort: str, by_status: bool, by_user: bool, counted: bool
+) -> FastQuery:
+    # сначала страница из одной ticket, статус и исполнитель
+    # присоединяются только к ее строкам, а не ко всей выборке
+    page = select(Ticket.__table__)
+    if by_status:
+        page = page.where(Ticket.status_id == bindparam('status_id'))
+    if by_user:
+        page = page.where(Ticket.user_id == bindparam('user_id'))
+    if counted:
+        page = with_total(page)
+    page = page.order_by(
+            order(Ticket.__table__, sort, 'id')
+        ).offset(
+            bindparam('offset', type_=Integer)
+        ).limit(
+            bindparam('limit', type_=Integer)
+        ).subquery('page')
+    query = ticket_rows(page)
+    if counted:
+        query = query.add_columns(page.c.total)
+    return FastQuery(
+        query.order_by(order(Ticket.__table__, sort, 'id', page.c))
+    )
+
+
+TICKETS_BY_IDS = FastQuery(
+    ticket_rows().where(
+        Ticket.id == any_(bindparam('ids', type_=ARRAY(Integer)))
+    )
+)
+
+TICKET_BY_ID = FastQuery(
+    ticket_rows().where(Ticket.id == bindparam('ticket_id'))
+)
+
+TICKET_MESSAGES = FastQuery(
+    select(
+        Message.id,
+        Message.user_id,
+        Message.content,
+        Message.created_at
+    ).where(
+        Message.ticket_id == bindparam('ticket_id'),
+        # сообщения не старше тикета: отсекает лишние секции message
+        Message.created_at >= bindparam('ticket_created_at')
+    ).order_by(
+        Message.id
+    )
+)
+
+TICKET_ARCHIVE = FastQuery(
+    select(
+        MessageArchive.messages
+    ).where(
+        MessageArchive.ticket_id == bindparam('ticket_id')
+    )
+)
+
+
+@lru_cache(maxsize=64)
+def file_page(sort: str, by_ticket: bool, counted: bool) -> FastQuery:
+    query = select(
+            File.id,
+            File.name,
+            File.created_by,
+            User.username,
+            File.created_at,
+            File.status
+        ).outerjoin(
+            User, User.id == File.created_by
+        )
+    if by_ticket:
+        query = query.where(File.ticket_id == bindparam('ticket_id'))
+    if counted:
+        query = with_total(query)
+    return FastQuery(
+        query.order_by(
+            order(File.__table__, sort, 'created_at')
+        ).offset(
+            bindparam('offset', type_=Integer)
+        ).limit(
+            bindparam('limit', type_=Integer)
+        )
+    )
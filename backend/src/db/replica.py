@@ -0,0 +1,73 @@
+import time
+from typing import AsyncGenerator, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.db.sqlalchemy import get_async_session, read_session_factory
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadAfterWrite:
+    """
+    Запоминает клиентов, которые недавно писали, чтобы их чтения
+    STICKY_SECONDS шли в основную БД и не видели отставание реплики.
+    Клиент определяется по токену доступа.
+    """
+    def __init__(self, sticky_seconds: float, max_clients: int = 10000):
+        self.sticky_seconds = sticky_seconds
+        self.max_clients = max_clients
+        self.writes: dict[str, float] = {}
+
+    def mark(self, token: Optional[str]) -> None:
+        if not token:
+            return
+        now = time.monotonic()
+        self.writes[token] = now + self.sticky_seconds
+        if len(self.writes) > self.max_clients:
+            self.writes = {
+                key: until for key, until in self.writes.items()
+                if until > now
+            }
+
+    def recent(self, token: Optional[str]) -> bool:
+        until = self.writes.get(token) if token else None
+        return until is not None and until > time.monotonic()
+
+
+read_after_write = ReadAfterWrite(settings.READ_STICKY_SECONDS)
+
+
+def client_token(request: Request) -> Optional[str]:
+    authorization_header = request.headers.get('Authorization')
+    return authorization_header[7:] if authorization_header else None
+
+
+async def get_read_session(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session)
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия для чтения: реплика, если она настроена, запрос только читает
+    и клиент ничего не писал последние READ_STICKY_SECONDS секунд.
+    Иначе - та же сессия основной БД, что и у записи.
+    """
+    if (
+        read_session_factory is None
+        or request.method not in READ_METHODS
+        or read_after_write.recent(client_token(request))
+    ):
+        yield session
+        return
+    async with read_session_factory() as read_session:
+        yield read_session
+
+
+async def track_writes(request: Request, call_next):
+    """Middleware: отмечает клиентов после успешных запросов на запись."""
+    response = await call_next(request)
+    if request.method not in READ_METHODS and response.status_code < 400:
+        read_after_write.mark(client_token(request))
+    return response
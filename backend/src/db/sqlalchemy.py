@@ -7,10 +7,30 @@ from src.core.config import settings as s
 
 DATABASE_URL = f'postgresql+asyncpg://{s.DB_USER}:{s.DB_PASS}@{s.DB_HOST}:{s.DB_PORT}/{s.DB_NAME}'
 
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+async_engine = create_async_engine(
+    DATABASE_URL,
+    echo=True,
+    pool_size=s.DB_POOL_SIZE,
+    max_overflow=s.DB_MAX_OVERFLOW
+)
 
 async_session_factory = async_sessionmaker(async_engine)
 
+# реплика для чтения необязательна: без DB_READ_HOST все идет в основную БД
+read_session_factory = None
+if s.DB_READ_HOST:
+    READ_DATABASE_URL = (
+        f'postgresql+asyncpg://{s.DB_USER}:{s.DB_PASS}'
+        f'@{s.DB_READ_HOST}:{s.DB_READ_PORT or s.DB_PORT}/{s.DB_NAME}'
+    )
+    read_engine = create_async_engine(
+        READ_DATABASE_URL,
+        echo=True,
+        pool_size=s.DB_POOL_SIZE,
+        max_overflow=s.DB_MAX_OVERFLOW
+    )
+    read_session_factory = async_sessionmaker(read_engine)
+
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_factory() as session:
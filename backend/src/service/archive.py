@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import logging
+import zlib
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core import json
+from src.core.config import settings
+from src.db.models import OPEN_STATUS_IDS, Message, MessageArchive, Ticket
+from src.db.sqlalchemy import async_session_factory
+
+
+def pack(messages: List[dict]) -> bytes:
+    return zlib.compress(json.dumps(messages).encode(), 6)
+
+
+def unpack(data: bytes) -> List[dict]:
+    return json.loads(zlib.decompress(data))
+
+
+def merge(
+    ticket_id: int,
+    archive: Optional[MessageArchive],
+    messages: List[dict]
+) -> dict:
+    """
+    Строка message_archive для тикета: уже заархивированные сообщения,
+    за ними новые. messages отсортированы по id.
+    """
+    return {
+        'ticket_id': ticket_id,
+        'message_count': len(messages) + (
+            archive.message_count if archive else 0
+        ),
+        'first_message_at': (
+            archive.first_message_at if archive
+            else messages[0]['created_at']
+        ),
+        'last_message_at': messages[-1]['created_at'],
+        'messages': pack(
+            (unpack(archive.messages) if archive else []) + messages
+        ),
+    }
+
+
+class ArchiveService:
+    """
+    Холодное хранение переписки. Сообщения закрытых тикетов старше
+    MESSAGE_RETENTION_DAYS переносятся из секционированной message в
+    message_archive: одна строка на тикет со сжатым JSON-массивом.
+    """
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def ensure_partitions(self, months_ahead: int) -> List[str]:
+        """
+        Создает помесячные секции message. Возвращает имена секций,
+        которые создать не удалось: их сообщения остаются в
+        message_default.
+        """
+        async with self.session.begin():
+            failed = (await self.session.execute(
+                text(
+                    'SELECT partition_name, error '
+                    'FROM message_ensure_partitions(now(), :months)'
+                ),
+                {'months': months_ahead}
+            )).all()
+        for partition_name, error in failed:
+            logging.error(
+                'Секция %s не создана: %s', partition_name, error
+            )
+        return [partition_name for partition_name, _ in failed]
+
+    async def archive_batch(
+        self,
+        cutoff: datetime.datetime,
+        after_id: int,
+        batch_size: int
+    ) -> List[int]:
+        """
+        Архивирует следующую пачку закрытых тикетов с id > after_id.
+        Возвращает id обработанных тикетов.
+        """
+        async with self.session.begin():
+            ticket_ids = (await self.session.scalars(
+                select(
+                    Ticket.id
+                ).outerjoin(
+                    MessageArchive, MessageArchive.ticket_id == Ticket.id
+                ).where(
+                    Ticket.id > after_id,
+                    Ticket.status_id.not_in(OPEN_STATUS_IDS),
+                    Ticket.last_message_at < cutoff,
+                    # в архиве еще не все сообщения тикета
+                    Ticket.message_count > func.coalesce(
+                        MessageArchive.message_count, 0
+                    )
+                ).order_by(
+                    Ticket.id
+                ).limit(
+                    batch_size
+                ).with_for_update(
+                    of=Ticket, skip_locked=True
+                )
+            )).all()
+            if not ticket_ids:
+                return []
+            archives = {
+                x.ticket_id: x for x in (await self.session.scalars(
+                    select(MessageArchive).where(
+                        MessageArchive.ticket_id.in_(ticket_ids)
+                    )
+                )).all()
+            }
+            moved: dict[int, list] = {}
+            rows = await self.session.execute(
+                select(
+                    Message.ticket_id,
+                    Message.id,
+                    Message.user_id,
+                    Message.content,
+                    Message.created_at
+                ).where(
+                    Message.ticket_id.in_(ticket_ids),
+                    Message.created_at < cutoff
+                ).order_by(
+                    Message.ticket_id, Message.id
+                )
+            )
+            for row in rows:
+                moved.setdefault(row.ticket_id, []).append({
+                    'id': row.id,
+                    'user_id': row.user_id,
+                    'content': row.content,
+                    'created_at': row.created_at,
+                })
+            if moved:
+                values = [
+                    merge(ticket_id, archives.get(ticket_id), messages)
+                    for ticket_id, messages in moved.items()
+                ]
+                query = insert(MessageArchive)
+                await self.session.execute(
+                    query.on_conflict_do_update(
+                        index_elements=[MessageArchive.ticket_id],
+                        set_={
+                            'message_count': query.excluded.message_count,
+                            'first_message_at':
+                                query.excluded.first_message_at,
+                            'last_message_at': query.excluded.last_message_at,
+                            'messages': query.excluded.messages,
+                            'archived_at': func.now(),
+                        }
+                    ),
+                    values
+                )
+                await self.session.execute(
+                    delete(Message).where(
+                        Message.ticket_id.in_(ticket_ids),
+                        Message.created_at < cutoff
+                    )
+                )
+            logging.info(
+                'В архив перенесено %s сообщений %s тикетов',
+                sum(map(len, moved.values())), len(moved)
+            )
+            return ticket_ids
+
+
+async def archive_periodically(interval: int) -> None:
+    """Создает секции message наперед и архивирует старую переписку."""
+    while True:
+        try:
+            async with async_session_factory() as session:
+                await ArchiveService(session).ensure_partitions(
+                    settings.MESSAGE_PARTITIONS_AHEAD
+                )
+            cutoff = datetime.datetime.now(
+                datetime.timezone.utc
+            ) - datetime.timedelta(days=settings.MESSAGE_RETENTION_DAYS)
+            after_id = 0
+            while True:
+                async with async_session_factory() as session:
+                    ticket_ids = await ArchiveService(session).archive_batch(
+                        cutoff, after_id, settings.ARCHIVE_BATCH_SIZE
+                    )
+                if not ticket_ids:
+                    break
+                after_id = ticket_ids[-1]
+        except Exception:
+            logging.exception('Ошибка архивации сообщений')
+        await asyncio.sleep(interval)
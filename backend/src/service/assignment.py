@@ -0,0 +1,108 @@
+import heapq
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.events import EventBus
+from src.db.models import OPEN_STATUS_IDS, TicketStats, User
+
+
+class AssignmentEngine:
+    """
+    Выбор наименее загруженного доступного сотрудника для нового тикета.
+    Нагрузка - число открытых тикетов, хранится в памяти и меняется по
+    событиям записи. Кандидаты лежат в куче (нагрузка, user_id) с ленивым
+    удалением устаревших записей, поэтому выбор и изменение нагрузки
+    стоят O(log n) амортизированно.
+    """
+    def __init__(self):
+        self.load: dict[int, int] = {}
+        self.unavailable: set[int] = set()
+        self.heap: list[tuple[int, int]] = []
+
+    def reset(self, users: Iterable[int], load: dict[int, int]) -> None:
+        self.load = {user_id: load.get(user_id, 0) for user_id in users}
+        self.heap = [
+            (count, user_id) for user_id, count in self.load.items()
+            if user_id not in self.unavailable
+        ]
+        heapq.heapify(self.heap)
+
+    def push(self, user_id: int) -> None:
+        heapq.heappush(self.heap, (self.load[user_id], user_id))
+        if len(self.heap) > 4 * len(self.load) + 16:
+            # слишком много устаревших записей - пересобираем кучу
+            self.reset(list(self.load), self.load)
+
+    def adjust(self, user_id: Optional[int], delta: int) -> None:
+        if not user_id:
+            return
+        self.load[user_id] = max(self.load.get(user_id, 0) + delta, 0)
+        if user_id not in self.unavailable:
+            self.push(user_id)
+
+    def set_available(self, user_id: int, available: bool) -> None:
+        if available:
+            self.unavailable.discard(user_id)
+            self.load.setdefault(user_id, 0)
+            self.push(user_id)
+        else:
+            self.unavailable.add(user_id)
+
+    def pick(self) -> Optional[int]:
+        """Возвращает наименее загруженного сотрудника и резервирует тикет."""
+        while self.heap:
+            count, user_id = self.heap[0]
+            if (
+                user_id in self.unavailable
+                or self.load.get(user_id) != count
+            ):
+                # запись устарела: нагрузка менялась или сотрудник недоступен
+                heapq.heappop(self.heap)
+                continue
+            self.adjust(user_id, 1)
+            return user_id
+        return None
+
+    def assign(self, user_id: Optional[int] = None) -> Optional[int]:
+        """
+        Учитывает новый тикет: если исполнитель уже определен правилом
+        Scheduler, увеличивает его нагрузку, иначе выбирает исполнителя.
+        """
+        if user_id:
+            self.adjust(user_id, 1)
+            return user_id
+        return self.pick()
+
+    async def sync(self, session: AsyncSession) -> None:
+        """Загружает нагрузку из ticket_stats, без подсчета по ticket."""
+        async with session.begin():
+            users = (await session.scalars(select(User.id))).all()
+            rows = (await session.scalars(
+                select(TicketStats).where(
+                    TicketStats.status_id.in_(OPEN_STATUS_IDS)
+                )
+            )).all()
+        load = {}
+        for row in rows:
+            load[row.user_id] = load.get(row.user_id, 0) + row.count
+        self.reset(users, load)
+        logging.info('Нагрузка загружена для %s сотрудников', len(self.load))
+
+
+assignment_engine = AssignmentEngine()
+
+
+async def apply_ticket_changes(event: dict) -> None:
+    if event['type'] != 'tickets_updated':
+        return
+    for change in event.get('changes', []):
+        if change['old_status_id'] in OPEN_STATUS_IDS:
+            assignment_engine.adjust(change['old_user_id'], -1)
+        if change['status_id'] in OPEN_STATUS_IDS:
+            assignment_engine.adjust(change['user_id'], 1)
+
+
+EventBus.subscribe(apply_ticket_changes)
@@ -1,33 +1,68 @@
+import asyncio
+import hashlib
 import logging
+import os
+import shutil
+from contextlib import ExitStack
 from functools import lru_cache
-from typing import List, Tuple
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
 import requests
 
 from fastapi import Depends, HTTPException, Request, UploadFile
 from starlette.responses import FileResponse
 
-from sqlalchemy import desc, func, select
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from src.api.v1.schemas import FileDetail, ReadFile
 from src.api.v1.schemas import UploadFile as ShemaUploadFile
 from src.api.v1.schemas import UserRead
+from src.core import json
 from src.core.config import settings
-from src.db.models import File, Ticket, User
-from src.db.sqlalchemy import get_async_session
+from src.db import queries
+from src.db.count import COUNT_EXACT, count_page
+from src.db.models import FILE_READY, File, Ticket, User
+from src.db.replica import get_read_session
+from src.db.sqlalchemy import async_session_factory, get_async_session
+
+# максимальный размер альбома в sendMediaGroup
+MEDIA_GROUP_SIZE = 10
+
+
+class Attachment(NamedTuple):
+    id: int
+    name: str
+    checksum: str
+    telegram_file_id: Optional[str]
 
 
 class FileService:
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        read_session: Optional[AsyncSession] = None
+    ):
         self.session = session
+        self.read_session = read_session or session
+
+    @staticmethod
+    def path(file_id: int, file_name: str) -> str:
+        return f'{settings.FILE_PATH}/{file_id}.{file_name.split(".")[-1]}'
 
     async def upload(
             self, request: Request,
             files: list[UploadFile],
             auth_user_id: int,
             ticket_id: int
-    ):
+    ) -> Tuple[ShemaUploadFile, List[Attachment], int]:
+        """
+        Сохраняет файлы тикета: строки file вставляются одним INSERT ...
+        RETURNING, запись на диск идет параллельно с ограничением
+        FILE_WRITE_CONCURRENCY. Если такое же содержимое уже отправлялось
+        в Telegram, его file_id переиспользуется.
+        Возвращает схему ответа, вложения и telegram_user_id тикета для
+        последующей отправки файлов в Telegram.
+        """
         async with self.session.begin():
             user = await self.session.get(User, auth_user_id)
 
@@ -36,43 +71,79 @@ class FileService:
                 username=user.username
             )
             ticket = await self.session.get(Ticket, ticket_id)
-            if ticket:
-                file_schemas = []
-                for file in files:
-                    file_extension = file.filename.split('.')[-1]
-                    new_file = File(
-                        name=file.filename,
-                        ticket_id=ticket_id
-                    )
-                    new_file.created_by = user.id
-                    self.session.add(new_file)
-                    await self.session.flush()
-                    file_id = new_file.id
-                    content = file.file.read()
-                    with open(
-                        f'{settings.FILE_PATH}/{file_id}.{file_extension}',
-                        'wb'
-                    ) as f:
-                        f.write(content)
-                    await self.send_file(
-                        file_id,
-                        file_extension,
-                        file.filename,
-                        ticket.telegram_user_id
-                    )
-                    file_shema = ReadFile(
-                        id=file_id,
-                        name=file.filename
-                    )
-                    file_schemas.append(file_shema)
-                await self.session.commit()
-            else:
+            if not ticket:
                 raise HTTPException(
                     status_code=404,
                     detail='Несуществующий ticket_id'
                 )
+            checksums = await asyncio.gather(*(
+                asyncio.to_thread(self.checksum, file.file) for file in files
+            ))
+            known = dict((await self.session.execute(
+                select(
+                    File.checksum, File.telegram_file_id
+                ).where(
+                    File.checksum.in_(checksums),
+                    File.telegram_file_id.isnot(None)
+                )
+            )).all())
+            new_files = (await self.session.execute(
+                insert(File).returning(
+                    File.id,
+                    File.name,
+                    File.checksum,
+                    File.telegram_file_id,
+                    sort_by_parameter_order=True
+                ),
+                [
+                    {
+                        'name': file.filename,
+                        'ticket_id': ticket_id,
+                        'created_by': user.id,
+                        'checksum': checksum,
+                        'telegram_file_id': known.get(checksum)
+                    }
+                    for file, checksum in zip(files, checksums)
+                ]
+            )).all()
+            semaphore = asyncio.Semaphore(settings.FILE_WRITE_CONCURRENCY)
 
-        return ShemaUploadFile(created_by=user_shema, files=file_schemas)
+            async def save(new_file, file: UploadFile) -> None:
+                async with semaphore:
+                    await asyncio.to_thread(
+                        self.write, self.path(new_file.id, new_file.name),
+                        file.file
+                    )
+
+            await asyncio.gather(*(
+                save(new_file, file)
+                for new_file, file in zip(new_files, files)
+            ))
+            attachments = [Attachment(*x) for x in new_files]
+            telegram_user_id = ticket.telegram_user_id
+            await self.session.commit()
+
+        return (
+            ShemaUploadFile(
+                created_by=user_shema,
+                files=[ReadFile(id=x.id, name=x.name) for x in attachments]
+            ),
+            attachments,
+            telegram_user_id
+        )
+
+    @staticmethod
+    def checksum(file: BinaryIO) -> str:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+        file.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def write(path: str, file: BinaryIO) -> None:
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(file, f)
 
     async def download(self, request: Request, file_id: int):
         async with self.session.begin():
@@ -82,89 +153,207 @@ class FileService:
                     status_code=404,
                     detail=f'file_id={file_id} не существует'
                 )
+            if file.status != FILE_READY:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f'file_id={file_id} еще не загружен'
+                )
             return FileResponse(
-                f'{settings.FILE_PATH}/{file.id}.{file.name.split(".")[-1]}',
+                self.path(file.id, file.name),
                 media_type='application/octet-stream',
                 filename=file.name
             )
 
+    async def forward_to_telegram(
+            self, files: List[Attachment], telegram_user_id: int
+    ) -> None:
+        """
+        Отправляет загруженные файлы пользователю: пачками по 10 через
+        sendMediaGroup, одиночный остаток через sendDocument. Пачки уходят
+        параллельно, не больше TELEGRAM_UPLOAD_CONCURRENCY одновременно.
+        Полученные от Telegram file_id сохраняются для повторных отправок.
+        """
+        semaphore = asyncio.Semaphore(settings.TELEGRAM_UPLOAD_CONCURRENCY)
+
+        async def send(batch: List[Attachment]) -> List[Optional[str]]:
+            async with semaphore:
+                if len(batch) == 1:
+                    return [await self.send_file(batch[0], telegram_user_id)]
+                return await self.send_media_group(batch, telegram_user_id)
+
+        batches = [
+            files[i:i + MEDIA_GROUP_SIZE]
+            for i in range(0, len(files), MEDIA_GROUP_SIZE)
+        ]
+        results = await asyncio.gather(*(send(batch) for batch in batches))
+        new_file_ids = {
+            file.checksum: telegram_file_id
+            for batch, file_ids in zip(batches, results)
+            for file, telegram_file_id in zip(batch, file_ids)
+            if telegram_file_id and not file.telegram_file_id
+        }
+        if new_file_ids:
+            await self.save_telegram_file_ids(new_file_ids)
+
+    async def save_telegram_file_ids(self, file_ids: dict[str, str]) -> None:
+        # отправка идет после ответа клиенту, поэтому сессия своя
+        async with async_session_factory() as session:
+            async with session.begin():
+                for checksum, telegram_file_id in file_ids.items():
+                    await session.execute(
+                        update(
+                            File
+                        ).where(
+                            File.checksum == checksum,
+                            File.telegram_file_id.is_(None)
+                        ).values(
+                            telegram_file_id=telegram_file_id
+                        )
+                    )
+
     async def send_file(
             self,
-            file_id: int,
-            file_extension: str,
-            file_name: str,
+            file: Attachment,
             telegram_user_id: int
-    ):
-        url = (
-            f'https://api.telegram.org/bot{settings.BOT_API_KEY}/sendDocument'
-        )
-        with open(
-            f'{settings.FILE_PATH}/{file_id}.{file_extension}', 'rb'
-        ) as file:
-            # Подготавливаем данные для отправки
-            files = {'document': (file_name, file)}
+    ) -> Optional[str]:
+        url = settings.telegram_url('sendDocument')
+
+        def post():
             data = {'chat_id': telegram_user_id}
+            if file.telegram_file_id:
+                # Telegram уже хранит этот файл, байты не передаем
+                data['document'] = file.telegram_file_id
+                return requests.post(url, data=data)
+            if settings.TELEGRAM_LOCAL_MODE:
+                # локальный сервер сам прочитает файл с диска
+                data['document'] = self.local_uri(file)
+                return requests.post(url, data=data)
+            with open(self.path(file.id, file.name), 'rb') as f:
+                # Подготавливаем данные для отправки
+                files = {'document': (file.name, f)}
+                return requests.post(url, data=data, files=files)
+
+        # Отправляем запрос, не блокируя цикл событий
+        response = await asyncio.to_thread(post)
+        if self.log_response(response):
+            return response.json()['result']['document']['file_id']
+
+    async def send_media_group(
+            self,
+            files: List[Attachment],
+            telegram_user_id: int
+    ) -> List[Optional[str]]:
+        url = settings.telegram_url('sendMediaGroup')
+
+        def post():
+            with ExitStack() as stack:
+                attachments, media = {}, []
+                for i, file in enumerate(files):
+                    if file.telegram_file_id:
+                        media.append({
+                            'type': 'document',
+                            'media': file.telegram_file_id
+                        })
+                        continue
+                    if settings.TELEGRAM_LOCAL_MODE:
+                        media.append({
+                            'type': 'document',
+                            'media': self.local_uri(file)
+                        })
+                        continue
+                    attachments[f'file{i}'] = (
+                        file.name,
+                        stack.enter_context(
+                            open(self.path(file.id, file.name), 'rb')
+                        )
+                    )
+                    media.append(
+                        {'type': 'document', 'media': f'attach://file{i}'}
+                    )
+                data = {
+                    'chat_id': telegram_user_id,
+                    'media': json.dumps(media)
+                }
+                return requests.post(url, data=data, files=attachments)
 
-            # Отправляем запрос
-            response = requests.post(url, data=data, files=files)
+        response = await asyncio.to_thread(post)
+        if self.log_response(response):
+            return [
+                msg['document']['file_id']
+                for msg in response.json()['result']
+            ]
+        return [None] * len(files)
 
+    def local_uri(self, file: Attachment) -> str:
+        """
+        Путь file:// для локального сервера Bot API. Файл жестко линкуется
+        в отдельный каталог под исходным именем, чтобы получатель увидел
+        настоящее имя файла, а не id.
+        """
+        directory = os.path.join(settings.FILE_PATH, 'telegram', str(file.id))
+        link = os.path.join(directory, os.path.basename(file.name))
+        os.makedirs(directory, exist_ok=True)
+        try:
+            os.link(self.path(file.id, file.name), link)
+        except FileExistsError:
+            # ссылку уже создала прошлая или параллельная отправка
+            pass
+        return f'file://{os.path.abspath(link)}'
+
+    @staticmethod
+    def log_response(response: requests.Response) -> bool:
         # Обрабатываем результат
         if response.status_code == 200:
             logging.info('Файл успешно отправлен')
-        else:
-            logging.error(
-                f'Ошибка при отправке файла. Код: {response.status_code}, '
-                f'Текст: {response.text}'
-            )
+            return True
+        logging.error(
+            f'Ошибка при отправке файла. Код: {response.status_code}, '
+            f'Текст: {response.text}'
+        )
+        return False
 
     async def get_file_pagination(
         self,
         sort: str,
         page_size: int,
         filter_ticket: int,
-        page_number: int
-    ) -> Tuple[List[FileDetail], int]:
-        async with self.session.begin():
-            offset = (page_number - 1) * page_size
-            sort_by = getattr(File, sort.replace('-', ''), File.created_at)
-            query = select(
-                    File
-                ).options(
-                    selectinload(File.user)
-                )
-            total_query = select(func.count('*')).select_from(File)
+        page_number: int,
+        count_mode: str = COUNT_EXACT
+    ) -> Tuple[List[FileDetail], Optional[int]]:
+        offset = (page_number - 1) * page_size
+        query = queries.file_page(
+            sort, bool(filter_ticket), count_mode == COUNT_EXACT
+        )
+        async with self.read_session.begin():
+            rows = await query.fetch(
+                self.read_session,
+                ticket_id=filter_ticket,
+                offset=offset,
+                limit=page_size
+            )
+            conditions = []
             if filter_ticket:
-                query = query.where(
-                    File.ticket_id == filter_ticket
-                )
-                total_query = total_query.where(
-                    File.ticket_id == filter_ticket
-                )
-            query = query.offset(
-                    offset
-                ).limit(
-                    page_size
-                ).order_by(
-                    desc(sort_by) if sort.startswith('-') else sort_by
-                )
-            files = (await self.session.scalars(query)).all()
-            total_files = (await self.session.execute(total_query)).scalar()
-            files_result = []
-            for file in files:
-                files_result.append(FileDetail(
-                    id=file.id,
-                    name=file.name,
-                    created_by=UserRead(
-                        id=file.user.id,
-                        username=file.user.username,
-                    ) if file.user else None,
-                    created_at=file.created_at
-                ))
-            return files_result, total_files
+                conditions.append(File.ticket_id == filter_ticket)
+            total_files = await count_page(
+                self.read_session, count_mode, rows, offset, File,
+                *conditions
+            )
+        files_result = [FileDetail.model_construct(
+            id=row['id'],
+            name=row['name'],
+            created_by=UserRead.model_construct(
+                id=row['created_by'],
+                username=row['username'],
+            ) if row['created_by'] is not None else None,
+            created_at=row['created_at'],
+            status=row['status']
+        ) for row in rows]
+        return files_result, total_files
 
 
 @lru_cache()
 def get_file_service(
     session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_read_session),
 ) -> FileService:
-    return FileService(session)
+    return FileService(session, read_session)
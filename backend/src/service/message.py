@@ -1,5 +1,7 @@
+import datetime
 import logging
 from functools import lru_cache
+from typing import Optional
 
 import requests
 
@@ -12,6 +14,22 @@ from src.core.config import settings
 from src.db.models import Message, Ticket, User
 from src.db.sqlalchemy import get_async_session
 from src.core.connections import TempConnection
+from src.core.events import EventBus
+
+
+def send_telegram_message(msg: str, chat_id: str) -> None:
+    data = {
+        'chat_id': chat_id,
+        'text': msg
+    }
+    TELEGRAM_API_URL = settings.telegram_url('sendMessage')
+    response = requests.post(TELEGRAM_API_URL, data=data)
+    if response.status_code == 200:
+        logging.info("Сообщение успешно отправлено")
+    else:
+        logging.error(
+            "Ошибка при отправке сообщения:", response.text
+        )
 
 
 class MessageService:
@@ -52,6 +70,12 @@ class MessageService:
             user = await self.session.get(User, auth_user_id)
             self.session.add(new_message)
             await self.session.flush()
+            self.touch_ticket(
+                ticket,
+                new_message.id,
+                new_message.created_at,
+                new_message.user_id
+            )
             msg = MessageRead(
                 id=new_message.id,
                 user_id=UserRead(
@@ -64,25 +88,41 @@ class MessageService:
 
             )
             await self.send_msg(new_message.content, ticket.telegram_user_id)
+            event = {
+                'type': 'message_created',
+                'ticket_id': ticket.id,
+                'message_id': new_message.id,
+                'status_id': ticket.status_id,
+                'user_id': ticket.user_id,
+                'author_id': auth_user_id,
+                'content': new_message.content,
+                'created_at': new_message.created_at,
+            }
             await self.session.commit()
+        await EventBus.publish(event)
         return msg
 
+    @staticmethod
+    def touch_ticket(
+        ticket: Ticket,
+        message_id: int,
+        created_at: datetime.datetime,
+        author_id: Optional[int],
+        count: int = 1
+    ) -> None:
+        """
+        Обновляет денормализованную сводку тикета по только что
+        вставленным сообщениям в той же транзакции: count - сколько их
+        вставлено, остальные аргументы - данные последнего.
+        """
+        ticket.message_count = Ticket.message_count + count
+        ticket.last_message_id = message_id
+        ticket.last_message_at = created_at
+        if author_id is None:
+            ticket.last_customer_message_at = created_at
+
     async def send_msg(self, msg: str, chat_id: str) -> None:
-        data = {
-            'chat_id': chat_id,
-            'text': msg
-        }
-        TELEGRAM_API_URL = (
-            f'https://api.telegram.org/bot'
-            f'{settings.BOT_API_KEY}/sendMessage'
-        )
-        response = requests.post(TELEGRAM_API_URL, data=data)
-        if response.status_code == 200:
-            logging.info("Сообщение успешно отправлено")
-        else:
-            logging.error(
-                "Ошибка при отправке сообщения:", response.text
-            )
+        send_telegram_message(msg, chat_id)
 
 
 @lru_cache()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from functools import partial
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Row, insert, select
+
+from src.core.config import settings
+from src.core.events import EventBus
+from src.db.models import Message, Ticket
+from src.db.sqlalchemy import async_session_factory
+from src.service.message import MessageService, send_telegram_message
+
+logger = logging.getLogger(__name__)
+
+
+class PendingMessage(NamedTuple):
+    ticket_id: int
+    user_id: int
+    content: str
+    future: asyncio.Future
+
+
+class MessageWriter:
+    """
+    Групповая запись сообщений из веб-сокетов. Сообщения всех соединений
+    копятся в общей очереди и раз в MESSAGE_BATCH_WINDOW_MS миллисекунд
+    пишутся одной транзакцией. Отправка в Telegram идет после коммита,
+    последовательно в рамках тикета, и запись не ждет.
+    """
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue[PendingMessage] = asyncio.Queue()
+        # последняя отправка в Telegram по тикету, чтобы сохранить порядок
+        self.deliveries: dict[int, asyncio.Task] = {}
+
+    def submit(
+        self, ticket_id: int, user_id: int, content: str
+    ) -> asyncio.Future:
+        """Ставит сообщение в очередь, future получит id после коммита."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(
+            PendingMessage(ticket_id, user_id, content, future)
+        )
+        return future
+
+    async def run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.flush(batch)
+            except Exception as e:
+                logger.exception('Ошибка групповой записи сообщений')
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(HTTPException(
+                            status_code=500,
+                            detail=f'Сообщение не сохранено: {str(e)}'
+                        ))
+
+    async def flush(self, batch: list[PendingMessage]) -> None:
+        async with async_session_factory() as session:
+            async with session.begin():
+                tickets = {
+                    ticket.id: ticket
+                    for ticket in (await session.scalars(
+                        select(Ticket).where(
+                            Ticket.id.in_({item.ticket_id for item in batch})
+                        )
+                    )).all()
+                }
+                accepted = []
+                for item in batch:
+                    error = self.check(tickets.get(item.ticket_id), item)
+                    if error:
+                        item.future.set_exception(error)
+                    else:
+                        accepted.append(item)
+                if not accepted:
+                    return
+                rows = (await session.execute(
+                    insert(Message).returning(
+                        Message.id,
+                        Message.created_at,
+                        sort_by_parameter_order=True
+                    ),
+                    [
+                        {
+                            'ticket_id': item.ticket_id,
+                            'user_id': item.user_id,
+                            'content': item.content,
+                        }
+                        for item in accepted
+                    ]
+                )).all()
+                events = []
+                # по тикету: число вставленных сообщений и последнее из них
+                touched: dict[int, tuple[int, PendingMessage, Row]] = {}
+                for item, row in zip(accepted, rows):
+                    ticket = tickets[item.ticket_id]
+                    count = touched.get(ticket.id, (0,))[0]
+                    touched[ticket.id] = (count + 1, item, row)
+                    events.append({
+                        'type': 'message_created',
+                        'ticket_id': ticket.id,
+                        'message_id': row.id,
+                        'status_id': ticket.status_id,
+                        'user_id': ticket.user_id,
+                        'author_id': item.user_id,
+                        'content': item.content,
+                        'created_at': row.created_at,
+                        'telegram_user_id': ticket.telegram_user_id,
+                    })
+                for ticket_id, (count, item, row) in touched.items():
+                    MessageService.touch_ticket(
+                        tickets[ticket_id],
+                        row.id,
+                        row.created_at,
+                        item.user_id,
+                        count
+                    )
+        for item, row, event in zip(accepted, rows, events):
+            item.future.set_result(row.id)
+            self.deliver(
+                item.ticket_id, event.pop('telegram_user_id'), item.content
+            )
+            await EventBus.publish(event)
+
+    @staticmethod
+    def check(
+        ticket: Optional[Ticket], item: PendingMessage
+    ) -> Optional[HTTPException]:
+        if not ticket:
+            return HTTPException(
+                status_code=404,
+                detail=f'Тикета с id={item.ticket_id} нет.'
+            )
+        if ticket.user_id != item.user_id or ticket.status_id != 2:
+            return HTTPException(
+                status_code=403,
+                detail=(
+                    'Что бы отправить сообщение в рамках этого тикета, '
+                    'необходимо поставить себя исполнителем.'
+                    'И Установить статус в работе!'
+                )
+            )
+        return None
+
+    def deliver(self, ticket_id: int, chat_id: str, content: str) -> None:
+        previous = self.deliveries.get(ticket_id)
+        task = asyncio.create_task(
+            self.send(previous, chat_id, content)
+        )
+        self.deliveries[ticket_id] = task
+        task.add_done_callback(partial(self.forget, ticket_id))
+
+    def forget(self, ticket_id: int, task: asyncio.Task) -> None:
+        if self.deliveries.get(ticket_id) is task:
+            del self.deliveries[ticket_id]
+
+    @staticmethod
+    async def send(
+        previous: Optional[asyncio.Task], chat_id: str, content: str
+    ) -> None:
+        if previous:
+            await asyncio.wait([previous])
+        try:
+            await asyncio.to_thread(send_telegram_message, content, chat_id)
+        except Exception:
+            logger.exception('Ошибка при отправке сообщения в Telegram')
+
+
+message_writer = MessageWriter(
+    settings.MESSAGE_BATCH_WINDOW_MS / 1000, settings.MESSAGE_BATCH_SIZE
+)
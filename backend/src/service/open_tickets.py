@@ -0,0 +1,327 @@
+import bisect
+import datetime
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.core.events import EventBus
+from src.db.models import OPEN_STATUS_IDS, Ticket
+
+# сортировки списка, которые индекс умеет отдавать сам
+SORT_KEYS = ('id', 'created_at', 'last_message_at')
+
+
+class OpenTicket:
+    __slots__ = ('id', 'status_id', 'user_id', 'created_at', 'last_message_at')
+
+    def __init__(
+        self,
+        id: int,
+        status_id: int,
+        user_id: Optional[int],
+        created_at: datetime.datetime,
+        last_message_at: Optional[datetime.datetime]
+    ):
+        self.id = id
+        self.status_id = status_id
+        self.user_id = user_id
+        self.created_at = created_at
+        self.last_message_at = last_message_at
+
+
+class SortedKeys:
+    """Ключи сортировки в отсортированном списке: вставка и удаление
+    бисекцией, страница - срез без обхода всех тикетов."""
+    __slots__ = ('keys',)
+
+    def __init__(self):
+        self.keys: list[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: tuple) -> None:
+        bisect.insort(self.keys, key)
+
+    def remove(self, key: tuple) -> None:
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def ids(self, offset: int, limit: int, descending: bool) -> list[int]:
+        if not descending:
+            return [key[-1] for key in self.keys[offset:offset + limit]]
+        stop = len(self.keys) - offset
+        start = max(stop - limit, 0)
+        return [key[-1] for key in reversed(self.keys[start:max(stop, 0)])]
+
+
+def sort_key(ticket: OpenTicket, field: str) -> tuple:
+    # как в Postgres: NULL больше любого значения
+    value = getattr(ticket, field)
+    return value is None, value or ticket.created_at, ticket.id
+
+
+class OpenTicketIndex:
+    """
+    Индекс открытых тикетов в памяти процесса для очереди операторов.
+    Хранит только ключи фильтров и сортировок: для каждого открытого
+    статуса, а также статуса и исполнителя, по каждому полю из SORT_KEYS
+    ведется отсортированный список, поэтому страница и total берутся
+    без Postgres и без обхода всех тикетов, а из БД страница дочитывается
+    по первичному ключу. Тикеты, о которых из события известно не все,
+    помечаются в pending и перечитываются перед следующим запросом.
+    События от бота могут теряться, поэтому перед каждой страницей
+    индекс еще и дочитывает тикеты, изменившиеся в БД с прошлой сверки,
+    по change_xid: xid хранит xmin снимка, с которого изменения еще не
+    прочитаны.
+    Если открытых тикетов больше max_size, индекс отключается до
+    следующей загрузки.
+
+    Индекс живет в памяти процесса и обновляется событиями EventBus
+    этого же процесса, поэтому при active=False (несколько воркеров)
+    он не загружается и запросы идут в БД.
+    """
+    def __init__(self, max_size: int, active: bool = True):
+        self.max_size = max_size
+        self.active = active
+        self.tickets: dict[int, OpenTicket] = {}
+        self.orders: dict[tuple, SortedKeys] = {}
+        self.pending: set[int] = set()
+        self.xid: Optional[int] = None
+        self.enabled = False
+
+    @staticmethod
+    def entry(ticket: Ticket) -> OpenTicket:
+        return OpenTicket(
+            ticket.id,
+            ticket.status_id,
+            ticket.user_id,
+            ticket.created_at,
+            ticket.last_message_at
+        )
+
+    @staticmethod
+    def open_tickets(*conditions):
+        return select(
+                Ticket.id,
+                Ticket.status_id,
+                Ticket.user_id,
+                Ticket.created_at,
+                Ticket.last_message_at
+            ).where(
+                Ticket.status_id.in_(OPEN_STATUS_IDS),
+                *conditions
+            )
+
+    @staticmethod
+    async def snapshot_xmin(session: AsyncSession) -> int:
+        # транзакции с меньшим id завершены: их изменения видны следующему
+        # запросу, а более поздние попадут в следующую сверку
+        return (await session.execute(
+            select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+        )).scalar()
+
+    async def load(self, session: AsyncSession) -> None:
+        if not self.active:
+            return
+        async with session.begin():
+            xid = await self.snapshot_xmin(session)
+            rows = (await session.execute(
+                self.open_tickets().limit(self.max_size + 1)
+            )).all()
+        self.pending.clear()
+        if len(rows) > self.max_size:
+            self.disable()
+            return
+        self.tickets = {}
+        self.orders = {}
+        for row in rows:
+            self.link(self.entry(row))
+        self.xid = xid
+        self.enabled = True
+        logging.info('В индексе %s открытых тикетов', len(self.tickets))
+
+    def disable(self) -> None:
+        if self.enabled:
+            logging.warning(
+                'Открытых тикетов больше %s, индекс отключен', self.max_size
+            )
+        self.enabled = False
+        self.tickets = {}
+        self.orders = {}
+        self.pending.clear()
+
+    @staticmethod
+    def groups(ticket: OpenTicket) -> list[tuple]:
+        groups = [(ticket.status_id, None)]
+        if ticket.user_id:
+            groups.append((ticket.status_id, ticket.user_id))
+        return groups
+
+    def link(self, ticket: OpenTicket) -> None:
+        self.tickets[ticket.id] = ticket
+        for group in self.groups(ticket):
+            for field in SORT_KEYS:
+                order = self.orders.get((*group, field))
+                if order is None:
+                    order = self.orders[(*group, field)] = SortedKeys()
+                order.add(sort_key(ticket, field))
+
+    def unlink(self, ticket_id: int) -> Optional[OpenTicket]:
+        ticket = self.tickets.pop(ticket_id, None)
+        if ticket is None:
+            return None
+        for group in self.groups(ticket):
+            for field in SORT_KEYS:
+                order = self.orders[(*group, field)]
+                order.remove(sort_key(ticket, field))
+                if not order:
+                    del self.orders[(*group, field)]
+        return ticket
+
+    async def verify(self, session: AsyncSession) -> int:
+        """
+        Сверяет индекс с БД и заменяет его свежими данными.
+        Возвращает число расхождений.
+        """
+        before = {
+            ticket_id: (x.status_id, x.user_id, x.last_message_at)
+            for ticket_id, x in self.tickets.items()
+        }
+        was_enabled = self.enabled
+        await self.load(session)
+        if not (was_enabled and self.enabled):
+            return 0
+        after = {
+            ticket_id: (x.status_id, x.user_id, x.last_message_at)
+            for ticket_id, x in self.tickets.items()
+        }
+        mismatches = sum(
+            before.get(ticket_id) != value
+            for ticket_id, value in after.items()
+        ) + len(before.keys() - after.keys())
+        if mismatches:
+            logging.warning(
+                'Индекс открытых тикетов расходился с БД: %s', mismatches
+            )
+        return mismatches
+
+    async def refresh(self, session: AsyncSession) -> None:
+        """
+        Дочитывает из БД тикеты из pending и все тикеты, изменившиеся
+        после прошлой сверки, в том числе созданные ботом без события.
+        """
+        if not self.enabled:
+            return
+        xid = await self.snapshot_xmin(session)
+        ticket_ids = set(self.pending)
+        rows = (await session.execute(
+            select(
+                Ticket.id,
+                Ticket.status_id,
+                Ticket.user_id,
+                Ticket.created_at,
+                Ticket.last_message_at
+            ).where(
+                Ticket.id.in_(ticket_ids)
+                | (Ticket.change_xid >= self.xid) & (Ticket.change_xid < xid)
+            )
+        )).all()
+        self.pending -= ticket_ids
+        self.xid = max(self.xid, xid)
+        for ticket_id in ticket_ids:
+            self.unlink(ticket_id)
+        for row in rows:
+            if row.status_id not in OPEN_STATUS_IDS:
+                self.unlink(row.id)
+                continue
+            self.add(self.entry(row))
+            if not self.enabled:
+                return
+
+    def add(self, ticket: OpenTicket) -> None:
+        if self.unlink(ticket.id) is None and (
+            len(self.tickets) >= self.max_size
+        ):
+            self.disable()
+            return
+        self.link(ticket)
+
+    def supports(
+        self, sort: str, filter_status: Optional[int]
+    ) -> bool:
+        return (
+            self.enabled
+            and filter_status in OPEN_STATUS_IDS
+            and sort.lstrip('-') in SORT_KEYS
+        )
+
+    def page(
+        self,
+        sort: str,
+        filter_status: int,
+        filter_user: Optional[int],
+        offset: int,
+        limit: int
+    ) -> tuple[list[int], int]:
+        """id тикетов страницы и общее число тикетов под фильтром."""
+        order = self.orders.get(
+            (filter_status, filter_user or None, sort.lstrip('-'))
+        )
+        if order is None:
+            return [], 0
+        return order.ids(offset, limit, sort.startswith('-')), len(order)
+
+    def apply_changes(self, changes: Iterable[dict]) -> None:
+        for change in changes:
+            if change['status_id'] not in OPEN_STATUS_IDS:
+                self.unlink(change['id'])
+                self.pending.discard(change['id'])
+                continue
+            ticket = self.unlink(change['id'])
+            if ticket:
+                ticket.status_id = change['status_id']
+                ticket.user_id = change['user_id']
+                self.link(ticket)
+            else:
+                self.pending.add(change['id'])
+
+    def touch(self, ticket_id: int, created_at) -> None:
+        ticket = self.tickets.get(ticket_id)
+        if not ticket:
+            return
+        if isinstance(created_at, str):
+            created_at = datetime.datetime.fromisoformat(created_at)
+        if created_at is None or created_at.tzinfo is None:
+            self.pending.add(ticket_id)
+        elif (
+            ticket.last_message_at is None
+            or created_at > ticket.last_message_at
+        ):
+            self.unlink(ticket_id)
+            ticket.last_message_at = created_at
+            self.link(ticket)
+
+
+open_ticket_index = OpenTicketIndex(
+    settings.OPEN_TICKET_INDEX_SIZE, active=settings.WEB_CONCURRENCY == 1
+)
+
+
+async def update_open_ticket_index(event: dict) -> None:
+    if not open_ticket_index.enabled:
+        return
+    if event['type'] == 'tickets_updated':
+        open_ticket_index.apply_changes(event.get('changes', []))
+    elif event['type'] == 'ticket_created':
+        if event['status_id'] in OPEN_STATUS_IDS:
+            open_ticket_index.pending.add(event['ticket_id'])
+    elif event['type'] == 'message_created':
+        open_ticket_index.touch(event['ticket_id'], event.get('created_at'))
+
+
+EventBus.subscribe(update_open_ticket_index)
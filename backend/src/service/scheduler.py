@@ -1,12 +1,17 @@
+import csv
 from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
 
 from fastapi import Depends, HTTPException
 
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.api.v1.schemas import SchedulerCreate, SchedulerDelete, SchedulerRead
+from src.api.v1.schemas import (SchedulerBulkResult, SchedulerBulkRow,
+                                SchedulerCreate, SchedulerDelete,
+                                SchedulerRead)
+from src.core import json
 from src.db.models import Scheduler
 from src.db.sqlalchemy import get_async_session
 
@@ -60,6 +65,215 @@ class SchedulerService:
                 detail="Правила для данного telegram_user_id нет."
             )
 
+    async def copy_to_staging(
+        self, rows: List[Tuple[int, int, Optional[int]]]
+    ) -> None:
+        """
+        Загружает строки (line, telegram_user_id, user_id) во временную
+        таблицу scheduler_staging через COPY. Таблица живет до конца
+        транзакции.
+        """
+        await self.session.execute(text(
+            'CREATE TEMP TABLE scheduler_staging ('
+            'line integer, telegram_user_id bigint, user_id integer'
+            ') ON COMMIT DROP'
+        ))
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            'scheduler_staging',
+            records=rows,
+            columns=['line', 'telegram_user_id', 'user_id']
+        )
+
+    async def bulk_create(
+        self,
+        rows: List[Tuple[int, int, Optional[int]]],
+        errors: List[SchedulerBulkRow],
+        auth_user_id: int,
+        on_conflict: str = 'skip'
+    ) -> SchedulerBulkResult:
+        """
+        Массовое создание правил. Если user_id в строке не указан,
+        исполнителем становится автор запроса. При повторе telegram_user_id
+        в файле применяется последняя строка.
+        """
+        rows = [
+            (line, telegram_user_id, user_id or auth_user_id)
+            for line, telegram_user_id, user_id in rows
+        ]
+        conflict = (
+            'DO UPDATE SET user_id = EXCLUDED.user_id'
+            if on_conflict == 'update' else 'DO NOTHING'
+        )
+        async with self.session.begin():
+            await self.copy_to_staging(rows)
+            staged = (await self.session.execute(text(
+                'SELECT s.line, s.telegram_user_id, u.id IS NOT NULL AS known '
+                'FROM scheduler_staging s '
+                'LEFT JOIN "user" u ON u.id = s.user_id'
+            ))).all()
+            written = dict((await self.session.execute(text(
+                'INSERT INTO scheduler (telegram_user_id, user_id) '
+                'SELECT DISTINCT ON (s.telegram_user_id) '
+                's.telegram_user_id, s.user_id '
+                'FROM scheduler_staging s '
+                'JOIN "user" u ON u.id = s.user_id '
+                'ORDER BY s.telegram_user_id, s.line DESC '
+                f'ON CONFLICT (telegram_user_id) {conflict} '
+                'RETURNING telegram_user_id, xmax = 0 AS inserted'
+            ))).all())
+            await self.session.commit()
+        applied_lines = {}
+        for line, telegram_user_id, known in staged:
+            if known:
+                applied_lines[telegram_user_id] = max(
+                    line, applied_lines.get(telegram_user_id, 0)
+                )
+        results = list(errors)
+        for line, telegram_user_id, known in staged:
+            if not known:
+                status, detail = 'error', 'Несуществующий user_id'
+            elif applied_lines[telegram_user_id] != line:
+                status, detail = 'skipped', 'Перекрыто более поздней строкой'
+            elif telegram_user_id not in written:
+                status, detail = 'skipped', 'Правило уже создано.'
+            elif written[telegram_user_id]:
+                status, detail = 'created', None
+            else:
+                status, detail = 'updated', None
+            results.append(SchedulerBulkRow(
+                line=line,
+                telegram_user_id=telegram_user_id,
+                status=status,
+                detail=detail
+            ))
+        return self.bulk_result(results, ('created', 'updated'))
+
+    async def bulk_delete(
+        self,
+        rows: List[Tuple[int, int, Optional[int]]],
+        errors: List[SchedulerBulkRow]
+    ) -> SchedulerBulkResult:
+        async with self.session.begin():
+            await self.copy_to_staging(rows)
+            deleted = set((await self.session.scalars(text(
+                'DELETE FROM scheduler USING scheduler_staging s '
+                'WHERE scheduler.telegram_user_id = s.telegram_user_id '
+                'RETURNING scheduler.telegram_user_id'
+            ))).all())
+            await self.session.commit()
+        results = list(errors)
+        seen = set()
+        for line, telegram_user_id, _ in rows:
+            if telegram_user_id in seen:
+                status = 'skipped'
+            elif telegram_user_id in deleted:
+                status = 'deleted'
+            else:
+                status = 'not_found'
+            seen.add(telegram_user_id)
+            results.append(SchedulerBulkRow(
+                line=line,
+                telegram_user_id=telegram_user_id,
+                status=status
+            ))
+        return self.bulk_result(results, ('deleted',))
+
+    @staticmethod
+    def bulk_result(
+        results: List[SchedulerBulkRow], succeeded: Tuple[str, ...]
+    ) -> SchedulerBulkResult:
+        results.sort(key=lambda x: x.line)
+        return SchedulerBulkResult(
+            total=len(results),
+            succeeded=sum(x.status in succeeded for x in results),
+            rows=results
+        )
+
+    async def export(self, file_format: str) -> AsyncIterator[str]:
+        """
+        Потоковая выгрузка всех правил серверным курсором, память не
+        зависит от количества правил.
+        """
+        if file_format == 'csv':
+            yield 'telegram_user_id,user_id\n'
+        async with self.session.begin():
+            rules = await self.session.stream(
+                select(
+                    Scheduler.telegram_user_id, Scheduler.user_id
+                ).order_by(
+                    Scheduler.id
+                ).execution_options(
+                    yield_per=1000
+                )
+            )
+            async for partition in rules.partitions():
+                if file_format == 'csv':
+                    yield ''.join(
+                        f'{x.telegram_user_id},{x.user_id or ""}\n'
+                        for x in partition
+                    )
+                else:
+                    yield ''.join(
+                        json.dumps({
+                            'telegram_user_id': x.telegram_user_id,
+                            'user_id': x.user_id
+                        }) + '\n'
+                        for x in partition
+                    )
+
+
+# telegram_user_id в scheduler хранится в integer
+INT4_MAX = 2 ** 31 - 1
+
+
+def parse_rules(
+    body: bytes, file_format: str
+) -> Tuple[List[Tuple[int, int, Optional[int]]], List[SchedulerBulkRow]]:
+    """
+    Разбирает CSV (telegram_user_id[,user_id], заголовок необязателен) или
+    NDJSON ({"telegram_user_id": ..., "user_id": ...}).
+    Возвращает корректные строки и ошибки разбора по номерам строк.
+    """
+    rows, errors = [], []
+    lines = body.decode('utf-8-sig').splitlines()
+    if file_format == 'csv':
+        records = enumerate(csv.reader(lines), start=1)
+    else:
+        records = enumerate(lines, start=1)
+    for line, record in records:
+        try:
+            if file_format == 'csv':
+                if not record:
+                    continue
+                if line == 1 and not record[0].strip().lstrip('-').isdigit():
+                    continue  # заголовок
+                telegram_user_id = int(record[0])
+                user_id = (
+                    int(record[1])
+                    if len(record) > 1 and record[1].strip() else None
+                )
+            else:
+                if not record.strip():
+                    continue
+                data = json.loads(record)
+                telegram_user_id = int(data['telegram_user_id'])
+                user_id = data.get('user_id')
+                user_id = int(user_id) if user_id is not None else None
+            if not -INT4_MAX <= telegram_user_id <= INT4_MAX:
+                raise ValueError
+        except (ValueError, TypeError, KeyError, IndexError, csv.Error):
+            errors.append(SchedulerBulkRow(
+                line=line,
+                telegram_user_id=None,
+                status='error',
+                detail='Некорректная строка'
+            ))
+            continue
+        rows.append((line, telegram_user_id, user_id))
+    return rows, errors
+
 
 @lru_cache()
 def get_scheduler_service(
@@ -1,21 +1,42 @@
+import asyncio
+import logging
+from collections import defaultdict
 from functools import lru_cache
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 
 from fastapi import Depends, HTTPException
 
-from sqlalchemy import desc, func, select
+from sqlalchemy import (func, literal_column, select, text, true, tuple_,
+                        update)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from src.api.v1.schemas import (MessageReadShort, StatusRead, TickeDetail,
-                                TicketRead, TicketUpdate, UserRead)
-from src.db.models import Ticket, User
-from src.db.sqlalchemy import get_async_session
+from src.api.v1.schemas import (MessageReadShort, StatusCount, StatusRead,
+                                TickeDetail, TicketBulkUpdate, TicketChange,
+                                TicketRead, TicketSearchResult, TicketShort,
+                                TicketStatsRead, TicketUpdate, UserCount,
+                                UserRead)
+from src.core import json
+from src.core.events import EventBus
+from src.db import queries
+from src.db.count import COUNT_EXACT, COUNT_NONE, count_page
+from src.db.models import (SEARCH_CONFIG, File, Message, MessageArchive,
+                           Ticket, TicketStats, User)
+from src.db.replica import get_read_session
+from src.db.sqlalchemy import async_session_factory, get_async_session
+from src.service.archive import unpack
+from src.service.assignment import assignment_engine
+from src.service.open_tickets import open_ticket_index
 
 
 class TicketService:
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        read_session: Optional[AsyncSession] = None
+    ):
         self.session = session
+        # чтения списков и карточек могут идти в реплику
+        self.read_session = read_session or session
 
     async def get_pagination(
         self,
@@ -23,116 +44,452 @@ class TicketService:
         filter_status: int,
         filter_user: int,
         page_size: int,
-        page_number: int
-    ) -> List[TicketRead]:
+        page_number: int,
+        count_mode: str = COUNT_EXACT
+    ) -> Tuple[List[TicketRead], Optional[int]]:
         offset = (page_number - 1) * page_size
-        sort_by = getattr(Ticket, sort.replace('-', ''), Ticket.id)
+        if open_ticket_index.supports(sort, filter_status):
+            return await self.get_open_page(
+                sort, filter_status, filter_user, page_size, offset,
+                count_mode
+            )
+        query = queries.ticket_page(
+            sort,
+            bool(filter_status),
+            bool(filter_user),
+            count_mode == COUNT_EXACT
+        )
+        async with self.read_session.begin():
+            rows = await query.fetch(
+                self.read_session,
+                status_id=filter_status,
+                user_id=filter_user,
+                offset=offset,
+                limit=page_size
+            )
+            conditions = []
+            if filter_status:
+                conditions.append(Ticket.status_id == filter_status)
+            if filter_user:
+                conditions.append(Ticket.user_id == filter_user)
+            total_ticket = await count_page(
+                self.read_session, count_mode, rows, offset, Ticket,
+                *conditions
+            )
+        return [self.ticket_read(row) for row in rows], total_ticket
+
+    async def get_open_page(
+        self,
+        sort: str,
+        filter_status: int,
+        filter_user: Optional[int],
+        page_size: int,
+        offset: int,
+        count_mode: str
+    ) -> Tuple[List[TicketRead], Optional[int]]:
+        """
+        Страница очереди открытых тикетов: отбор, сортировка и подсчет
+        по индексу в памяти, из БД - только строки страницы по id.
+        """
+        # изменения с прошлой страницы дочитываем из основной БД: события
+        # бота могут теряться, а реплика может отставать
         async with self.session.begin():
-            total_query = select(func.count('*')).select_from(Ticket)
-            query = select(
+            await open_ticket_index.refresh(self.session)
+        ticket_ids, total_ticket = open_ticket_index.page(
+            sort, filter_status, filter_user, offset, page_size
+        )
+        async with self.read_session.begin():
+            rows = await self.tickets_by_ids(self.read_session, ticket_ids)
+        missing = [x for x in ticket_ids if x not in rows]
+        if missing and self.read_session is not self.session:
+            # индекс питается из основной БД: тикеты, до которых реплика
+            # еще не дошла, дочитываем оттуда
+            async with self.session.begin():
+                rows.update(await self.tickets_by_ids(self.session, missing))
+        ticket_list = [
+            self.ticket_read(rows[ticket_id])
+            for ticket_id in ticket_ids if ticket_id in rows
+        ]
+        if count_mode == COUNT_NONE:
+            total_ticket = None
+        return ticket_list, total_ticket
+
+    @staticmethod
+    async def tickets_by_ids(
+        session: AsyncSession, ticket_ids: List[int]
+    ) -> dict:
+        return {
+            row['id']: row
+            for row in await queries.TICKETS_BY_IDS.fetch(
+                session, ids=ticket_ids
+            )
+        }
+
+    @staticmethod
+    def ticket_read(row) -> TicketRead:
+        """
+        TicketRead из записи queries.ticket_rows без повторной валидации:
+        данные пришли из БД и уже имеют нужные типы.
+        """
+        return TicketRead.model_construct(
+            id=row['id'],
+            user_id=UserRead.model_construct(
+                id=row['user_id'],
+                username=row['username']
+            ) if row['user_id'] is not None else None,
+            status=StatusRead.model_construct(
+                id=row['status_id'],
+                name=row['status_name']
+            ),
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+            message_count=row['message_count'],
+            last_message_id=row['last_message_id'],
+            last_message_at=row['last_message_at'],
+            last_customer_message_at=row['last_customer_message_at']
+        )
+
+    async def search(
+        self,
+        q: str,
+        page_size: int,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[TicketSearchResult], Optional[str]]:
+        """
+        Полнотекстовый поиск тикетов по содержимому сообщений.
+        На каждый тикет возвращается лучшее совпадение со сниппетом,
+        выдача отсортирована по релевантности и листается курсором
+        вида `<rank>:<ticket_id>`.
+        """
+        config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+        ts_query = func.websearch_to_tsquery(config, q)
+        rank = func.ts_rank(Message.search_vector, ts_query)
+        hits = select(
+                Message.id,
+                Message.ticket_id,
+                Message.content,
+                rank.label('rank'),
+                func.row_number().over(
+                    partition_by=Message.ticket_id,
+                    order_by=(rank.desc(), Message.id.desc())
+                ).label('position')
+            ).where(
+                Message.search_vector.op('@@')(ts_query)
+            ).subquery()
+        query = select(
+                hits.c.ticket_id,
+                hits.c.id,
+                hits.c.rank,
+                func.ts_headline(
+                    config,
+                    hits.c.content,
+                    ts_query,
+                    'MaxFragments=2, MaxWords=20, MinWords=5'
+                ).label('snippet')
+            ).where(
+                hits.c.position == 1
+            )
+        if cursor:
+            try:
+                cursor_rank, cursor_ticket = cursor.split(':')
+                cursor_rank = float(cursor_rank)
+                cursor_ticket = int(cursor_ticket)
+            except ValueError:
+                raise HTTPException(
+                    status_code=400, detail='Некорректный cursor'
+                )
+            query = query.where(
+                tuple_(hits.c.rank, hits.c.ticket_id) <
+                tuple_(cursor_rank, cursor_ticket)
+            )
+        query = query.order_by(
+                hits.c.rank.desc(), hits.c.ticket_id.desc()
+            ).limit(
+                page_size
+            )
+        async with self.session.begin():
+            rows = (await self.session.execute(query)).all()
+        results = [TicketSearchResult(
+            ticket_id=x.ticket_id,
+            message_id=x.id,
+            rank=x.rank,
+            snippet=x.snippet
+        ) for x in rows]
+        next_cursor = None
+        if len(results) == page_size:
+            last = results[-1]
+            next_cursor = f'{last.rank!r}:{last.ticket_id}'
+        return results, next_cursor
+
+    async def get_changes(
+        self,
+        since: Optional[str],
+        page_size: int
+    ) -> Tuple[List[TicketChange], str, bool]:
+        """
+        Тикеты, изменившиеся после курсора `<xid>:<ticket_id>`, в порядке
+        изменения. Отдаются только строки транзакций старше xmin текущего
+        снимка: все более ранние транзакции уже завершены, поэтому
+        изменение, закоммиченное позже, не окажется позади курсора.
+        """
+        cursor_xid, cursor_ticket = 0, 0
+        if since:
+            try:
+                cursor_xid, cursor_ticket = map(int, since.split(':'))
+            except ValueError:
+                raise HTTPException(
+                    status_code=400, detail='Некорректный since'
+                )
+        async with self.session.begin():
+            xmin = (await self.session.execute(
+                select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+            )).scalar()
+            rows = (await self.session.scalars(
+                select(
                     Ticket
-                ).options(
-                    selectinload(
-                        Ticket.messages
-                    ),
-                    selectinload(
-                        Ticket.status
-                    ),
-                    selectinload(
-                        Ticket.user
-                    )
+                ).where(
+                    tuple_(Ticket.change_xid, Ticket.id) >
+                    tuple_(cursor_xid, cursor_ticket),
+                    Ticket.change_xid < xmin
+                ).order_by(
+                    Ticket.change_xid, Ticket.id
+                ).limit(
+                    page_size + 1
                 )
-            if filter_status:
-                query = query.where(
-                    Ticket.status_id == filter_status
+            )).all()
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            changes = [TicketChange(
+                id=x.id,
+                user_id=x.user_id,
+                status_id=x.status_id,
+                updated_at=x.updated_at,
+                message_count=x.message_count,
+                last_message_id=x.last_message_id,
+                last_message_at=x.last_message_at
+            ) for x in rows]
+            if rows:
+                cursor_xid, cursor_ticket = rows[-1].change_xid, rows[-1].id
+        return changes, f'{cursor_xid}:{cursor_ticket}', has_more
+
+    async def export(
+        self,
+        filter_status: Optional[int] = None,
+        filter_user: Optional[int] = None,
+        chunk_size: int = 65536
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая выгрузка тикетов с сообщениями и метаданными файлов в
+        NDJSON, по строке на тикет. Тикеты, сообщения, архив сообщений и
+        файлы читаются серверными курсорами в порядке ticket_id и
+        сливаются на лету, поэтому память не зависит от объема выгрузки.
+        """
+        conditions = []
+        if filter_status:
+            conditions.append(Ticket.status_id == filter_status)
+        if filter_user:
+            conditions.append(Ticket.user_id == filter_user)
+        ticket_ids = select(Ticket.id).where(*conditions)
+        async with self.read_session.begin():
+            # все курсоры читают один снимок: иначе сообщение или файл,
+            # закоммиченные между их открытием, попадут не во все потоки
+            await self.read_session.connection(execution_options={
+                'isolation_level': 'REPEATABLE READ',
+                'postgresql_readonly': True
+            })
+            tickets = await self.read_session.stream(
+                select(
+                    Ticket.id,
+                    Ticket.telegram_user_id,
+                    Ticket.user_id,
+                    Ticket.status_id,
+                    Ticket.created_at,
+                    Ticket.updated_at,
+                    Ticket.message_count
+                ).where(
+                    *conditions
+                ).order_by(
+                    Ticket.id
+                ).execution_options(
+                    yield_per=500
                 )
-                total_query = total_query.where(
-                    Ticket.status_id == filter_status
+            )
+            messages = await self.read_session.stream(
+                select(
+                    Message.ticket_id,
+                    Message.id,
+                    Message.user_id,
+                    Message.content,
+                    Message.created_at
+                ).where(
+                    Message.ticket_id.in_(ticket_ids) if conditions else true()
+                ).order_by(
+                    Message.ticket_id, Message.id
+                ).execution_options(
+                    yield_per=2000
                 )
-            if filter_user:
-                query = query.where(
-                    Ticket.user_id == filter_user
+            )
+            files = await self.read_session.stream(
+                select(
+                    File.ticket_id,
+                    File.id,
+                    File.name,
+                    File.created_by,
+                    File.created_at,
+                    File.status,
+                    File.checksum
+                ).where(
+                    File.ticket_id.in_(ticket_ids) if conditions else true()
+                ).order_by(
+                    File.ticket_id, File.id
+                ).execution_options(
+                    yield_per=2000
                 )
-                total_query = total_query.where(
-                    Ticket.user_id == filter_user
+            )
+            archives = await self.read_session.stream(
+                select(
+                    MessageArchive.ticket_id,
+                    MessageArchive.messages
+                ).where(
+                    MessageArchive.ticket_id.in_(ticket_ids)
+                    if conditions else true()
+                ).order_by(
+                    MessageArchive.ticket_id
+                ).execution_options(
+                    yield_per=100
                 )
-
-            query = query.order_by(
-                desc(sort_by) if sort.startswith('-') else sort_by
-            ).offset(
-                offset
-            ).limit(
-                page_size
             )
-            tickets = (await self.session.scalars(query)).all()
-            ticket_list = [TicketRead(
-                    id=x.id,
-                    user_id=UserRead(
-                        id=x.user.id,
-                        username=x.user.username
-                    ) if x.user_id is not None else None,
-                    status=StatusRead(
-                        id=x.status.id,
-                        name=x.status.name
-                    ),
-                    created_at=x.created_at,
-                    updated_at=x.updated_at
-                ) for x in tickets]
-            total_ticket = (await self.session.execute(total_query)).scalar()
-        return ticket_list, total_ticket
+            messages = aiter(messages)
+            files = aiter(files)
+            archives = aiter(archives)
+            message = await anext(messages, None)
+            file = await anext(files, None)
+            archive = await anext(archives, None)
+            buffer, size = [], 0
+            async for ticket in tickets:
+                ticket_messages = []
+                while archive is not None and archive.ticket_id <= ticket.id:
+                    if archive.ticket_id == ticket.id:
+                        ticket_messages = unpack(archive.messages)
+                    archive = await anext(archives, None)
+                while message is not None and message.ticket_id <= ticket.id:
+                    if message.ticket_id == ticket.id:
+                        ticket_messages.append({
+                            'id': message.id,
+                            'user_id': message.user_id,
+                            'content': message.content,
+                            'created_at': message.created_at,
+                        })
+                    message = await anext(messages, None)
+                ticket_files = []
+                while file is not None and file.ticket_id <= ticket.id:
+                    if file.ticket_id == ticket.id:
+                        ticket_files.append({
+                            'id': file.id,
+                            'name': file.name,
+                            'created_by': file.created_by,
+                            'created_at': file.created_at,
+                            'status': file.status,
+                            'checksum': file.checksum,
+                        })
+                    file = await anext(files, None)
+                line = json.dumps({
+                    'id': ticket.id,
+                    'telegram_user_id': ticket.telegram_user_id,
+                    'user_id': ticket.user_id,
+                    'status_id': ticket.status_id,
+                    'created_at': ticket.created_at,
+                    'updated_at': ticket.updated_at,
+                    'message_count': ticket.message_count,
+                    'messages': ticket_messages,
+                    'files': ticket_files,
+                }) + '\n'
+                buffer.append(line)
+                size += len(line)
+                if size >= chunk_size:
+                    yield ''.join(buffer)
+                    buffer, size = [], 0
+            if buffer:
+                yield ''.join(buffer)
 
     async def get_by_id(self, ticket_id: str) -> TickeDetail:
-        async with self.session.begin():
-            ticket = await self.session.get(
-                Ticket,
-                ticket_id,
-                options=(
-                    selectinload(Ticket.messages),
-                    selectinload(Ticket.status),
-                    selectinload(Ticket.user),
-                )
+        async with self.read_session.begin():
+            ticket = await queries.TICKET_BY_ID.fetchrow(
+                self.read_session, ticket_id=int(ticket_id)
             )
             if not ticket:
                 raise HTTPException(
                     status_code=404, detail='Ticket с таким id не существует'
                 )
-            ticket_return = TickeDetail(
-                id=ticket.id,
-                telegram_user_id=ticket.telegram_user_id,
-                status=StatusRead(
-                    id=ticket.status.id,
-                    name=ticket.status.name
-                ),
-                created_at=ticket.created_at,
-                updated_at=ticket.updated_at,
-                user_id=UserRead(
-                    id=ticket.user.id,
-                    username=ticket.user.username
-                ) if ticket.user_id is not None else None,
-                messages=[MessageReadShort(
-                    id=x.id,
-                    user_id=x.user_id,
-                    content=x.content,
-                    created_at=x.created_at
-                ) for x in ticket.messages]
-            )
-            return ticket_return
+            messages = [
+                MessageReadShort.model_construct(**message)
+                for message in await queries.TICKET_MESSAGES.fetch(
+                    self.read_session,
+                    ticket_id=int(ticket_id),
+                    ticket_created_at=ticket['created_at']
+                )
+            ]
+            if ticket['message_count'] > len(messages):
+                # часть переписки перенесена в архив
+                archived = await queries.TICKET_ARCHIVE.fetchrow(
+                    self.read_session, ticket_id=int(ticket_id)
+                )
+                if archived:
+                    messages = [
+                        MessageReadShort(**message)
+                        for message in unpack(archived['messages'])
+                    ] + messages
+        return TickeDetail.model_construct(
+            **dict(self.ticket_read(ticket)),
+            telegram_user_id=ticket['telegram_user_id'],
+            messages=messages
+        )
+
+    async def get_last_message_id(self, ticket_id: int) -> int:
+        async with self.session.begin():
+            ticket = await self.session.get(Ticket, ticket_id)
+            if not ticket:
+                raise HTTPException(
+                    status_code=404, detail='Ticket с таким id не существует'
+                )
+            return ticket.last_message_id or 0
+
+    async def get_messages_after(
+        self, ticket_id: int, message_id: int
+    ) -> List[MessageReadShort]:
+        """Сообщения тикета после message_id, для досылки пропущенного."""
+        async with self.session.begin():
+            messages = (await self.session.scalars(
+                select(
+                    Message
+                ).where(
+                    Message.ticket_id == ticket_id,
+                    Message.id > message_id
+                ).order_by(
+                    Message.id
+                )
+            )).all()
+            return [MessageReadShort(
+                id=x.id,
+                user_id=x.user_id,
+                content=x.content,
+                created_at=x.created_at
+            ) for x in messages]
 
     async def update(self, ticket_id: int, ticket_data: TicketUpdate) -> int:
         if ticket_data:
             async with self.session.begin():
-                ticket = await self.session.get(
-                    Ticket,
-                    ticket_id,
-                    options=(
-                        selectinload(Ticket.messages),
-                    )
-                )
+                ticket = await self.session.get(Ticket, ticket_id)
                 if not ticket:
                     raise HTTPException(
                         status_code=404,
                         detail="Несуществующий тикет"
                     )
+                change = {
+                    'id': ticket.id,
+                    'old_user_id': ticket.user_id,
+                    'old_status_id': ticket.status_id,
+                }
                 if ticket_data.status_id:
                     ticket.status_id = ticket_data.status_id
                 if ticket_data.user_id:
@@ -147,13 +504,179 @@ class TicketService:
                                 'существует.'
                             )
                         )
+                change['user_id'] = ticket.user_id
+                change['status_id'] = ticket.status_id
                 await self.session.commit()
-                return
+            await EventBus.publish({
+                'type': 'tickets_updated',
+                'ticket_ids': [ticket_id],
+                'changes': [change],
+            })
+            return
         raise HTTPException(status_code=400, detail='Пустой запрос')
 
+    async def bulk_update(
+        self, ticket_data: TicketBulkUpdate
+    ) -> List[TicketShort]:
+        """
+        Массовое обновление тикетов одним UPDATE ... WHERE ... RETURNING.
+        Тикеты выбираются списком ids и/или фильтром.
+        """
+        values = {}
+        if ticket_data.status_id:
+            values['status_id'] = ticket_data.status_id
+        if ticket_data.user_id:
+            values['user_id'] = ticket_data.user_id
+        conditions = []
+        if ticket_data.ids:
+            conditions.append(Ticket.id.in_(ticket_data.ids))
+        if ticket_data.filter:
+            if ticket_data.filter.status_id:
+                conditions.append(
+                    Ticket.status_id == ticket_data.filter.status_id
+                )
+            if ticket_data.filter.user_id:
+                conditions.append(
+                    Ticket.user_id == ticket_data.filter.user_id
+                )
+        if not values or not conditions:
+            raise HTTPException(status_code=400, detail='Пустой запрос')
+        async with self.session.begin():
+            if ticket_data.user_id:
+                user = await self.session.get(User, ticket_data.user_id)
+                if not user:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=(
+                            f'Пользователь с id={ticket_data.user_id} не '
+                            'существует.'
+                        )
+                    )
+            # прежние значения нужны подписчикам событий (счетчики нагрузки),
+            # поэтому строки блокируются и читаются в том же UPDATE ... FROM
+            old = select(
+                    Ticket.id, Ticket.user_id, Ticket.status_id
+                ).where(
+                    *conditions
+                ).with_for_update().subquery()
+            rows = (await self.session.execute(
+                update(
+                    Ticket
+                ).where(
+                    Ticket.id == old.c.id
+                ).values(
+                    **values
+                ).returning(
+                    Ticket.id,
+                    Ticket.user_id,
+                    Ticket.status_id,
+                    Ticket.updated_at,
+                    old.c.user_id.label('old_user_id'),
+                    old.c.status_id.label('old_status_id')
+                ).execution_options(
+                    synchronize_session=False
+                )
+            )).all()
+            result = [TicketShort(
+                id=x.id,
+                user_id=x.user_id,
+                status_id=x.status_id,
+                updated_at=x.updated_at
+            ) for x in rows]
+            await self.session.commit()
+        if result:
+            await EventBus.publish({
+                'type': 'tickets_updated',
+                'ticket_ids': [x.id for x in result],
+                'changes': [{
+                    'id': x.id,
+                    'user_id': x.user_id,
+                    'status_id': x.status_id,
+                    'old_user_id': x.old_user_id,
+                    'old_status_id': x.old_status_id,
+                } for x in rows],
+            })
+        return result
+
+    async def get_stats(self, filter_status: int = None) -> TicketStatsRead:
+        """
+        Счетчики тикетов по статусам и исполнителям из ticket_stats,
+        без агрегации по ticket. by_user можно ограничить статусом.
+        """
+        async with self.session.begin():
+            rows = (await self.session.scalars(select(TicketStats))).all()
+        by_status = defaultdict(int)
+        by_user = defaultdict(int)
+        for row in rows:
+            by_status[row.status_id] += row.count
+            if not filter_status or row.status_id == filter_status:
+                by_user[row.user_id or None] += row.count
+        return TicketStatsRead(
+            by_status=[
+                StatusCount(status_id=status_id, count=count)
+                for status_id, count in sorted(by_status.items()) if count
+            ],
+            by_user=[
+                UserCount(user_id=user_id, count=count)
+                for user_id, count in by_user.items() if count
+            ]
+        )
+
+    async def reconcile_stats(self) -> int:
+        """
+        Исправляет возможный дрейф ticket_stats без блокировки ticket.
+        Фактические счетчики и ticket_stats читаются одним запросом, то
+        есть в одном снимке, и к строкам прибавляется только разница.
+        Триггеры транзакций, завершившихся после снимка, свои +1/-1 уже
+        внесли в строки, и разница их не затирает. Возвращает число
+        исправленных строк.
+        """
+        async with self.session.begin():
+            result = await self.session.execute(text(
+                'WITH actual AS ('
+                '    SELECT status_id, coalesce(user_id, 0) AS user_id,'
+                '        ticket_stats_slot(id) AS slot, count(*) AS count'
+                '    FROM ticket GROUP BY 1, 2, 3'
+                '), drift AS ('
+                '    SELECT coalesce(a.status_id, s.status_id) AS status_id,'
+                '        coalesce(a.user_id, s.user_id) AS user_id,'
+                '        coalesce(a.slot, s.slot) AS slot,'
+                '        coalesce(a.count, 0) - coalesce(s.count, 0) AS delta'
+                '    FROM actual a FULL JOIN ticket_stats s'
+                '        ON s.status_id = a.status_id'
+                '        AND s.user_id = a.user_id AND s.slot = a.slot'
+                ') '
+                'INSERT INTO ticket_stats (status_id, user_id, slot, count) '
+                'SELECT status_id, user_id, slot, delta FROM drift '
+                'WHERE delta <> 0 '
+                'ON CONFLICT (status_id, user_id, slot) '
+                'DO UPDATE SET count = ticket_stats.count + excluded.count'
+            ))
+        if result.rowcount:
+            logging.warning(
+                'ticket_stats: исправлено строк со сдвигом: %s',
+                result.rowcount
+            )
+        return result.rowcount
+
+
+async def reconcile_stats_periodically(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session_factory() as session:
+                await TicketService(session).reconcile_stats()
+            async with async_session_factory() as session:
+                await assignment_engine.sync(session)
+            async with async_session_factory() as session:
+                await open_ticket_index.verify(session)
+        except Exception:
+            logging.exception('Ошибка сверки ticket_stats')
+
 
 @lru_cache()
 def get_ticket_service(
     session: AsyncSession = Depends(get_async_session),
+    read_session: AsyncSession = Depends(get_read_session),
 ) -> TicketService:
-    return TicketService(session)
+    return TicketService(session, read_session)
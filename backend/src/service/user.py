@@ -1,3 +1,4 @@
+import hmac
 from datetime import datetime, timedelta
 from functools import lru_cache, wraps
 from typing import Optional
@@ -15,7 +16,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.api.v1.schemas import UserCreate, UserLogin, UserRead
 from src.core.config import settings
 from src.db.models import User
-from src.db.sqlalchemy import async_session_factory, get_async_session
+from src.db.sqlalchemy import get_async_session
 
 
 class UserManager:
@@ -163,6 +164,50 @@ class UserManager:
         return int(data['user_id'])
 
 
+def user_id_from_token(access_token: Optional[str]) -> int:
+    """
+    Проверяет токен доступа и возвращает user_id. Нужен там, где
+    заголовок Authorization не передать: сокеты и EventSource.
+    """
+    if not access_token:
+        raise HTTPException(
+            status_code=401,
+            detail='Требуется аутентификация'
+        )
+    try:
+        data = jwt.decode(access_token, settings.SECRET, algorithms='HS256')
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=403, detail='токен истек')
+    except InvalidTokenError as e:
+        raise HTTPException(
+            status_code=401, detail=f'токен недействителен, {str(e)}'
+        )
+    return int(data['user_id'])
+
+
+def request_user_id(request: Request, access_token: str) -> int:
+    """
+    user_id из токена запроса. Токен, уже проверенный для этого запроса
+    (например, в SingleFlight), повторно не декодируется.
+    """
+    verified = getattr(request.state, 'verified_token', None)
+    if verified is not None and verified[0] == access_token:
+        return verified[1]
+    user_id = user_id_from_token(access_token)
+    request.state.verified_token = (access_token, user_id)
+    return user_id
+
+
+def request_token(
+    request: Request, token: Optional[str] = None
+) -> Optional[str]:
+    """Токен из заголовка Authorization, иначе из параметра запроса."""
+    authorization_header = request.headers.get('Authorization')
+    if authorization_header:
+        return authorization_header[7:]
+    return token
+
+
 def auth_check(func):
     """
     Декоратор для проверки аутентификации пользователя.
@@ -180,27 +225,45 @@ def auth_check(func):
                 status_code=400,
                 detail='Отсутствует объект запроса (request)'
             )
-        user_manager = kwargs.get('user_manager', get_user_manager(
-            session=async_session_factory())
-        )
         authorization_header = request.headers.get('Authorization')
         if not authorization_header:
             raise HTTPException(
                 status_code=401,
                 detail='Требуется аутентификация'
             )
-        access_token = authorization_header[7:]
-        if await user_manager.is_valid_token(access_token, settings.SECRET):
-            user_id = await user_manager.get_current_user(request)
-            request.headers.__dict__["_list"].append(
-                ("auth_user_id".encode(), str(user_id).encode())
+        user_id = request_user_id(request, authorization_header[7:])
+        request.headers.__dict__["_list"].append(
+            ("auth_user_id".encode(), str(user_id).encode())
+        )
+        return await func(*args, **kwargs)
+    return wrapper
+
+
+def internal_check(func):
+    """
+    Декоратор для межсервисных маршрутов: запрос должен нести общий
+    секрет INTERNAL_API_SECRET в заголовке X-Internal-Secret. Без
+    настроенного секрета такие маршруты закрыты.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        request = kwargs.get('request')
+        if request is None:
+            raise HTTPException(
+                status_code=400,
+                detail='Отсутствует объект запроса (request)'
             )
-            return await func(*args, **kwargs)
-        else:
+        # заголовки декодированы как latin-1, сравниваем байты: строки
+        # с не-ASCII символами compare_digest не принимает
+        secret = request.headers.get('X-Internal-Secret', '').encode('latin-1')
+        if not settings.INTERNAL_API_SECRET or not hmac.compare_digest(
+            secret, settings.INTERNAL_API_SECRET.encode()
+        ):
             raise HTTPException(
                 status_code=401,
-                detail='Недействительный токен'
+                detail='Недействительный межсервисный секрет'
             )
+        return await func(*args, **kwargs)
     return wrapper
 
 
@@ -0,0 +1,98 @@
+"""
+Минимальная заглушка Bot API для тестов отправки файлов бэкендом.
+
+Отвечает на sendDocument и sendMediaGroup. В локальном режиме (как
+telegram-bot-api с --local) документ можно передать путем file://.
+Заглушка бота с getFile и скачиванием - bot/tests/telegram_stub.py.
+"""
+import itertools
+import json
+import os
+from typing import Optional
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+
+class TelegramStub:
+    def __init__(self, storage: str, local: bool = True):
+        self.storage = storage
+        self.local = local
+        # отправленные документы: chat_id, имя, содержимое
+        self.sent: list[dict] = []
+        self.ids = itertools.count(1)
+        self.runner: Optional[web.AppRunner] = None
+
+    @staticmethod
+    def ok(result) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def error(description: str) -> web.Response:
+        return web.json_response(
+            {'ok': False, 'error_code': 400, 'description': description},
+            status=400
+        )
+
+    def read_document(self, document):
+        """Имя и байты документа: загрузка или путь file://."""
+        if isinstance(document, web.FileField):
+            return document.filename, document.file.read()
+        if document.startswith('file://') and self.local:
+            path = urlparse(document).path
+            with open(path, 'rb') as f:
+                return os.path.basename(path), f.read()
+        raise ValueError('wrong file identifier')
+
+    def store(self, chat_id, name: str, content: bytes) -> dict:
+        file_id = f'stub-{next(self.ids)}'
+        self.sent.append(
+            {'chat_id': chat_id, 'name': name, 'content': content}
+        )
+        return {
+            'message_id': len(self.sent),
+            'date': 0,
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'document': {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_name': name,
+            },
+        }
+
+    async def send_document(self, request: web.Request) -> web.Response:
+        params = await request.post()
+        try:
+            name, content = self.read_document(params['document'])
+        except (KeyError, OSError, ValueError) as e:
+            return self.error(f'Bad Request: {e}')
+        return self.ok(self.store(params['chat_id'], name, content))
+
+    async def send_media_group(self, request: web.Request) -> web.Response:
+        params = await request.post()
+        result = []
+        try:
+            for item in json.loads(params['media']):
+                media = item['media']
+                if media.startswith('attach://'):
+                    media = params[media[len('attach://'):]]
+                name, content = self.read_document(media)
+                result.append(self.store(params['chat_id'], name, content))
+        except (KeyError, OSError, ValueError) as e:
+            return self.error(f'Bad Request: {e}')
+        return self.ok(result)
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/sendDocument', self.send_document)
+        app.router.add_post(
+            '/bot{token}/sendMediaGroup', self.send_media_group
+        )
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+        return f'http://127.0.0.1:{self.runner.addresses[0][1]}'
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
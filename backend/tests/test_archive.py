@@ -0,0 +1,91 @@
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+
+from src.api.v1.schemas import MessageReadShort
+from src.db.models import MessageArchive
+from src.service.archive import ArchiveService, merge, pack, unpack
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def message(id, minutes=0, user_id=None):
+    return {
+        'id': id,
+        'user_id': user_id,
+        'content': f'сообщение {id}',
+        'created_at': START + datetime.timedelta(minutes=minutes),
+    }
+
+
+def test_pack_round_trip():
+    messages = [message(1), message(2, 5, user_id=3)]
+    data = pack(messages)
+    assert isinstance(data, bytes)
+    # время возвращается строкой ISO 8601 и разбирается схемой обратно
+    restored = [MessageReadShort(**x) for x in unpack(data)]
+    assert [x.model_dump() for x in restored] == messages
+    assert unpack(pack([])) == []
+
+
+def test_merge_without_archive():
+    row = merge(7, None, [message(1), message(2, 5)])
+    assert row['ticket_id'] == 7
+    assert row['message_count'] == 2
+    assert row['first_message_at'] == START
+    assert row['last_message_at'] == START + datetime.timedelta(minutes=5)
+    assert [x['id'] for x in unpack(row['messages'])] == [1, 2]
+
+
+def test_merge_appends_to_archive():
+    archive = MessageArchive(
+        ticket_id=7,
+        message_count=2,
+        first_message_at=START,
+        last_message_at=START + datetime.timedelta(minutes=1),
+        messages=pack([message(1), message(2, 1)])
+    )
+    row = merge(7, archive, [message(5, 10), message(6, 20)])
+    assert row['message_count'] == 4
+    assert row['first_message_at'] == START
+    assert row['last_message_at'] == START + datetime.timedelta(minutes=20)
+    assert [x['id'] for x in unpack(row['messages'])] == [1, 2, 5, 6]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    async def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        return FakeResult(self.rows)
+
+
+def test_failed_partitions_are_logged(caplog):
+    session = FakeSession([
+        ('message_2026_11', 'partition would overlap partition "x"')
+    ])
+    failed = asyncio.run(ArchiveService(session).ensure_partitions(3))
+    assert failed == ['message_2026_11']
+    assert session.statements[0][1] == {'months': 3}
+    assert [x.levelname for x in caplog.records] == ['ERROR']
+    assert 'message_2026_11' in caplog.text
+
+
+def test_created_partitions_are_silent(caplog):
+    failed = asyncio.run(ArchiveService(FakeSession([])).ensure_partitions(3))
+    assert failed == []
+    assert not caplog.records
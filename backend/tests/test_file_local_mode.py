@@ -0,0 +1,74 @@
+import asyncio
+import os
+
+import pytest
+from telegram_stub import TelegramStub
+
+from src.core.config import settings
+from src.service.file import Attachment, FileService
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'FILE_PATH', str(tmp_path / 'files'))
+    monkeypatch.setattr(settings, 'BOT_API_KEY', '123456:TEST')
+    os.makedirs(settings.FILE_PATH)
+    return tmp_path
+
+
+def attachment(file_id, name, content):
+    path = FileService.path(file_id, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return Attachment(file_id, name, 'checksum', None)
+
+
+async def send(storage, monkeypatch, local, call):
+    stub = TelegramStub(str(storage / 'telegram'), local=local)
+    monkeypatch.setattr(settings, 'TELEGRAM_API_URL', await stub.start())
+    monkeypatch.setattr(settings, 'TELEGRAM_LOCAL_MODE', local)
+    try:
+        return stub, await call(FileService(None))
+    finally:
+        await stub.stop()
+
+
+def test_send_file_local_mode_passes_path(storage, monkeypatch):
+    file = attachment(1, 'отчет.pdf', b'pdf')
+    stub, file_id = asyncio.run(send(
+        storage, monkeypatch, True, lambda s: s.send_file(file, 42)
+    ))
+    assert file_id == 'stub-1'
+    # сервер получил путь под исходным именем, а не байты
+    assert stub.sent == [{'chat_id': '42', 'name': 'отчет.pdf',
+                          'content': b'pdf'}]
+    link = os.path.join(settings.FILE_PATH, 'telegram', '1', 'отчет.pdf')
+    assert os.path.samefile(link, FileService.path(1, 'отчет.pdf'))
+
+
+def test_send_file_uploads_bytes_without_local_mode(storage, monkeypatch):
+    file = attachment(2, 'a.txt', b'text')
+    stub, file_id = asyncio.run(send(
+        storage, monkeypatch, False, lambda s: s.send_file(file, 42)
+    ))
+    assert file_id == 'stub-1'
+    assert stub.sent[0]['content'] == b'text'
+    assert not os.path.exists(os.path.join(settings.FILE_PATH, 'telegram'))
+
+
+def test_send_media_group_local_mode(storage, monkeypatch):
+    files = [attachment(i, f'{i}.txt', str(i).encode()) for i in (3, 4)]
+    stub, file_ids = asyncio.run(send(
+        storage, monkeypatch, True, lambda s: s.send_media_group(files, 42)
+    ))
+    assert file_ids == ['stub-1', 'stub-2']
+    assert [x['content'] for x in stub.sent] == [b'3', b'4']
+
+
+def test_local_uri_reuses_existing_link(storage):
+    file = attachment(5, 'b.txt', b'b')
+    service = FileService(None)
+    uri = service.local_uri(file)
+    # повторная отправка того же файла не падает на уже созданной ссылке
+    assert service.local_uri(file) == uri
+    assert uri.startswith('file:///')
@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from src.core.config import settings
+from src.service.user import internal_check
+
+
+def internal_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post('/internal')
+    @internal_check
+    async def internal(request: Request):
+        return {'ok': True}
+
+    return app
+
+
+async def post(headers):
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=internal_app()),
+        base_url='http://test'
+    ) as client:
+        return (await client.post('/internal', headers=headers)).status_code
+
+
+@pytest.mark.parametrize('secret, headers, status', [
+    ('', {'X-Internal-Secret': ''}, 401),
+    ('s3cret', {}, 401),
+    ('s3cret', {'X-Internal-Secret': 'wrong'}, 401),
+    ('s3cret', {'X-Internal-Secret': 'секрет'.encode()}, 401),
+    ('s3cret', {'X-Internal-Secret': 's3cret'}, 200),
+])
+def test_internal_secret(monkeypatch, secret, headers, status):
+    monkeypatch.setattr(settings, 'INTERNAL_API_SECRET', secret)
+    assert asyncio.run(post(headers)) == status
+
+
+def test_notify_requires_internal_secret(monkeypatch):
+    from main import app
+    from src.api.v1 import message
+
+    published = []
+
+    async def publish(event):
+        published.append(event['type'])
+
+    monkeypatch.setattr(settings, 'INTERNAL_API_SECRET', 's3cret')
+    monkeypatch.setattr(message.EventBus, 'publish', publish)
+    payload = {'ticket_id': 1, 'msg_id': 2, 'content': 'fake',
+               'ticket_created': True}
+
+    async def run(headers):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url='http://test'
+        ) as client:
+            return (await client.post(
+                '/api/v1/message/notify', json=payload, headers=headers
+            )).status_code
+
+    assert asyncio.run(run({})) == 401
+    assert published == []
+    assert asyncio.run(run({'X-Internal-Secret': 's3cret'})) == 200
+    assert published == ['ticket_created', 'message_created']
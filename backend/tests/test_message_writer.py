@@ -0,0 +1,145 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi import HTTPException
+from starlette.websockets import WebSocketDisconnect
+
+from src.api.v1 import ticket as ticket_api
+from src.db.models import Ticket
+from src.service.message import MessageService
+from src.service.message_writer import MessageWriter
+
+
+class RecordingWriter(MessageWriter):
+    def __init__(self, window, max_batch, fail=False):
+        super().__init__(window, max_batch)
+        self.batches = []
+        self.fail = fail
+
+    async def flush(self, batch):
+        self.batches.append([item.content for item in batch])
+        if self.fail:
+            raise RuntimeError('db is down')
+        for i, item in enumerate(batch):
+            item.future.set_result(len(self.batches) * 100 + i)
+
+
+async def run_writer(writer, submit):
+    task = asyncio.create_task(writer.run())
+    try:
+        return await submit()
+    finally:
+        task.cancel()
+
+
+def test_messages_within_window_share_a_batch():
+    writer = RecordingWriter(0.05, 10)
+
+    async def submit():
+        futures = [writer.submit(1, 1, text) for text in 'abc']
+        ids = await asyncio.gather(*futures)
+        later = await writer.submit(1, 1, 'd')
+        return ids, later
+
+    ids, later = asyncio.run(run_writer(writer, submit))
+    assert writer.batches == [['a', 'b', 'c'], ['d']]
+    assert ids == [100, 101, 102] and later == 200
+
+
+def test_batch_is_capped():
+    writer = RecordingWriter(0.05, 2)
+
+    async def submit():
+        return await asyncio.gather(
+            *(writer.submit(1, 1, text) for text in 'abcde')
+        )
+
+    asyncio.run(run_writer(writer, submit))
+    assert writer.batches == [['a', 'b'], ['c', 'd'], ['e']]
+
+
+def test_failed_flush_rejects_the_whole_batch():
+    writer = RecordingWriter(0.01, 10, fail=True)
+
+    async def submit():
+        return await asyncio.gather(
+            writer.submit(1, 1, 'a'), writer.submit(2, 1, 'b'),
+            return_exceptions=True
+        )
+
+    errors = asyncio.run(run_writer(writer, submit))
+    assert [e.status_code for e in errors] == [500, 500]
+
+
+def test_touch_ticket_counts_batch():
+    ticket = Ticket(id=1)
+    created_at = datetime.datetime(2026, 1, 1)
+    MessageService.touch_ticket(ticket, 10, created_at, 5, count=3)
+    assert str(ticket.message_count.right.value) == '3'
+    assert ticket.last_message_id == 10
+    assert ticket.last_message_at == created_at
+    assert ticket.last_customer_message_at is None
+    MessageService.touch_ticket(ticket, 11, created_at, None)
+    assert ticket.last_customer_message_at == created_at
+
+
+class FakeWebSocket:
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.closed = None
+        self.fail_after = fail_after
+
+    async def send_text(self, text):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise WebSocketDisconnect(1006)
+        self.sent.append(ticket_api.json.loads(text))
+
+    async def close(self, code):
+        self.closed = code
+
+
+async def acknowledge(websocket, results):
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue()
+    for frame, result in enumerate(results, 1):
+        future = loop.create_future()
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+        pending.put_nowait((frame, future))
+    task = asyncio.create_task(ticket_api.acknowledge(websocket, pending))
+    task.add_done_callback(
+        lambda t: ticket_api.acknowledge_done(websocket, t)
+    )
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await asyncio.gather(*ticket_api.closing_sockets)
+
+
+def test_acks_follow_frame_order():
+    websocket = FakeWebSocket()
+    asyncio.run(acknowledge(websocket, [
+        7, HTTPException(status_code=403, detail='нет доступа'), 8
+    ]))
+    assert websocket.sent == [
+        {'type': 'ack', 'frame': 1, 'message_id': 7},
+        {'type': 'error', 'frame': 2, 'detail': 'нет доступа'},
+        {'type': 'ack', 'frame': 3, 'message_id': 8},
+    ]
+    assert websocket.closed is None
+
+
+def test_failed_ack_closes_socket(caplog):
+    websocket = FakeWebSocket(fail_after=1)
+    asyncio.run(acknowledge(websocket, [7, 8]))
+    assert websocket.closed == 1011
+    assert 'Ошибка подтверждения' in caplog.text
+
+
+@pytest.fixture(autouse=True)
+def no_closing_leftovers():
+    yield
+    assert not ticket_api.closing_sockets
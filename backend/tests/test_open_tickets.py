@@ -0,0 +1,212 @@
+import asyncio
+import datetime
+import random
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.db.count import COUNT_EXACT
+from src.service import ticket as ticket_service
+from src.service.open_tickets import OpenTicket, OpenTicketIndex, SORT_KEYS
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def ticket(id, status_id=1, user_id=None, minutes=0, message=None):
+    return OpenTicket(
+        id,
+        status_id,
+        user_id,
+        START + datetime.timedelta(minutes=minutes),
+        START + datetime.timedelta(minutes=message)
+        if message is not None else None
+    )
+
+
+def index_of(*tickets):
+    index = OpenTicketIndex(100)
+    index.enabled = True
+    for x in tickets:
+        index.add(x)
+    return index
+
+
+def expected(index, sort, status_id, user_id, offset, limit):
+    """Порядок, как у ORDER BY в Postgres: NULL больше любого значения."""
+    field = sort.lstrip('-')
+    tickets = [
+        x for x in index.tickets.values()
+        if x.status_id == status_id and (not user_id or x.user_id == user_id)
+    ]
+    tickets.sort(
+        key=lambda x: (
+            getattr(x, field) is None,
+            getattr(x, field) or x.created_at,
+            x.id
+        ),
+        reverse=sort.startswith('-')
+    )
+    return [x.id for x in tickets[offset:offset + limit]], len(tickets)
+
+
+def test_page_matches_full_sort():
+    rng = random.Random(1)
+    index = index_of(*(
+        ticket(
+            i,
+            rng.choice((1, 2)),
+            rng.choice((None, 1, 2)),
+            rng.randint(0, 50),
+            rng.choice((None, rng.randint(0, 50)))
+        )
+        for i in range(1, 200)
+    ))
+    for field in SORT_KEYS:
+        for sort in (field, f'-{field}'):
+            for status_id in (1, 2):
+                for user_id in (None, 1, 2):
+                    for offset in (0, 7, 190):
+                        assert index.page(
+                            sort, status_id, user_id, offset, 10
+                        ) == expected(
+                            index, sort, status_id, user_id, offset, 10
+                        )
+
+
+def test_nulls_sort_last_ascending_and_first_descending():
+    index = index_of(ticket(1, message=5), ticket(2), ticket(3, message=1))
+    assert index.page('last_message_at', 1, None, 0, 10) == ([3, 1, 2], 3)
+    assert index.page('-last_message_at', 1, None, 0, 10) == ([2, 1, 3], 3)
+
+
+def test_changes_move_tickets_between_groups():
+    index = index_of(ticket(1, user_id=5), ticket(2), ticket(3))
+    index.apply_changes([
+        {'id': 2, 'status_id': 2, 'user_id': 5},
+        {'id': 3, 'status_id': 3, 'user_id': None},
+        {'id': 9, 'status_id': 1, 'user_id': None},
+    ])
+    assert index.page('id', 1, None, 0, 10) == ([1], 1)
+    assert index.page('id', 2, 5, 0, 10) == ([2], 1)
+    assert 3 not in index.tickets
+    # о тикете 9 известно не все: его перечитают из БД
+    assert index.pending == {9}
+
+
+def test_touch_resorts_by_last_message():
+    index = index_of(ticket(1, message=1), ticket(2, message=2))
+    index.touch(1, (START + datetime.timedelta(minutes=3)).isoformat())
+    assert index.page('-last_message_at', 1, None, 0, 1) == ([1], 2)
+    # время без зоны не сравнить с индексом: тикет перечитается
+    index.touch(2, '2026-01-01T00:10:00')
+    assert index.pending == {2}
+
+
+def test_add_replaces_and_disables_over_max_size():
+    index = index_of(ticket(1, minutes=1))
+    index.add(ticket(1, minutes=5))
+    assert index.page('created_at', 1, None, 0, 10) == ([1], 1)
+    assert len(index.orders[(1, None, 'created_at')]) == 1
+    index.max_size = 1
+    index.add(ticket(2))
+    assert not index.enabled
+    assert index.tickets == {} and index.orders == {}
+
+
+def test_inactive_index_is_not_loaded():
+    index = OpenTicketIndex(100, active=False)
+    asyncio.run(index.load(session=None))
+    assert not index.enabled
+    assert not index.supports('id', 1)
+
+
+@pytest.mark.parametrize('sort', ['-id', 'id'])
+def test_page_past_the_end(sort):
+    index = index_of(ticket(1), ticket(2))
+    assert index.page(sort, 1, None, 5, 10) == ([], 2)
+    assert index.page(sort, 2, None, 0, 10) == ([], 0)
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def all(self):
+        return self.value
+
+
+class FakeSession:
+    """Отдает xmin снимка, затем строки тикетов."""
+    def __init__(self, xmin, rows):
+        self.results = [xmin, rows]
+        self.params = None
+
+    async def execute(self, statement):
+        if self.params is None and len(self.results) == 1:
+            self.params = statement.compile().params
+        return FakeResult(self.results.pop(0))
+
+
+def test_refresh_catches_up_without_events():
+    index = index_of(ticket(1), ticket(2), ticket(3, user_id=5))
+    index.xid = 100
+    index.pending.add(4)
+    session = FakeSession(120, [
+        # тикет бота, о котором не пришло события
+        ticket(7, minutes=9),
+        # закрыт в БД
+        ticket(2, status_id=3),
+        # переназначен
+        ticket(3, status_id=2, user_id=6),
+    ])
+    asyncio.run(index.refresh(session))
+    assert sorted(map(str, session.params.values())) == [
+        '100', '120', '[4]'
+    ]
+    assert index.page('id', 1, None, 0, 10) == ([1, 7], 2)
+    assert index.page('id', 2, 6, 0, 10) == ([3], 1)
+    assert 2 not in index.tickets and 4 not in index.tickets
+    assert index.pending == set() and index.xid == 120
+
+
+class Server:
+    """Сервер БД со своим набором строк тикетов."""
+    def __init__(self, *ticket_ids):
+        self.rows = {x: {'id': x} for x in ticket_ids}
+        self.asked = []
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+
+def test_rows_missing_on_replica_are_read_from_primary(monkeypatch):
+    index = index_of(ticket(1), ticket(2), ticket(3))
+    primary, replica = Server(1, 2, 3), Server(1, 3)
+
+    async def refresh(session):
+        assert session is primary
+
+    async def tickets_by_ids(session, ticket_ids):
+        session.asked.append(ticket_ids)
+        return {x: session.rows[x] for x in ticket_ids if x in session.rows}
+
+    monkeypatch.setattr(ticket_service, 'open_ticket_index', index)
+    monkeypatch.setattr(index, 'refresh', refresh)
+    monkeypatch.setattr(
+        ticket_service.TicketService, 'tickets_by_ids',
+        staticmethod(tickets_by_ids)
+    )
+    monkeypatch.setattr(
+        ticket_service.TicketService, 'ticket_read',
+        staticmethod(lambda row: row['id'])
+    )
+    service = ticket_service.TicketService(primary, replica)
+    page, total = asyncio.run(
+        service.get_open_page('id', 1, None, 10, 0, COUNT_EXACT)
+    )
+    assert page == [1, 2, 3] and total == 3
+    assert replica.asked == [[1, 2, 3]] and primary.asked == [[2]]
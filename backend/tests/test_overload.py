@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from src.api.middleware import (ConcurrencyLimit, OverloadProtection,
+                                db_budget, route_class)
+from src.core.config import settings
+
+
+async def acquire_later(limit):
+    task = asyncio.create_task(limit.acquire())
+    await asyncio.sleep(0)
+    return task
+
+
+def test_release_hands_slot_to_first_waiter():
+    async def run():
+        limit = ConcurrencyLimit(1, 10, 1)
+        assert await limit.acquire()
+        first = await acquire_later(limit)
+        second = await acquire_later(limit)
+        assert limit.as_dict()['waiting'] == 2
+        limit.release()
+        assert await first and not second.done()
+        # место перешло ожидающему, active не менялся
+        assert limit.active == 1
+        limit.release()
+        assert await second
+        limit.release()
+        assert limit.active == 0
+    asyncio.run(run())
+
+
+def test_full_queue_is_rejected():
+    async def run():
+        limit = ConcurrencyLimit(1, 1, 1)
+        assert await limit.acquire()
+        waiting = await acquire_later(limit)
+        assert not await limit.acquire()
+        assert limit.rejected == 1
+        limit.release()
+        assert await waiting
+    asyncio.run(run())
+
+
+def test_waiter_times_out():
+    async def run():
+        limit = ConcurrencyLimit(1, 1, 0.01)
+        assert await limit.acquire()
+        assert not await limit.acquire()
+        assert limit.timed_out == 1 and not limit.waiters
+        limit.release()
+        assert limit.active == 0
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        limit = ConcurrencyLimit(1, 1, 1)
+        assert await limit.acquire()
+        waiting = await acquire_later(limit)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert not limit.waiters
+        limit.release()
+        assert limit.active == 0
+    asyncio.run(run())
+
+
+def test_slot_handed_to_cancelled_waiter_moves_on():
+    async def run():
+        limit = ConcurrencyLimit(1, 10, 1)
+        assert await limit.acquire()
+        cancelled = await acquire_later(limit)
+        next_waiter = await acquire_later(limit)
+        limit.release()
+        # отмена пришла раньше, чем ожидающий успел забрать место
+        cancelled.cancel()
+        got, = await asyncio.gather(cancelled, return_exceptions=True)
+        if got is True:
+            # wait_for в 3.11 может вернуть результат вместо отмены:
+            # тогда место у отмененного, и он его отдает
+            limit.release()
+        assert await next_waiter
+        assert limit.active == 1
+    asyncio.run(run())
+
+
+def scope(path, method='GET', type='http'):
+    return {'type': type, 'method': method, 'path': path, 'headers': []}
+
+
+@pytest.mark.parametrize('path, method, expected', [
+    ('/api/v1/metrics/health', 'GET', 'health'),
+    ('/api/v1/auth/login', 'POST', 'auth'),
+    ('/api/v1/ticket/5/events', 'GET', 'sse'),
+    ('/api/v1/inbox/stream', 'GET', 'sse'),
+    ('/api/v1/ticket/export', 'GET', 'export'),
+    ('/api/v1/scheduler/export', 'GET', 'export'),
+    ('/api/v1/message/', 'POST', 'message'),
+    ('/api/v1/message/notify', 'POST', 'internal'),
+    ('/api/v1/ticket/assign', 'POST', 'internal'),
+    ('/api/v1/ticket/', 'GET', 'read'),
+    ('/api/v1/ticket/5', 'PATCH', 'write'),
+])
+def test_route_class(path, method, expected):
+    assert route_class(scope(path, method)) == expected
+
+
+def test_websocket_route_class():
+    assert route_class(scope('/api/v1/inbox/ws', type='websocket')) == (
+        'websocket'
+    )
+
+
+def test_db_classes_fit_the_pool():
+    assert db_budget() <= settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    assert 'health' not in settings.OVERLOAD_LIMITS
+    assert 'internal' not in settings.OVERLOAD_LIMITS
+
+
+class App:
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await self.gate.wait()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+
+async def call(middleware, request_scope):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(request_scope, None, send)
+    return sent
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, 'OVERLOAD_LIMITS', {'read': 1, 'message': 1})
+    monkeypatch.setattr(
+        settings, 'OVERLOAD_QUEUE_SIZE', {'read': 1, 'message': 1}
+    )
+    monkeypatch.setattr(settings, 'OVERLOAD_QUEUE_TIMEOUT', 1)
+    monkeypatch.setattr(OverloadProtection, 'limits', {})
+
+
+def test_overflow_gets_503(limits):
+    async def run():
+        app = App()
+        middleware = OverloadProtection(app)
+        tasks = [
+            asyncio.create_task(call(middleware, scope('/api/v1/ticket/')))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        app.gate.set()
+        responses = await asyncio.gather(*tasks)
+        return app.calls, responses
+    calls, responses = asyncio.run(run())
+    statuses = sorted(sent[0]['status'] for sent in responses)
+    assert calls == 2 and statuses == [200, 200, 503]
+    rejected = next(x for x in responses if x[0]['status'] == 503)
+    assert (b'retry-after', str(settings.OVERLOAD_RETRY_AFTER).encode()) in (
+        rejected[0]['headers']
+    )
+
+
+@pytest.mark.parametrize('path, method', [
+    ('/api/v1/metrics/health', 'GET'),
+    ('/api/v1/message/notify', 'POST'),
+])
+def test_unlimited_classes_are_not_shed(limits, path, method):
+    async def run():
+        app = App()
+        middleware = OverloadProtection(app)
+        tasks = [
+            asyncio.create_task(call(middleware, scope(path, method)))
+            for _ in range(20)
+        ]
+        await asyncio.sleep(0)
+        app.gate.set()
+        return await asyncio.gather(*tasks)
+    responses = asyncio.run(run())
+    assert [sent[0]['status'] for sent in responses] == [200] * 20
+
+
+def test_websocket_over_limit_is_closed(monkeypatch):
+    monkeypatch.setattr(settings, 'OVERLOAD_LIMITS', {'websocket': 0})
+    monkeypatch.setattr(OverloadProtection, 'limits', {})
+    middleware = OverloadProtection(App())
+    sent = asyncio.run(call(middleware, scope('/ws', type='websocket')))
+    assert sent == [{'type': 'websocket.close', 'code': 1013}]
@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+import itertools
+from contextlib import asynccontextmanager
+
+import pytest
+
+from src.api.v1.schemas import TickeDetail, TicketRead
+from src.db import queries
+from src.db.models import File, Ticket
+from src.service.archive import pack
+from src.service.ticket import TicketService
+
+CREATED_AT = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+# колонки записи, которые читают TicketService.ticket_read и FileService
+TICKET_COLUMNS = {
+    'id', 'telegram_user_id', 'user_id', 'username', 'status_id',
+    'status_name', 'created_at', 'updated_at', 'message_count',
+    'last_message_id', 'last_message_at', 'last_customer_message_at'
+}
+FILE_COLUMNS = {'id', 'name', 'created_by', 'username', 'created_at',
+                'status'}
+
+
+def sorts(model):
+    fields = [*model.__table__.c.keys(), 'unknown']
+    return [*fields, *(f'-{x}' for x in fields)]
+
+
+@pytest.mark.parametrize('sort, by_status, by_user, counted', [
+    (sort, *flags)
+    for sort in sorts(Ticket)
+    for flags in itertools.product((False, True), repeat=3)
+])
+def test_every_ticket_page_compiles(sort, by_status, by_user, counted):
+    query = queries.ticket_page(sort, by_status, by_user, counted)
+    expected = TICKET_COLUMNS | ({'total'} if counted else set())
+    assert set(query.columns) == expected
+    # параметры, которые передает TicketService.get_pagination
+    assert query.args({
+        'status_id': 1, 'user_id': 2, 'offset': 0, 'limit': 20
+    })[-2:] == [20, 0]
+    assert ('status_id' in query.names) == by_status
+    assert ('user_id' in query.names) == by_user
+    field = sort.lstrip('-')
+    if field not in Ticket.__table__.c:
+        field = 'id'
+    direction = ' DESC' if sort.startswith('-') else ''
+    assert query.sql.endswith(f'ORDER BY page.{field}{direction}')
+
+
+@pytest.mark.parametrize('sort, by_ticket, counted', [
+    (sort, *flags)
+    for sort in sorts(File)
+    for flags in itertools.product((False, True), repeat=2)
+])
+def test_every_file_page_compiles(sort, by_ticket, counted):
+    query = queries.file_page(sort, by_ticket, counted)
+    expected = FILE_COLUMNS | ({'total'} if counted else set())
+    assert set(query.columns) == expected
+    assert query.args({'ticket_id': 3, 'offset': 0, 'limit': 20})[-2:] == [
+        20, 0
+    ]
+    assert ('ticket_id' in query.names) == by_ticket
+
+
+def test_lookup_queries_return_ticket_columns():
+    assert set(queries.TICKETS_BY_IDS.columns) == TICKET_COLUMNS
+    assert set(queries.TICKET_BY_ID.columns) == TICKET_COLUMNS
+
+
+def ticket_record(**values):
+    record = {
+        'id': 5,
+        'telegram_user_id': 42,
+        'user_id': 2,
+        'username': 'operator',
+        'status_id': 1,
+        'status_name': 'Открыт',
+        'created_at': CREATED_AT,
+        'updated_at': CREATED_AT,
+        'message_count': 3,
+        'last_message_id': 12,
+        'last_message_at': CREATED_AT,
+        'last_customer_message_at': None,
+    }
+    record.update(values)
+    return record
+
+
+def message(id, minutes):
+    return {
+        'id': id,
+        'user_id': None,
+        'content': f'сообщение {id}',
+        'created_at': CREATED_AT + datetime.timedelta(minutes=minutes),
+    }
+
+
+@pytest.mark.parametrize('values', [{}, {'user_id': None, 'username': None}])
+def test_ticket_read_matches_validated_model(values):
+    record = ticket_record(**values)
+    ticket = TicketService.ticket_read(record)
+    assert ticket.model_fields_set == set(TicketRead.model_fields)
+    assert ticket == TicketRead.model_validate(ticket.model_dump())
+    assert ticket.status.name == 'Открыт'
+    assert (ticket.user_id and ticket.user_id.username) == values.get(
+        'username', 'operator'
+    )
+
+
+class FakeQuery:
+    def __init__(self, result):
+        self.result = result
+        self.params = None
+
+    async def fetch(self, session, **params):
+        self.params = params
+        return self.result
+
+    async def fetchrow(self, session, **params):
+        self.params = params
+        return self.result
+
+
+class FakeSession:
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+
+def test_get_by_id_builds_detail_from_records(monkeypatch):
+    by_id = FakeQuery(ticket_record())
+    monkeypatch.setattr(queries, 'TICKET_BY_ID', by_id)
+    monkeypatch.setattr(
+        queries, 'TICKET_MESSAGES', FakeQuery([message(12, 2)])
+    )
+    monkeypatch.setattr(queries, 'TICKET_ARCHIVE', FakeQuery(
+        {'messages': pack([message(10, 0), message(11, 1)])}
+    ))
+    detail = asyncio.run(TicketService(FakeSession()).get_by_id('5'))
+    assert by_id.params == {'ticket_id': 5}
+    assert detail.model_fields_set == set(TickeDetail.model_fields)
+    assert detail == TickeDetail.model_validate(detail.model_dump())
+    assert detail.telegram_user_id == 42
+    # архивные сообщения идут перед оставшимися в message
+    assert [x.id for x in detail.messages] == [10, 11, 12]
+    assert detail.messages[0].created_at == CREATED_AT
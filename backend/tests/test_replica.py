@@ -0,0 +1,140 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.db import replica
+from src.db.replica import (ReadAfterWrite, get_read_session,
+                            read_after_write, track_writes)
+from src.db.sqlalchemy import get_async_session
+
+PRIMARY_DSN = os.getenv('TEST_PRIMARY_DSN')
+REPLICA_DSN = os.getenv('TEST_REPLICA_DSN')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(replica.time, 'monotonic', clock)
+    return clock
+
+
+def test_read_after_write_window(clock):
+    writes = ReadAfterWrite(sticky_seconds=5)
+    writes.mark('a')
+    writes.mark(None)
+    assert writes.recent('a')
+    assert not writes.recent('b') and not writes.recent(None)
+    clock.now += 5
+    assert not writes.recent('a')
+
+
+def test_expired_clients_are_pruned(clock):
+    writes = ReadAfterWrite(sticky_seconds=5, max_clients=2)
+    writes.mark('a')
+    clock.now += 10
+    writes.mark('b')
+    writes.mark('c')
+    assert set(writes.writes) == {'b', 'c'}
+
+
+def probe_app(primary, replica_factory, monkeypatch) -> FastAPI:
+    """
+    Приложение с маршрутизацией как у API: запись через основную сессию,
+    чтение через get_read_session. Ответ говорит, какой сервер читал.
+    """
+    monkeypatch.setattr(replica, 'read_session_factory', replica_factory)
+    monkeypatch.setattr(read_after_write, 'writes', {})
+    app = FastAPI()
+    app.middleware('http')(track_writes)
+
+    async def primary_session():
+        async with primary() as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = primary_session
+
+    @app.post('/probe')
+    async def write(session=Depends(get_async_session)):
+        async with session.begin():
+            return {'id': (await session.execute(
+                text('INSERT INTO replica_probe DEFAULT VALUES RETURNING id')
+            )).scalar()}
+
+    @app.get('/probe')
+    async def read(session=Depends(get_read_session)):
+        async with session.begin():
+            in_recovery = (await session.execute(
+                text('SELECT pg_is_in_recovery()')
+            )).scalar()
+            last_id = (await session.execute(
+                text('SELECT max(id) FROM replica_probe')
+            )).scalar()
+        return {'replica': in_recovery, 'last_id': last_id}
+
+    return app
+
+
+@pytest.mark.skipif(
+    not (PRIMARY_DSN and REPLICA_DSN),
+    reason='нужны TEST_PRIMARY_DSN и TEST_REPLICA_DSN, '
+           'см. tests/docker-compose.replica.yml'
+)
+def test_reads_follow_writes_to_primary(clock, monkeypatch):
+    async def run():
+        primary_engine = create_async_engine(PRIMARY_DSN)
+        replica_engine = create_async_engine(REPLICA_DSN)
+        async with primary_engine.begin() as connection:
+            await connection.execute(text(
+                'CREATE TABLE IF NOT EXISTS replica_probe '
+                '(id serial PRIMARY KEY)'
+            ))
+        app = probe_app(
+            async_sessionmaker(primary_engine),
+            async_sessionmaker(replica_engine),
+            monkeypatch
+        )
+        writer = {'Authorization': 'Bearer writer'}
+        other = {'Authorization': 'Bearer other'}
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url='http://test'
+            ) as client:
+                assert (await client.get(
+                    '/probe', headers=writer
+                )).json()['replica'] is True
+
+                written = (await client.post(
+                    '/probe', headers=writer
+                )).json()['id']
+                # свою запись клиент читает из основной БД и сразу видит
+                assert (await client.get(
+                    '/probe', headers=writer
+                )).json() == {'replica': False, 'last_id': written}
+                # остальные клиенты по-прежнему читают реплику
+                assert (await client.get(
+                    '/probe', headers=other
+                )).json()['replica'] is True
+
+                clock.now += replica.settings.READ_STICKY_SECONDS
+                assert (await client.get(
+                    '/probe', headers=writer
+                )).json()['replica'] is True
+        finally:
+            await primary_engine.dispose()
+            await replica_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,160 @@
+import asyncio
+import datetime
+
+import jwt
+import pytest
+from fastapi import HTTPException, Request
+
+from src.api.middleware import SingleFlight, SingleFlightStats
+from src.core.config import settings
+from src.db.replica import read_after_write
+from src.service import user as user_service
+
+
+def token(user_id):
+    return jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    }, settings.SECRET, algorithm='HS256')
+
+
+def http_scope(path, query='', access_token=None, method='GET'):
+    headers = []
+    if access_token:
+        headers.append((b'authorization', f'Bearer {access_token}'.encode()))
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': headers,
+    }
+
+
+class App:
+    """Обработчик, который ждет gate и отвечает номером вызова."""
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.fail = fail
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        call = self.calls
+        await self.gate.wait()
+        if self.fail and call == 1:
+            raise RuntimeError('db is down')
+        await send({'type': 'http.response.start', 'status': 200})
+        await send({'type': 'http.response.body', 'body': str(call).encode()})
+
+
+async def request(flight, scope):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await flight(scope, None, send)
+    return sent[-1]['body'].decode()
+
+
+async def concurrently(app, *scopes):
+    flight = SingleFlight(app)
+    tasks = [asyncio.create_task(request(flight, x)) for x in scopes]
+    await asyncio.sleep(0)
+    app.gate.set()
+    return await asyncio.gather(*tasks)
+
+
+@pytest.fixture(autouse=True)
+def clean(monkeypatch):
+    monkeypatch.setattr(SingleFlight, 'stats', SingleFlightStats())
+    monkeypatch.setattr(read_after_write, 'writes', {})
+
+
+def test_same_request_is_executed_once():
+    async def run():
+        app = App()
+        bodies = await concurrently(
+            app,
+            http_scope('/api/v1/ticket/', 'a=1&b=2', token(1)),
+            http_scope('/api/v1/ticket/', 'b=2&a=1', token(2)),
+        )
+        return app.calls, bodies
+    calls, bodies = asyncio.run(run())
+    assert calls == 1 and bodies == ['1', '1']
+    assert SingleFlight.stats.as_dict()['coalesced'] == 1
+
+
+@pytest.mark.parametrize('second', [
+    http_scope('/api/v1/ticket/', 'a=2', token(2)),
+    http_scope('/api/v1/ticket/', 'a=1', 'garbage'),
+    http_scope('/api/v1/ticket/', 'a=1'),
+    http_scope('/api/v1/user/', 'a=1', token(2)),
+    http_scope('/api/v1/ticket/', 'a=1', token(2), method='POST'),
+])
+def test_other_requests_are_not_coalesced(second):
+    async def run():
+        app = App()
+        await concurrently(
+            app, http_scope('/api/v1/ticket/', 'a=1', token(1)), second
+        )
+        return app.calls
+    assert asyncio.run(run()) == 2
+
+
+def test_recent_writer_reads_on_its_own():
+    writer = token(2)
+    read_after_write.mark(writer)
+
+    async def run():
+        app = App()
+        bodies = await concurrently(
+            app,
+            http_scope('/api/v1/ticket/1', access_token=token(1)),
+            http_scope('/api/v1/ticket/1', access_token=writer),
+        )
+        return app.calls, bodies
+    assert asyncio.run(run()) == (2, ['1', '2'])
+
+
+def test_followers_retry_when_leader_fails():
+    async def run():
+        app = App(fail=True)
+        flight = SingleFlight(app)
+        scope = http_scope('/api/v1/ticket/stats', access_token=token(1))
+        leader = asyncio.create_task(request(flight, dict(scope)))
+        follower = asyncio.create_task(request(flight, dict(scope)))
+        await asyncio.sleep(0)
+        app.gate.set()
+        results = await asyncio.gather(
+            leader, follower, return_exceptions=True
+        )
+        return app.calls, results, flight.flights
+    calls, (leader, follower), flights = asyncio.run(run())
+    assert isinstance(leader, RuntimeError)
+    assert calls == 2 and follower == '2'
+    assert flights == {}
+
+
+def test_checked_token_is_not_decoded_again(monkeypatch):
+    access_token = token(7)
+    scope = http_scope('/api/v1/ticket/', access_token=access_token)
+    assert SingleFlight.key(scope) is not None
+
+    def decode(_):
+        raise AssertionError('токен декодирован повторно')
+
+    monkeypatch.setattr(user_service, 'user_id_from_token', decode)
+    assert user_service.request_user_id(Request(scope), access_token) == 7
+    # другой токен в том же запросе проверяется заново
+    with pytest.raises(AssertionError):
+        user_service.request_user_id(Request(scope), token(8))
+
+
+def test_invalid_token_is_rejected_without_middleware():
+    scope = http_scope('/api/v1/user/')
+    with pytest.raises(HTTPException) as error:
+        user_service.request_user_id(Request(scope), 'garbage')
+    assert error.value.status_code == 401
+    assert SingleFlight.key(scope) is None
@@ -0,0 +1,105 @@
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from src.service.ticket import TicketService
+
+UPDATED_AT = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def ticket(id, change_xid):
+    return SimpleNamespace(
+        id=id,
+        change_xid=change_xid,
+        user_id=None,
+        status_id=1,
+        updated_at=UPDATED_AT,
+        message_count=0,
+        last_message_id=None,
+        last_message_at=None
+    )
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def all(self):
+        return self.value
+
+
+class FakeSession:
+    """Отдает xmin снимка и строки тикетов, запоминает параметры запроса."""
+    def __init__(self, rows, xmin=1000):
+        self.rows = rows
+        self.xmin = xmin
+        self.params = None
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    async def execute(self, statement):
+        return FakeResult(self.xmin)
+
+    async def scalars(self, statement):
+        self.params = statement.compile().params
+        return FakeResult(self.rows)
+
+
+def changes(session, since, page_size=2):
+    return asyncio.run(TicketService(session).get_changes(since, page_size))
+
+
+@pytest.mark.parametrize('since, cursor', [
+    (None, (0, 0)),
+    ('', (0, 0)),
+    ('15:7', (15, 7)),
+])
+def test_cursor_is_parsed(since, cursor):
+    session = FakeSession([])
+    changes(session, since)
+    assert sorted(session.params.values()) == sorted([*cursor, 1000, 3])
+
+
+@pytest.mark.parametrize('since', ['garbage', '15', '15:7:1', '15:x', ':'])
+def test_bad_cursor_is_rejected(since):
+    session = FakeSession([])
+    with pytest.raises(HTTPException) as error:
+        changes(session, since)
+    assert error.value.status_code == 400
+    assert session.params is None
+
+
+def test_empty_page_keeps_cursor():
+    result, next_cursor, has_more = changes(FakeSession([]), '15:7')
+    assert result == []
+    assert next_cursor == '15:7'
+    assert has_more is False
+
+
+def test_first_empty_page_starts_from_zero():
+    assert changes(FakeSession([]), None) == ([], '0:0', False)
+
+
+def test_full_page_points_after_last_row():
+    rows = [ticket(3, 20), ticket(1, 21), ticket(2, 21)]
+    result, next_cursor, has_more = changes(FakeSession(rows), '15:7')
+    assert [x.id for x in result] == [3, 1]
+    assert next_cursor == '21:1'
+    assert has_more is True
+
+
+def test_last_page_has_no_more():
+    rows = [ticket(3, 20)]
+    result, next_cursor, has_more = changes(FakeSession(rows), '15:7')
+    assert [x.id for x in result] == [3]
+    assert next_cursor == '20:3'
+    assert has_more is False
@@ -0,0 +1,112 @@
+import asyncio
+import datetime
+import json
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from src.service.archive import pack
+from src.service.ticket import TicketService
+
+CREATED_AT = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def ticket(id):
+    return SimpleNamespace(
+        id=id,
+        telegram_user_id=100 + id,
+        user_id=None,
+        status_id=1,
+        created_at=CREATED_AT,
+        updated_at=CREATED_AT,
+        message_count=0
+    )
+
+
+def message(ticket_id, id):
+    return SimpleNamespace(
+        ticket_id=ticket_id,
+        id=id,
+        user_id=None,
+        content=f'сообщение {id}',
+        created_at=CREATED_AT
+    )
+
+
+def file(ticket_id, id):
+    return SimpleNamespace(
+        ticket_id=ticket_id,
+        id=id,
+        name=f'file{id}.txt',
+        created_by=None,
+        created_at=CREATED_AT,
+        status=2,
+        checksum=None
+    )
+
+
+def archive(ticket_id, *ids):
+    return SimpleNamespace(
+        ticket_id=ticket_id,
+        messages=pack([
+            {'id': x, 'user_id': None, 'content': f'архив {x}',
+             'created_at': CREATED_AT}
+            for x in ids
+        ])
+    )
+
+
+async def rows(items):
+    for item in items:
+        yield item
+
+
+class FakeSession:
+    """Отдает потоки в порядке открытия: тикеты, сообщения, файлы, архив."""
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.options = None
+
+    @asynccontextmanager
+    async def begin(self):
+        yield
+
+    async def connection(self, execution_options=None):
+        self.options = execution_options
+
+    async def stream(self, statement):
+        return rows(self.streams.pop(0))
+
+
+def export(session, chunk_size=65536):
+    async def run():
+        return [x async for x in TicketService(session).export(
+            chunk_size=chunk_size
+        )]
+    return [json.loads(x) for x in ''.join(asyncio.run(run())).splitlines()]
+
+
+def test_streams_are_merged_by_ticket():
+    session = FakeSession(
+        [ticket(2), ticket(3), ticket(5), ticket(7)],
+        # 1 и 4 - сообщения без тикета в выгрузке, у 3 и 7 сообщений нет
+        [message(1, 10), message(2, 11), message(2, 12), message(4, 13),
+         message(5, 14), message(9, 15)],
+        [file(3, 20), file(6, 21), file(7, 22)],
+        [archive(1, 1), archive(5, 2, 3)],
+    )
+    lines = export(session, chunk_size=1)
+    assert [x['id'] for x in lines] == [2, 3, 5, 7]
+    assert [[m['id'] for m in x['messages']] for x in lines] == [
+        [11, 12], [], [2, 3, 14], []
+    ]
+    assert [[f['id'] for f in x['files']] for x in lines] == [
+        [], [20], [], [22]
+    ]
+    assert session.options == {
+        'isolation_level': 'REPEATABLE READ', 'postgresql_readonly': True
+    }
+
+
+def test_export_without_tickets():
+    session = FakeSession([], [message(1, 10)], [file(1, 20)], [])
+    assert export(session) == []
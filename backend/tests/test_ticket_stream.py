@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+from collections import OrderedDict
+
+import jwt
+import pytest
+from fastapi import Request
+
+from src.api.v1.ticket import events
+from src.core import ticket_stream
+from src.core.config import settings
+from src.core.ticket_stream import (EPOCH, TicketStream, event_id,
+                                    parse_event_id)
+
+
+@pytest.fixture(autouse=True)
+def stream(monkeypatch):
+    monkeypatch.setattr(TicketStream, 'seq', 0)
+    monkeypatch.setattr(TicketStream, 'buffers', OrderedDict())
+    monkeypatch.setattr(TicketStream, 'floors', {})
+    monkeypatch.setattr(TicketStream, 'subscribers', {})
+    monkeypatch.setattr(ticket_stream, 'BUFFER_SIZE', 3)
+    monkeypatch.setattr(ticket_stream, 'MAX_TICKETS', 2)
+    monkeypatch.setattr(ticket_stream, 'QUEUE_SIZE', 2)
+
+
+def publish(ticket_id, count):
+    for _ in range(count):
+        TicketStream.publish(ticket_id, 'message', {})
+
+
+def seqs(events):
+    return [event.seq for event in events]
+
+
+def test_event_id_round_trip():
+    assert parse_event_id(event_id(7, 42)) == (EPOCH, 7, 42)
+    assert parse_event_id(None) is None
+    assert parse_event_id('garbage') is None
+    assert parse_event_id('a.b.c') is None
+
+
+def test_replay_from_buffer():
+    publish(1, 2)
+    publish(2, 1)
+    publish(1, 1)
+    assert seqs(TicketStream.replay(1, EPOCH, 0)) == [1, 2, 4]
+    assert seqs(TicketStream.replay(1, EPOCH, 2)) == [4]
+    assert TicketStream.replay(1, EPOCH, 4) == []
+
+
+def test_replay_needs_db_after_eviction():
+    publish(1, 5)
+    # в буфере остались 3, 4, 5: пропуск после seq=1 не восстановить
+    assert TicketStream.floors[1] == 2
+    assert TicketStream.replay(1, EPOCH, 1) is None
+    assert seqs(TicketStream.replay(1, EPOCH, 2)) == [3, 4, 5]
+
+
+def test_replay_needs_db_for_other_epoch_or_unknown_ticket():
+    publish(1, 1)
+    assert TicketStream.replay(1, 'other', 0) is None
+    assert TicketStream.replay(2, EPOCH, 0) is None
+
+
+def test_ticket_created_after_client_position_is_not_replayable():
+    publish(1, 3)
+    publish(2, 1)
+    # события тикета 2 до seq=3 не могли попасть в буфер
+    assert TicketStream.floors[2] == 3
+    assert TicketStream.replay(2, EPOCH, 2) is None
+    assert seqs(TicketStream.replay(2, EPOCH, 3)) == [4]
+
+
+def test_buffers_are_lru_limited():
+    publish(1, 1)
+    publish(2, 1)
+    publish(1, 1)
+    publish(3, 1)
+    assert list(TicketStream.buffers) == [1, 3]
+    assert 2 not in TicketStream.floors
+    assert TicketStream.replay(2, EPOCH, 0) is None
+
+
+def test_slow_subscriber_is_dropped():
+    async def run():
+        slow = TicketStream.subscribe(1)
+        fast = TicketStream.subscribe(1)
+        publish(1, 2)
+        await fast.get()
+        await fast.get()
+        publish(1, 1)
+        assert not TicketStream.subscribed(1, slow)
+        assert TicketStream.subscribed(1, fast)
+        assert fast.qsize() == 1
+        # отставший клиент догонит пропущенное по Last-Event-ID
+        assert seqs(TicketStream.replay(1, EPOCH, 2)) == [3]
+        TicketStream.unsubscribe(1, fast)
+        assert TicketStream.subscribers == {}
+    asyncio.run(run())
+
+
+class RacingTicketService:
+    """Сообщение 11 коммитится, пока поток читает последний message_id."""
+    async def get_last_message_id(self, ticket_id):
+        TicketStream.publish(ticket_id, 'message', {'id': 11}, message_id=11)
+        return 11
+
+
+def test_message_committed_while_subscribing_is_sent():
+    access_token = jwt.encode({
+        'user_id': 1,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    }, settings.SECRET, algorithm='HS256')
+    request = Request({'type': 'http', 'headers': []})
+
+    async def run():
+        response = await events(
+            request, 1, access_token, None, RacingTicketService()
+        )
+        frames = response.body_iterator
+        try:
+            return [await frames.__anext__() for _ in range(2)]
+        finally:
+            await frames.aclose()
+    ready, message = asyncio.run(run())
+    assert 'event: ready' in ready
+    assert 'event: message' in message and '"id":11' in message
+    assert TicketStream.subscribers == {}
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def take(self):
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """Сколько секунд до появления следующего токена."""
+        self.refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class AdmissionRejected(Exception):
+    """Общий буфер отложенных сообщений заполнен, сообщение не принято."""
+
+
+class AdmissionControl:
+    """
+    Ограничение потока сообщений по chat.id. Сообщение сверх лимита не
+    пишется сразу, а дописывается к тексту в буфере чата; когда в ведре
+    появится токен, вызывается on_ready(chat_id) и весь буфер уходит
+    одним сообщением. Ведра хранятся в LRU на max_chats чатов.
+    Буферы ограничены по размеру, а не числу сообщений: буфер чата,
+    набравший max_pending символов, сразу отдается на запись, а если все
+    буферы вместе превысили бы max_buffered символов, admit бросает
+    AdmissionRejected, чтобы обработчик ответил в чат.
+    """
+    def __init__(self, rate, burst, max_chats, on_ready,
+                 max_pending=4096, max_buffered=1000000):
+        self.rate = rate
+        self.burst = burst
+        self.max_chats = max_chats
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.on_ready = on_ready
+        self.buckets = OrderedDict()
+        self.pending = {}
+        self.buffered = 0
+        self.timers = {}
+        self.tasks = set()
+        self.rejected = 0
+
+    def bucket(self, chat_id):
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.buckets[chat_id] = TokenBucket(
+                self.rate, self.burst
+            )
+            while len(self.buckets) > self.max_chats:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(chat_id)
+        return bucket
+
+    def admit(self, chat_id, text):
+        """
+        Возвращает текст для записи (вместе с накопленным буфером) или
+        None, если сообщение отложено в буфер.
+        """
+        pending = self.pending.get(chat_id)
+        joined = text if pending is None else f'{pending}\n{text}'
+        if self.bucket(chat_id).take() or len(joined) >= self.max_pending:
+            # токен есть или буфер чата набрал на отдельную запись
+            self.pop(chat_id)
+            return joined
+        if self.buffered + len(joined) - len(pending or '') > (
+            self.max_buffered
+        ):
+            self.rejected += 1
+            logging.warning(
+                'Буфер сообщений переполнен, сообщение чата %s не принято',
+                chat_id
+            )
+            raise AdmissionRejected()
+        self.pending[chat_id] = joined
+        self.buffered += len(joined) - len(pending or '')
+        if chat_id not in self.timers:
+            self.timers[chat_id] = asyncio.get_running_loop().call_later(
+                self.bucket(chat_id).wait_time(), self.ready, chat_id
+            )
+        return None
+
+    def pop(self, chat_id):
+        timer = self.timers.pop(chat_id, None)
+        if timer:
+            timer.cancel()
+        pending = self.pending.pop(chat_id, None)
+        if pending is not None:
+            self.buffered -= len(pending)
+        return pending
+
+    def ready(self, chat_id):
+        self.timers.pop(chat_id, None)
+        task = asyncio.create_task(self.on_ready(chat_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def take_pending(self, chat_id):
+        """Забирает буфер чата, расходуя токен ведра (без ожидания)."""
+        pending = self.pop(chat_id)
+        if not pending:
+            return None
+        self.bucket(chat_id).take()
+        return pending
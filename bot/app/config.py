@@ -0,0 +1,69 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+
+# общий с бэкендом секрет межсервисных вызовов (заголовок X-Internal-Secret)
+INTERNAL_API_SECRET: str = os.getenv('INTERNAL_API_SECRET', '')
+# сколько секунд ждать бэкенд при выборе исполнителя нового тикета
+ASSIGN_TIMEOUT: float = float(os.getenv('ASSIGN_TIMEOUT', '2'))
+# сколько секунд ждать бэкенд при оповещении о новом сообщении
+NOTIFY_TIMEOUT: float = float(os.getenv('NOTIFY_TIMEOUT', '5'))
+
+# тут храним файлы, общий каталог с бэкендом
+FILE_PATH: str = os.getenv('FILE_PATH', '/fox_test/file_storage')
+
+# адрес Bot API: можно указать собственный сервер telegram-bot-api
+TELEGRAM_API_URL: str = os.getenv(
+    'TELEGRAM_API_URL', 'https://api.telegram.org'
+)
+# сервер запущен с --local: get_file отдает путь к уже скачанному файлу
+TELEGRAM_LOCAL_MODE: bool = os.getenv(
+    'TELEGRAM_LOCAL_MODE', 'false'
+).lower() in ('1', 'true', 'yes')
+
+# фоновое скачивание документов: число воркеров и длина очереди
+DOWNLOAD_WORKERS: int = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+DOWNLOAD_QUEUE_SIZE: int = int(os.getenv('DOWNLOAD_QUEUE_SIZE', '100'))
+# файлы, не скачанные до перезапуска, при старте ставятся в очередь снова,
+# если им не больше стольких секунд, иначе помечаются failed
+PENDING_FILE_MAX_AGE: int = int(os.getenv('PENDING_FILE_MAX_AGE', '86400'))
+
+# режим получения апдейтов: polling или webhook
+BOT_MODE: str = os.getenv('BOT_MODE', 'polling')
+# публичный адрес, на который Telegram шлет апдейты (за балансировщиком)
+WEBHOOK_URL: str = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH: str = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET: str = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST: str = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT: int = int(os.getenv('WEBHOOK_PORT', '8080'))
+
+# обработка апдейтов: шарды по chat.id, длина очереди шарда и как часто
+# писать в лог глубину очередей, в секундах
+UPDATE_SHARDS: int = int(os.getenv('UPDATE_SHARDS', '8'))
+UPDATE_SHARD_QUEUE_SIZE: int = int(
+    os.getenv('UPDATE_SHARD_QUEUE_SIZE', '100')
+)
+UPDATE_METRICS_INTERVAL: int = int(
+    os.getenv('UPDATE_METRICS_INTERVAL', '60')
+)
+
+# ограничение потока сообщений из одного чата (token bucket): сообщений в
+# секунду и размер всплеска; сколько чатов держать в памяти
+RATE_LIMIT_PER_SECOND: float = float(os.getenv('RATE_LIMIT_PER_SECOND', '1'))
+RATE_LIMIT_BURST: int = int(os.getenv('RATE_LIMIT_BURST', '5'))
+RATE_LIMIT_MAX_CHATS: int = int(os.getenv('RATE_LIMIT_MAX_CHATS', '10000'))
+# отложенные сообщения склеиваются в буфере чата: буфер длиннее стольких
+# символов пишется сразу, а все буферы вместе ограничены вторым числом -
+# сверх него сообщение не принимается и бот просит повторить позже
+RATE_LIMIT_MAX_PENDING: int = int(
+    os.getenv('RATE_LIMIT_MAX_PENDING', '4096')
+)
+RATE_LIMIT_MAX_BUFFERED: int = int(
+    os.getenv('RATE_LIMIT_MAX_BUFFERED', '1000000')
+)
+# сколько сообщений одновременно пишется в БД со всех чатов
+INGEST_CONCURRENCY: int = int(os.getenv('INGEST_CONCURRENCY', '10'))
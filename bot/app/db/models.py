@@ -7,6 +7,11 @@ from sqlalchemy.orm import DeclarativeBase, relationship, declarative_base
 
 Base = declarative_base()
 
+# статусы файла: документ из Telegram еще скачивается, скачан, ошибка
+FILE_PENDING = 'pending'
+FILE_READY = 'ready'
+FILE_FAILED = 'failed'
+
 
 class User(Base):
     __tablename__ = 'user'
@@ -45,6 +50,10 @@ class Ticket(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("TIMEZONE('utc', now())"))
     updated_at = Column(TIMESTAMP(timezone=True), server_default=text("TIMEZONE('utc', now())"),
                         onupdate=datetime.datetime.utcnow)
+    message_count = Column(Integer, server_default=text('0'))
+    last_message_id = Column(Integer)
+    last_message_at = Column(TIMESTAMP(timezone=True))
+    last_customer_message_at = Column(TIMESTAMP(timezone=True))
 
     user = relationship('User', back_populates='tickets', uselist=False)
     messages = relationship('Message', back_populates='ticket', uselist=True)
@@ -72,6 +81,9 @@ class File(Base):
     ticket_id = Column(Integer, ForeignKey('ticket.id'))
     created_by = Column(Integer, ForeignKey('user.id'))
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("TIMEZONE('utc', now())"))
+    checksum = Column(String(64), index=True)
+    status = Column(String(16), server_default='ready')
+    telegram_file_id = Column(String(256))
 
     user = relationship('User', back_populates='files', uselist=False)
     ticket = relationship('Ticket', back_populates='files', uselist=False)
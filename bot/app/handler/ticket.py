@@ -1,14 +1,46 @@
-import requests
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import shutil
+
+import aiohttp
 from aiogram import F, Router, types
 from aiogram.filters import Command
-from app.db.models import File, Message, Scheduler, Ticket
+from app.admission import AdmissionControl, AdmissionRejected
+from app.config import (ASSIGN_TIMEOUT, DOWNLOAD_QUEUE_SIZE, DOWNLOAD_WORKERS,
+                        FILE_PATH, INGEST_CONCURRENCY, INTERNAL_API_SECRET,
+                        NOTIFY_TIMEOUT, PENDING_FILE_MAX_AGE, RATE_LIMIT_BURST,
+                        RATE_LIMIT_MAX_BUFFERED, RATE_LIMIT_MAX_CHATS,
+                        RATE_LIMIT_MAX_PENDING, RATE_LIMIT_PER_SECOND,
+                        TELEGRAM_LOCAL_MODE)
+from app.db.models import (FILE_FAILED, FILE_PENDING, FILE_READY, File,
+                           Message, Scheduler, Ticket)
 from app.db.sqlalchemy import async_session_factory
-from sqlalchemy import and_, or_, select
+from app.sharding import update_executor
+from app.workers import WorkerPool
+from sqlalchemy import and_, bindparam, or_, select, update
 
-FILE_PATH: str = '/fox_test/file_storage'
 
 router = Router()
 
+download_pool = WorkerPool('downloads', DOWNLOAD_WORKERS, DOWNLOAD_QUEUE_SIZE)
+
+# в message.content помещается не больше 1024 символов
+MESSAGE_MAX_LENGTH = 1024
+
+# запросы на каждое входящее сообщение строятся один раз, а не на вызов
+OPEN_TICKET_QUERY = select(Ticket).where(
+    and_(
+        Ticket.telegram_user_id == bindparam('telegram_user_id'),
+        or_(Ticket.status_id == 1, Ticket.status_id == 2)
+    )
+)
+SCHEDULER_QUERY = select(Scheduler).where(
+    Scheduler.telegram_user_id == bindparam('telegram_user_id')
+)
+
 
 @router.message(F.text, Command('start'))
 async def start(message: types.Message):
@@ -20,78 +52,218 @@ async def start(message: types.Message):
 
 @router.message(F.text)
 async def get_msg(message: types.Message):
-    async with async_session_factory() as session:
-        ticket = await get_or_create_ticket(session, message.chat.id)
-        new_message = Message(
-            ticket_id=ticket.id,
-            user_id=None,
-            content=message.text
-        )
-        session.add(new_message)
-        await session.flush()
-        await notify_api_service(
-            {
-                "ticket_id": ticket.id,
-                "msg_id": new_message.id,
-                "content": new_message.content
-            }
+    try:
+        text = admission.admit(message.chat.id, message.text)
+    except AdmissionRejected:
+        await message.answer(
+            'Сейчас слишком много сообщений, это сообщение не сохранено. '
+            'Пожалуйста, отправьте его еще раз через минуту'
         )
+        return
+    if text is not None:
+        await save_message(message.chat.id, text)
+
+
+async def flush_pending(chat_id):
+    text = admission.take_pending(chat_id)
+    if text is not None:
+        await save_message(chat_id, text)
+
+
+async def schedule_flush(chat_id):
+    # накопленный буфер пишется в очереди шарда чата, чтобы не обогнать
+    # следующие сообщения этого же чата
+    await update_executor.submit(chat_id, flush_pending, chat_id)
+
+
+admission = AdmissionControl(
+    RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CHATS,
+    on_ready=schedule_flush, max_pending=RATE_LIMIT_MAX_PENDING,
+    max_buffered=RATE_LIMIT_MAX_BUFFERED
+)
+ingest_semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+
+async def save_message(chat_id, text):
+    async with ingest_semaphore, async_session_factory() as session:
+        ticket, created = await get_or_create_ticket(session, chat_id)
+        notify_batch = []
+        # склеенный буфер может не поместиться в одно сообщение
+        for i in range(0, len(text), MESSAGE_MAX_LENGTH):
+            new_message = Message(
+                ticket_id=ticket.id,
+                user_id=None,
+                content=text[i:i + MESSAGE_MAX_LENGTH]
+            )
+            session.add(new_message)
+            await session.flush()
+            touch_ticket(ticket, new_message)
+            notify_batch.append(
+                notify_payload(ticket, new_message, created and not i)
+            )
+        ticket_id, user_id = ticket.id, ticket.user_id
+        await session.commit()
+    if created:
+        user_id = await assign_created_ticket(ticket_id, user_id)
+        for notify_data in notify_batch:
+            notify_data['user_id'] = user_id
+    for notify_data in notify_batch:
+        await notify_api_service(notify_data)
 
 
 @router.message()
 async def get_file(message: types.Message):
     if message.content_type == 'document':
-        file_id = message.document.file_id
-        file = await message.bot.get_file(file_id)
-        file_path = file.file_path
         file_name = message.document.file_name
-        async with async_session_factory() as session:
-            ticket = await get_or_create_ticket(session, message.chat.id)
-            file_extension = file_name.split('.')[-1]
+        async with ingest_semaphore, async_session_factory() as session:
+            ticket, created = await get_or_create_ticket(
+                session, message.chat.id
+            )
             new_file = File(
                 name=file_name,
-                ticket_id=ticket.id
+                ticket_id=ticket.id,
+                # file_id из Telegram сохраняем, чтобы бэкенд мог
+                # переотправлять этот файл без загрузки байтов
+                telegram_file_id=message.document.file_id,
+                status=FILE_PENDING
             )
             new_file.created_by = None
             session.add(new_file)
             await session.flush()
-            file_id = new_file.id
-            path_to_save = f'{FILE_PATH}/{file_id}.{file_extension}'
-            await message.bot.download_file(file_path, path_to_save)
-            new_message = Message(
-                ticket_id=ticket.id,
-                user_id=None,
-                content=f"Пользователь прикрепил файл: file_id={file_id}"
-            )
-            await session.flush()
-            await notify_api_service(
-                {
-                    "ticket_id": ticket.id,
-                    "msg_id": new_message.id,
-                    "content": new_message.content
-                }
+            file_id, ticket_id = new_file.id, ticket.id
+            user_id = ticket.user_id
+            await session.commit()
+        if created:
+            await assign_created_ticket(ticket_id, user_id)
+        # скачивание идет без открытой транзакции и соединения с БД
+        await download_pool.submit(
+            download_document,
+            message.bot,
+            message.document.file_id,
+            file_id,
+            file_name,
+            ticket_id,
+            created
+        )
+
+
+async def download_document(bot, telegram_file_id, file_id, file_name,
+                            ticket_id, ticket_created=False):
+    file_extension = file_name.split('.')[-1]
+    path_to_save = f'{FILE_PATH}/{file_id}.{file_extension}'
+    try:
+        checksum = await fetch_document(bot, telegram_file_id, path_to_save)
+    except Exception:
+        logging.exception('Не удалось скачать файл file_id=%s', file_id)
+        async with ingest_semaphore, async_session_factory() as session:
+            await session.execute(
+                update(File)
+                .where(File.id == file_id)
+                .values(status=FILE_FAILED)
             )
+            await session.commit()
+        return
+    async with ingest_semaphore, async_session_factory() as session:
+        await session.execute(
+            update(File)
+            .where(File.id == file_id)
+            .values(status=FILE_READY, checksum=checksum)
+        )
+        ticket = await session.get(Ticket, ticket_id)
+        new_message = Message(
+            ticket_id=ticket_id,
+            user_id=None,
+            content=f"Пользователь прикрепил файл: file_id={file_id}"
+        )
+        session.add(new_message)
+        await session.flush()
+        touch_ticket(ticket, new_message)
+        notify_data = notify_payload(ticket, new_message, ticket_created)
+        await session.commit()
+    # оповещаем, только когда файл уже лежит на диске
+    await notify_api_service(notify_data)
+
+
+async def requeue_pending_files(bot):
+    """
+    Очередь скачивания живет только в памяти: после перезапуска бота
+    файлы, оставшиеся в FILE_PENDING, снова ставятся в download_pool.
+    Слишком старые (старше PENDING_FILE_MAX_AGE) помечаются FILE_FAILED.
+    Вызывается при старте, когда воркеры пула уже запущены.
+    """
+    cutoff = datetime.datetime.now(
+        datetime.timezone.utc
+    ) - datetime.timedelta(seconds=PENDING_FILE_MAX_AGE)
+    async with async_session_factory() as session:
+        failed = await session.execute(
+            update(File)
+            .where(File.status == FILE_PENDING, File.created_at < cutoff)
+            .values(status=FILE_FAILED)
+        )
+        # тикет без сообщений создан этим файлом: о нем еще не оповещали
+        pending = (await session.execute(
+            select(
+                File.id,
+                File.name,
+                File.ticket_id,
+                File.telegram_file_id,
+                Ticket.message_count
+            ).join(
+                Ticket, Ticket.id == File.ticket_id
+            ).where(
+                File.status == FILE_PENDING,
+                File.telegram_file_id.is_not(None)
+            ).order_by(File.id)
+        )).all()
+        await session.commit()
+    if failed.rowcount:
+        logging.warning(
+            'Устаревших незагруженных файлов: %s', failed.rowcount
+        )
+    for row in pending:
+        await download_pool.submit(
+            download_document,
+            bot,
+            row.telegram_file_id,
+            row.id,
+            row.name,
+            row.ticket_id,
+            row.message_count == 0
+        )
+    if pending:
+        logging.info(
+            'Повторно поставлено в загрузку файлов: %s', len(pending)
+        )
+    return len(pending)
+
+
+async def fetch_document(bot, telegram_file_id, path_to_save):
+    """Сохраняет документ из Telegram в path_to_save, возвращает sha256."""
+    file = await bot.get_file(telegram_file_id)
+    if TELEGRAM_LOCAL_MODE:
+        # локальный сервер уже скачал файл к себе на диск
+        await asyncio.to_thread(
+            store_local_file, file.file_path, path_to_save
+        )
+    else:
+        await bot.download_file(file.file_path, path_to_save)
+    return await asyncio.to_thread(file_checksum, path_to_save)
 
 
 async def get_or_create_ticket(session, telegram_user_id):
     ticket = (
         await session.execute(
-            select(Ticket)
-            .where(
-                and_(
-                    Ticket.telegram_user_id == telegram_user_id,
-                    or_(Ticket.status_id == 1, Ticket.status_id == 2)
-                )
-            )
+            OPEN_TICKET_QUERY, {'telegram_user_id': telegram_user_id}
         )
     ).scalar()
     if not ticket:
         scheduler = (
             await session.execute(
-                select(Scheduler)
-                .where(Scheduler.telegram_user_id == telegram_user_id)
+                SCHEDULER_QUERY, {'telegram_user_id': telegram_user_id}
             )
         ).scalar()
+        # правило Scheduler имеет приоритет; без него исполнителя выберет
+        # бэкенд уже после коммита, см. assign_created_ticket
         new_ticket = Ticket(
             telegram_user_id=telegram_user_id,
             status_id=1,
@@ -99,10 +271,101 @@ async def get_or_create_ticket(session, telegram_user_id):
         )
         session.add(new_ticket)
         await session.flush()
-        return new_ticket
-    return ticket
+        return new_ticket, True
+    return ticket, False
+
+
+def store_local_file(source, destination):
+    # жесткая ссылка без копирования, между файловыми системами - перенос
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.move(source, destination)
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def touch_ticket(ticket, message):
+    # сводка по сообщениям тикета обновляется в той же транзакции, что и
+    # вставка сообщения; счетчик инкрементится выражением, без гонок
+    ticket.message_count = Ticket.message_count + 1
+    ticket.last_message_id = message.id
+    ticket.last_message_at = message.created_at
+    if message.user_id is None:
+        ticket.last_customer_message_at = message.created_at
+
+
+def notify_payload(ticket, message, ticket_created=False):
+    # данные тикета нужны бэкенду для ленты событий операторов
+    return {
+        "ticket_id": ticket.id,
+        "msg_id": message.id,
+        "content": message.content,
+        "created_at": message.created_at.isoformat(),
+        "status_id": ticket.status_id,
+        "user_id": ticket.user_id,
+        "ticket_created": ticket_created,
+    }
+
+
+async def assign_ticket(user_id):
+    api_url = "http://backend:8000/api/v1/ticket/assign"
+    try:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=ASSIGN_TIMEOUT)
+        ) as http:
+            async with http.post(
+                api_url,
+                json={"user_id": user_id},
+                headers={"X-Internal-Secret": INTERNAL_API_SECRET}
+            ) as response:
+                response.raise_for_status()
+                return (await response.json())["user_id"]
+    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError):
+        logging.exception("Не удалось получить исполнителя для тикета")
+        return user_id
+
+
+async def assign_created_ticket(ticket_id, user_id):
+    """
+    Сообщает бэкенду о новом тикете и записывает выбранного исполнителя.
+    Вызывается после коммита: пока бэкенд отвечает, ни транзакция, ни
+    соединение из пула не удерживаются. Исполнитель, назначенный за это
+    время вручную, не перезаписывается.
+    """
+    assigned = await assign_ticket(user_id)
+    if assigned is None or assigned == user_id:
+        return user_id
+    async with ingest_semaphore, async_session_factory() as session:
+        result = await session.execute(
+            update(Ticket)
+            .where(Ticket.id == ticket_id, Ticket.user_id.is_(None))
+            .values(user_id=assigned)
+        )
+        await session.commit()
+    return assigned if result.rowcount else user_id
 
 
 async def notify_api_service(message_data):
     api_url = "http://backend:8000/api/v1/message/notify"
-    requests.post(api_url, json=message_data)
+    try:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=NOTIFY_TIMEOUT)
+        ) as http:
+            async with http.post(
+                api_url,
+                json=message_data,
+                headers={"X-Internal-Secret": INTERNAL_API_SECRET}
+            ) as response:
+                response.raise_for_status()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        logging.exception(
+            "Не удалось оповестить бэкенд о сообщении %s",
+            message_data.get("msg_id")
+        )
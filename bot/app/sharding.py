@@ -0,0 +1,31 @@
+from aiogram import BaseMiddleware, types
+from app.config import UPDATE_SHARD_QUEUE_SIZE, UPDATE_SHARDS
+from app.workers import ShardedExecutor
+
+update_executor = ShardedExecutor(UPDATE_SHARDS, UPDATE_SHARD_QUEUE_SIZE)
+
+
+def chat_key(update: types.Update):
+    """Ключ шардирования апдейта: chat.id, иначе отправитель."""
+    event = update.event
+    chat = getattr(event, 'chat', None)
+    if chat is None and getattr(event, 'message', None) is not None:
+        chat = event.message.chat
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+class ShardMiddleware(BaseMiddleware):
+    """
+    Внешний middleware апдейтов для режима polling: обработка апдейта
+    переносится в очередь шарда его чата. Polling при этом идет без
+    задач на каждый апдейт, поэтому порядок постановки в очередь
+    совпадает с порядком апдейтов, а заполненная очередь тормозит polling.
+    """
+    async def __call__(self, handler, event, data):
+        await update_executor.submit(chat_key(event), handler, event, data)
+        return True
@@ -0,0 +1,65 @@
+import asyncio
+import hmac
+import logging
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+from app.config import (WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT,
+                        WEBHOOK_SECRET, WEBHOOK_URL)
+from app.sharding import chat_key, update_executor
+
+
+def build_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    """
+    aiohttp-приложение, принимающее апдейты от Telegram. Апдейт только
+    проверяется и кладется в очередь шарда своего чата, ответ уходит
+    сразу, а обработчики из app.handler выполняют воркеры шардов.
+    """
+    async def receive(request: web.Request) -> web.Response:
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        # compare_digest не принимает строки с не-ASCII символами
+        if not hmac.compare_digest(
+            token.encode('utf-8', 'surrogateescape'), WEBHOOK_SECRET.encode()
+        ):
+            return web.Response(status=401)
+        try:
+            update = types.Update.model_validate(
+                await request.json(), context={'bot': bot}
+            )
+        except ValueError:
+            return web.Response(status=400)
+        if not update_executor.try_submit(
+            chat_key(update), dp.feed_update, bot, update
+        ):
+            # очередь шарда полна: Telegram повторит доставку позже
+            logging.warning('Очередь шарда переполнена')
+            return web.Response(status=503)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'shards': update_executor.stats()})
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    app.router.add_get('/health', health)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    if not WEBHOOK_SECRET:
+        raise RuntimeError('Для режима webhook нужен WEBHOOK_SECRET')
+    runner = web.AppRunner(build_app(bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    # реплики регистрируют один и тот же адрес, вызов идемпотентный
+    await bot.set_webhook(
+        f'{WEBHOOK_URL.rstrip("/")}{WEBHOOK_PATH}',
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    logging.info('Webhook слушает %s:%s', WEBHOOK_HOST, WEBHOOK_PORT)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+
+
+class WorkerPool:
+    """
+    Ограниченный пул фоновых воркеров поверх asyncio.Queue.
+    submit ждет, пока в очереди освободится место, так что при
+    переполнении обработчики апдейтов притормаживают, а не копят задачи.
+    """
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.tasks = []
+        # метрики: обработано задач и максимальная глубина очереди
+        self.processed = 0
+        self.high_water = 0
+
+    def start(self):
+        self.tasks = [
+            asyncio.create_task(self.worker())
+            for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+
+    async def submit(self, func, *args):
+        await self.queue.put((func, args))
+        self.high_water = max(self.high_water, self.queue.qsize())
+
+    def try_submit(self, func, *args):
+        """Ставит задачу без ожидания, False - если очередь заполнена."""
+        try:
+            self.queue.put_nowait((func, args))
+        except asyncio.QueueFull:
+            return False
+        self.high_water = max(self.high_water, self.queue.qsize())
+        return True
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'depth': self.queue.qsize(),
+            'high_water': self.high_water,
+            'processed': self.processed,
+        }
+
+    async def worker(self):
+        while True:
+            func, args = await self.queue.get()
+            try:
+                await func(*args)
+            except Exception:
+                logging.exception('Ошибка задачи в пуле %s', self.name)
+            finally:
+                self.processed += 1
+                self.queue.task_done()
+
+
+class ShardedExecutor:
+    """
+    N очередей по одному воркеру, задача попадает в очередь по хешу ключа
+    (chat.id). Задачи одного чата выполняются строго по порядку, разные
+    чаты обрабатываются параллельно. Заполненная очередь шарда тормозит
+    submit и отклоняет try_submit.
+    """
+    def __init__(self, shards, queue_size):
+        self.shards = [
+            WorkerPool(f'shard-{i}', 1, queue_size) for i in range(shards)
+        ]
+
+    def shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+
+    async def stop(self):
+        for shard in self.shards:
+            await shard.stop()
+
+    async def submit(self, key, func, *args):
+        await self.shard(key).submit(func, *args)
+
+    def try_submit(self, key, func, *args):
+        return self.shard(key).try_submit(func, *args)
+
+    def stats(self):
+        return [shard.stats() for shard in self.shards]
+
+    async def log_stats(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            logging.info('Очереди шардов: %s', self.stats())
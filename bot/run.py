@@ -1,22 +1,45 @@
 import asyncio
 import logging
-import os
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from app.config import (BOT_MODE, BOT_TOKEN, TELEGRAM_API_URL,
+                        TELEGRAM_LOCAL_MODE, UPDATE_METRICS_INTERVAL)
 from app.handler import ticket
-from dotenv import load_dotenv
-
-load_dotenv()
+from app.sharding import ShardMiddleware, update_executor
+from app.webhook import run_webhook
 
 logging.basicConfig(level=logging.DEBUG)
 
 
 async def main() -> None:
     logging.info("START_BOT")
-    bot = Bot(token=os.getenv("BOT_TOKEN"))
+    session = AiohttpSession(
+        api=TelegramAPIServer.from_base(
+            TELEGRAM_API_URL, is_local=TELEGRAM_LOCAL_MODE
+        )
+    )
+    bot = Bot(token=BOT_TOKEN, session=session)
     dp = Dispatcher()
     dp.include_router(ticket.router)
-    await dp.start_polling(bot)
+    ticket.download_pool.start()
+    await ticket.requeue_pending_files(bot)
+    update_executor.start()
+    metrics = asyncio.create_task(
+        update_executor.log_stats(UPDATE_METRICS_INTERVAL)
+    )
+    try:
+        if BOT_MODE == 'webhook':
+            await run_webhook(bot, dp)
+        else:
+            # апдейты раскладываются по шардам чатов в ShardMiddleware
+            dp.update.outer_middleware(ShardMiddleware())
+            await dp.start_polling(bot, handle_as_tasks=False)
+    finally:
+        metrics.cancel()
+        await update_executor.stop()
+        await ticket.download_pool.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+import os
+
+# модули бота читают настройки из окружения при импорте; к БД тесты не
+# подключаются
+os.environ.setdefault('BOT_TOKEN', '123456:TEST')
+os.environ.setdefault('POSTGRES_USER', 'test')
+os.environ.setdefault('POSTGRES_PASSWORD', 'test')
+os.environ.setdefault('POSTGRES_HOST', 'localhost')
+os.environ.setdefault('POSTGRES_PORT', '5432')
+os.environ.setdefault('POSTGRES_DB', 'test')
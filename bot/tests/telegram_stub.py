@@ -0,0 +1,171 @@
+"""
+Заглушка Bot API для тестов и ручной проверки локального режима.
+
+Отвечает на getFile, sendDocument и sendMediaGroup и отдает файлы по
+/file/bot<token>/<path>. В локальном режиме (как telegram-bot-api с
+--local) getFile возвращает абсолютный путь к файлу на диске, а
+отправка принимает документ путем file://.
+
+Запуск вручную:
+    python -m tests.telegram_stub --storage /tmp/telegram --local
+и TELEGRAM_API_URL=http://localhost:8081 у бота и бэкенда.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+
+class TelegramStub:
+    def __init__(self, storage: str, local: bool = True):
+        self.storage = storage
+        self.local = local
+        # file_id -> путь относительно storage
+        self.files: dict[str, str] = {}
+        # отправленные документы: chat_id, имя, содержимое
+        self.sent: list[dict] = []
+        self.ids = itertools.count(1)
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    def add_file(self, file_id: str, name: str, content: bytes) -> str:
+        """Кладет файл в хранилище, как будто его прислал пользователь."""
+        path = os.path.join('documents', f'{file_id}_{name}')
+        full_path = os.path.join(self.storage, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(content)
+        self.files[file_id] = path
+        return full_path
+
+    @staticmethod
+    def ok(result) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def error(description: str, status: int = 400) -> web.Response:
+        return web.json_response(
+            {'ok': False, 'error_code': status, 'description': description},
+            status=status
+        )
+
+    async def params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update(await request.post())
+        return params
+
+    async def get_file(self, request: web.Request) -> web.Response:
+        file_id = (await self.params(request)).get('file_id')
+        path = self.files.get(file_id)
+        if path is None:
+            return self.error('Bad Request: invalid file_id')
+        full_path = os.path.join(self.storage, path)
+        return self.ok({
+            'file_id': file_id,
+            'file_unique_id': file_id,
+            'file_size': os.path.getsize(full_path),
+            'file_path': full_path if self.local else path,
+        })
+
+    def read_document(self, document, name: Optional[str]):
+        """Имя и байты документа: загрузка, file:// или file_id."""
+        if isinstance(document, web.FileField):
+            return document.filename, document.file.read()
+        if document.startswith('file://'):
+            if not self.local:
+                raise ValueError('file:// доступен только в локальном режиме')
+            path = urlparse(document).path
+            with open(path, 'rb') as f:
+                return os.path.basename(path), f.read()
+        path = self.files.get(document)
+        if path is None:
+            raise ValueError('wrong file identifier')
+        with open(os.path.join(self.storage, path), 'rb') as f:
+            return name or os.path.basename(path), f.read()
+
+    def store(self, chat_id, name: str, content: bytes) -> dict:
+        file_id = f'stub-{next(self.ids)}'
+        self.add_file(file_id, name, content)
+        self.sent.append(
+            {'chat_id': chat_id, 'name': name, 'content': content}
+        )
+        return {
+            'message_id': len(self.sent),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'document': {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_name': name,
+            },
+        }
+
+    async def send_document(self, request: web.Request) -> web.Response:
+        params = await self.params(request)
+        try:
+            name, content = self.read_document(params['document'], None)
+        except (KeyError, OSError, ValueError) as e:
+            return self.error(f'Bad Request: {e}')
+        return self.ok(self.store(params['chat_id'], name, content))
+
+    async def send_media_group(self, request: web.Request) -> web.Response:
+        params = await self.params(request)
+        result = []
+        try:
+            for item in json.loads(params['media']):
+                media = item['media']
+                if media.startswith('attach://'):
+                    media = params[media[len('attach://'):]]
+                name, content = self.read_document(media, None)
+                result.append(self.store(params['chat_id'], name, content))
+        except (KeyError, OSError, ValueError) as e:
+            return self.error(f'Bad Request: {e}')
+        return self.ok(result)
+
+    async def download(self, request: web.Request) -> web.Response:
+        path = request.match_info['path']
+        if path not in self.files.values():
+            return web.Response(status=404)
+        return web.FileResponse(os.path.join(self.storage, path))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/getFile', self.get_file)
+        app.router.add_post('/bot{token}/sendDocument', self.send_document)
+        app.router.add_post(
+            '/bot{token}/sendMediaGroup', self.send_media_group
+        )
+        app.router.add_get('/file/bot{token}/{path:.+}', self.download)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--storage', required=True)
+    parser.add_argument('--local', action='store_true')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    web.run_app(
+        TelegramStub(args.storage, args.local).app(), port=args.port
+    )
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from app import admission
+from app.admission import AdmissionControl, AdmissionRejected, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, 'monotonic', clock)
+    return clock
+
+
+async def noop(chat_id):
+    pass
+
+
+def test_token_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take()
+    assert not bucket.take()
+    # простой не копит токенов больше burst
+    clock.now += 100
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_admit_buffers_over_limit_and_joins(clock):
+    async def run():
+        control = AdmissionControl(1, 2, 10, noop)
+        assert control.admit(1, 'a') == 'a'
+        assert control.admit(1, 'b') == 'b'
+        assert control.admit(1, 'c') is None
+        assert control.admit(1, 'd') is None
+        assert 1 in control.timers
+        clock.now += 1
+        # следующее сообщение забирает накопленный буфер и снимает таймер
+        assert control.admit(1, 'e') == 'c\nd\ne'
+        assert control.pending == {} and control.timers == {}
+    asyncio.run(run())
+
+
+def test_timer_flushes_pending():
+    async def run():
+        ready = []
+
+        async def on_ready(chat_id):
+            ready.append(control.take_pending(chat_id))
+
+        control = AdmissionControl(50, 1, 10, on_ready)
+        assert control.admit(7, 'a') == 'a'
+        assert control.admit(7, 'b') is None
+        assert control.admit(7, 'c') is None
+        await asyncio.sleep(0.1)
+        assert ready == ['b\nc']
+        assert control.take_pending(7) is None
+    asyncio.run(run())
+
+
+def test_buckets_are_lru_limited(clock):
+    control = AdmissionControl(1, 1, 2, noop)
+    for chat_id in (1, 2, 1, 3):
+        control.bucket(chat_id)
+    assert list(control.buckets) == [1, 3]
+
+
+def test_large_chat_buffer_is_written_at_once(clock):
+    async def run():
+        control = AdmissionControl(1, 1, 10, noop, max_pending=8)
+        assert control.admit(1, 'first') == 'first'
+        assert control.admit(1, 'abc') is None
+        # буфер дорос до max_pending: пишется сразу, склеенным
+        assert control.admit(1, 'defg') == 'abc\ndefg'
+        assert control.pending == {} and control.timers == {}
+        assert control.buffered == 0
+    asyncio.run(run())
+
+
+def test_full_buffer_rejects_instead_of_dropping(clock):
+    async def run():
+        control = AdmissionControl(
+            1, 1, 10, noop, max_pending=100, max_buffered=6
+        )
+        for chat_id in (1, 2):
+            assert control.admit(chat_id, 'first') == 'first'
+        assert control.admit(1, 'abc') is None
+        assert control.admit(1, 'd') is None
+        assert control.buffered == 5
+        with pytest.raises(AdmissionRejected):
+            control.admit(2, 'xy')
+        assert control.rejected == 1 and 2 not in control.pending
+        # отказ ничего не выкидывает из уже принятого
+        assert control.take_pending(1) == 'abc\nd'
+        assert control.buffered == 0
+        assert control.admit(2, 'xy') is None
+        for timer in control.timers.values():
+            timer.cancel()
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import os
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from app.handler import ticket
+from tests.telegram_stub import TelegramStub
+
+CONTENT = b'%PDF-1.4 test document'
+
+
+async def fetch(tmp_path, local):
+    stub = TelegramStub(str(tmp_path / 'telegram'), local=local)
+    source = stub.add_file('doc-1', 'report.pdf', CONTENT)
+    url = await stub.start()
+    bot = Bot(
+        token='123456:TEST',
+        session=AiohttpSession(
+            api=TelegramAPIServer.from_base(url, is_local=local)
+        )
+    )
+    destination = str(tmp_path / 'storage' / '7.pdf')
+    os.makedirs(os.path.dirname(destination))
+    try:
+        checksum = await ticket.fetch_document(bot, 'doc-1', destination)
+    finally:
+        await bot.session.close()
+        await stub.stop()
+    return source, destination, checksum
+
+
+def test_fetch_document_local_mode_links_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(ticket, 'TELEGRAM_LOCAL_MODE', True)
+    source, destination, checksum = asyncio.run(fetch(tmp_path, True))
+    with open(destination, 'rb') as f:
+        assert f.read() == CONTENT
+    # байты не копировались: это тот же файл, что у сервера Bot API
+    assert os.path.samefile(source, destination)
+    assert checksum == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_fetch_document_downloads_over_http(tmp_path, monkeypatch):
+    monkeypatch.setattr(ticket, 'TELEGRAM_LOCAL_MODE', False)
+    source, destination, checksum = asyncio.run(fetch(tmp_path, False))
+    with open(destination, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.samefile(source, destination)
+    assert checksum == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_store_local_file_moves_when_link_fails(tmp_path, monkeypatch):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(CONTENT)
+
+    def cross_device(src, dst):
+        raise OSError(18, 'Invalid cross-device link')
+
+    monkeypatch.setattr(ticket.os, 'link', cross_device)
+    ticket.store_local_file(str(source), str(tmp_path / 'target.bin'))
+    assert not source.exists()
+    assert (tmp_path / 'target.bin').read_bytes() == CONTENT
@@ -0,0 +1,25 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+from app import webhook
+
+
+async def post(headers):
+    client = TestClient(TestServer(webhook.build_app(None, None)))
+    await client.start_server()
+    try:
+        response = await client.post('/telegram/webhook', headers=headers)
+        return response.status
+    finally:
+        await client.close()
+
+
+def test_secret_is_checked(monkeypatch):
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET', 'secret')
+    header = 'X-Telegram-Bot-Api-Secret-Token'
+    assert asyncio.run(post({})) == 401
+    assert asyncio.run(post({header: 'wrong'})) == 401
+    # не-ASCII заголовок - тоже 401, а не 500
+    assert asyncio.run(post({header: 'секрет'})) == 401
+    # верный секрет проходит проверку и доходит до разбора тела
+    assert asyncio.run(post({header: 'secret'})) == 400